@@ -2,16 +2,17 @@
 Backtesting endpoints
 """
 
-from fastapi import BackgroundTasks, Depends, HTTPException
+from fastapi import Depends, HTTPException
 from fastapi.routing import APIRouter
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ...backtester import BacktestDefinition, BackTester
+from ...backtester import BacktestDefinition, BackTester, SweepDefinition
+from ...backtester.consts import JobKind
 from ...consts import Status
-from ...database.models import Backtests, BacktestStats
-from ...stocks import History
-from ..deps import get_async_session, get_backtester, get_history
+from ...backtester.recorder import load_curve
+from ...database.models import BacktestRuns, Backtests, BacktestStats
+from ..deps import get_async_session, get_backtester
 from .strats import get_strats
 
 router = APIRouter(prefix="/backtest", tags=["Backtesting"])
@@ -20,35 +21,76 @@ router = APIRouter(prefix="/backtest", tags=["Backtesting"])
 @router.post("/start")
 async def run_backtest(
     data: BacktestDefinition,
-    background_task: BackgroundTasks,
-    history: History = Depends(get_history),
     backtester: BackTester = Depends(get_backtester),
-    session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Run a backtest
+    Queue a backtest for a backtest worker to run
     """
     if not data.symbols:
         raise HTTPException(400, {"details": "You can't backtest with no symbols"})
-    running = (
-        (
-            await session.execute(
-                select(Backtests.id).where(Backtests.status == Status.IN_PROGRESS)
-            )
-        )
-        .scalars()
-        .all()
-    )
-    if running:
-        raise HTTPException(429, "backtest already running")
-    strats = data.strategy_definitions or []
+    strats = [strat.model_dump() for strat in data.strategy_definitions or []]
     if data.strategy_aliases is not None:
         for strat in data.strategy_aliases:
             strats += await get_strats(strat)
-    backtest_id = backtester.insert_start_of_backtest(data.symbols, strats)
+    backtest_id = backtester.enqueue_backtest(JobKind.BACKTEST, data, strats)
+    return {"id": backtest_id, "status": Status.QUEUED}
+
 
-    background_task.add_task(backtester.backtest_strats, backtest_id, history, data)
-    return {"id": backtest_id}
+@router.post("/sweep")
+async def run_sweep(
+    data: SweepDefinition,
+    backtester: BackTester = Depends(get_backtester),
+):
+    """
+    Queue a backtest of every combination of a strategy's condition variables,
+    ranked under one parent backtest
+    """
+    if not data.symbols:
+        raise HTTPException(400, {"details": "You can't backtest with no symbols"})
+    if (data.strategy_definition is None) == (data.strategy_alias is None):
+        raise HTTPException(
+            400,
+            {"details": "Give exactly one of strategy_definition or strategy_alias"},
+        )
+    if data.strategy_definition is not None:
+        strats = [data.strategy_definition.model_dump()]
+    else:
+        strats = await get_strats(data.strategy_alias)
+    backtest_id = backtester.enqueue_backtest(
+        JobKind.SWEEP, data, strats, data.model_dump(mode="json")["parameters"]
+    )
+    return {"id": backtest_id, "status": Status.QUEUED}
+
+
+@router.post("/cancel")
+async def cancel_backtest(
+    backtest_id: int, backtester: BackTester = Depends(get_backtester)
+):
+    """
+    Cancel a queued backtest, or stop one that is running
+    """
+    status = backtester.cancel_backtest(backtest_id)
+    if status is None:
+        raise HTTPException(404, "backtest not found")
+    if status not in (Status.QUEUED, Status.IN_PROGRESS):
+        raise HTTPException(409, f"backtest already {status}")
+    return {"id": backtest_id, "cancelled": status == Status.QUEUED}
+
+
+@router.get("/sweep/results")
+async def get_sweep_results(
+    backtest_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Get the results of each parameter combination of a sweep, best first
+    """
+    parent = (
+        await session.execute(select(Backtests).where(Backtests.id == backtest_id))
+    ).scalar()
+    if parent is None:
+        raise HTTPException(404, "backtest not found")
+    ranking = (parent.result or {}).get("ranking", [])
+    return {"id": backtest_id, "status": parent.status, "ranking": ranking}
 
 
 @router.get("/result")
@@ -67,11 +109,31 @@ async def get_backtest(
 
 @router.get("/result/stats")
 async def get_backtest_result_stats(
-    backtest_id: int, session: AsyncSession = Depends(get_async_session)
+    backtest_id: int,
+    strategy: str | None = None,
+    symbol: str | None = None,
+    session: AsyncSession = Depends(get_async_session),
 ):
     """
-    Get stats about the backtest result
+    Get stats about the backtest result, the equity curve of each
+    strategy and symbol that was run
     """
+    query = select(BacktestRuns).where(BacktestRuns.backtest_id == backtest_id)
+    if strategy is not None:
+        query = query.where(BacktestRuns.strategy == strategy)
+    if symbol is not None:
+        query = query.where(BacktestRuns.symbol == symbol)
+    runs = (await session.execute(query.order_by(BacktestRuns.id))).scalars().all()
+    if runs:
+        return [
+            {
+                "strategy": run.strategy,
+                "symbol": run.symbol,
+                "stats": load_curve(run.curve),
+            }
+            for run in runs
+        ]
+    ## backtests run before curves were stored per run
     response = (
         await session.execute(
             select(BacktestStats)
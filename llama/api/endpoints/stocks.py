@@ -51,13 +51,14 @@ async def get_historic_data(
 
 
 @router.get("/assets/qoute/latest")
-async def latest_ask_price(
+def latest_ask_price(
     symbols: Annotated[list[str], Query()], history: History = Depends(get_history)
 ):
     """
-    Get the latest qoute for a stock
+    Get the latest qoute for stocks, in one request to alpaca for any not cached
     """
-    return {symbol: history.get_latest_qoute(symbol).model_dump() for symbol in symbols}
+    qoutes = history.get_latest_qoutes(symbols)
+    return {symbol: qoute.model_dump() for symbol, qoute in qoutes.items()}
 
 
 @router.get("/news")
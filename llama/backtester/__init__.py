@@ -3,7 +3,7 @@ Export Backtest functions and classes
 """
 
 from .backtest import BackTester
-from .consts import BacktestDefinition
+from .consts import BacktestDefinition, SweepDefinition
 from .mocktrader import MockTrader
 
-__all__ = ["BackTester", "MockTrader", "BacktestDefinition"]
+__all__ = ["BackTester", "MockTrader", "BacktestDefinition", "SweepDefinition"]
@@ -3,32 +3,42 @@ Defines the backtester class
 """
 
 import logging
+import multiprocessing
+import threading
+import time
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from copy import deepcopy
-from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 
-from alpaca.data.models import Bar
 from alpaca.data.timeframe import TimeFrame
 from sqlalchemy import select, update
 from sqlalchemy.dialects.postgresql import insert
 from trekkers import on_conflict_update
-from yumi import divide_chunks
 
 from ..consts import Status
-from ..database.models import Backtests, BacktestStats
+from ..database.models import BacktestRuns, Backtests
 from ..settings import get_sync_sessionm
-from ..stocks import History
-from ..strats import (
-    Strategy,
-    StrategyDefinition,
-    get_all_conditions,
-    get_all_strats,
-    get_strategy_class,
+from ..stocks import History, QouteIndex
+from ..stocks.market_calendar import session_mask
+from ..strats import StrategyDefinition, get_all_conditions, get_all_strats
+from .consts import (
+    BacktestCancelled,
+    BacktestDefinition,
+    ExecutorType,
+    JobKind,
+    SweepDefinition,
 )
-from .consts import BacktestDefinition
+from .memo import load_cached_runs, run_keys
 from .mocktrader import MockTrader
+from .runner import (
+    RunSpec,
+    build_strategy,
+    run_strat,
+    run_strat_in_worker,
+    strategy_from_definition,
+)
+from .sweep import apply_parameters, parameter_grid, summarise
 
 
 class BackTester:
@@ -48,16 +58,6 @@ class BackTester:
     ):
         """Insert an entry to start backtest"""
         with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
-            scans = (
-                session.execute(
-                    select(Backtests.id).where(Backtests.status == Status.IN_PROGRESS)
-                )
-                .scalars()
-                .all()
-            )
-            if len(scans) > 0:
-                raise RuntimeError("You can't run more than 1 backtest at a time")
-
             logging.info("inserting new backtest entry")
             backtest_id = session.execute(
                 insert(Backtests)
@@ -73,6 +73,171 @@ class BackTester:
             ).scalar()
             return backtest_id
 
+    @staticmethod
+    def enqueue_backtest(
+        kind: JobKind,
+        definition: BacktestDefinition | SweepDefinition,
+        strategies: list[dict] | None = None,
+        parameters: dict | None = None,
+    ):
+        """Queue a backtest for a backtest worker to claim"""
+        with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
+            backtest_id = session.execute(
+                insert(Backtests)
+                .values(
+                    {
+                        "symbols": definition.symbols,
+                        "status": Status.QUEUED,
+                        "timestamp": datetime.now(timezone.utc),
+                        "strategies": strategies,
+                        "parameters": parameters,
+                        "kind": kind,
+                        "definition": definition.model_dump(mode="json"),
+                        "priority": definition.priority,
+                    }
+                )
+                .returning(Backtests.id)
+            ).scalar()
+            logging.info("queued %s %s", kind, backtest_id)
+            return backtest_id
+
+    @staticmethod
+    def claim_backtest(worker: str, lease_timeout: float):
+        """
+        Claim the queued backtest with the highest priority. Rows locked by
+        other workers claiming at the same time are skipped rather than waited on.
+        Backtests whose claim hasn't been renewed for lease_timeout seconds
+        lost their worker and are claimed again
+        """
+        expired = datetime.utcnow() - timedelta(seconds=lease_timeout)
+        with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
+            job = session.execute(
+                select(Backtests.id, Backtests.kind, Backtests.definition)
+                .where(
+                    (Backtests.status == Status.QUEUED)
+                    | (
+                        (Backtests.status == Status.IN_PROGRESS)
+                        & Backtests.kind.is_not(None)
+                        & (Backtests.claimed_at < expired)
+                    )
+                )
+                .order_by(Backtests.priority.desc(), Backtests.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).first()
+            if job is None:
+                return None
+            session.execute(
+                update(Backtests)
+                .where(Backtests.id == job.id)
+                .values(
+                    status=Status.IN_PROGRESS,
+                    claimed_by=worker,
+                    claimed_at=datetime.utcnow(),
+                )
+            )
+            return job
+
+    @staticmethod
+    def renew_claim(backtest_id: int, worker: str):
+        """Keep a claimed backtest's lease from expiring while it runs"""
+        with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
+            session.execute(
+                update(Backtests)
+                .where(
+                    Backtests.id == backtest_id,
+                    Backtests.claimed_by == worker,
+                    Backtests.status == Status.IN_PROGRESS,
+                )
+                .values(claimed_at=datetime.utcnow())
+            )
+
+    @classmethod
+    @contextmanager
+    def hold_claim(cls, backtest_id: int, worker: str, interval: float):
+        """Renew a claim every interval seconds on a thread for as long as it's held"""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(interval):
+                try:
+                    cls.renew_claim(backtest_id, worker)
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    logging.exception(exc)
+
+        renewer = threading.Thread(target=renew, daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            renewer.join()
+
+    @staticmethod
+    def cancel_backtest(backtest_id: int) -> Status | None:
+        """
+        Cancel a queued backtest, or ask the worker running it to stop.
+        Returns the status the backtest had, None if it doesn't exist
+        """
+        with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
+            status = session.execute(
+                select(Backtests.status)
+                .where(Backtests.id == backtest_id)
+                .with_for_update()
+            ).scalar()
+            if status == Status.QUEUED:
+                session.execute(
+                    update(Backtests)
+                    .where(Backtests.id == backtest_id)
+                    .values(status=Status.CANCELLED, cancel_requested=True)
+                )
+            elif status == Status.IN_PROGRESS:
+                session.execute(
+                    update(Backtests)
+                    .where(Backtests.id == backtest_id)
+                    .values(cancel_requested=True)
+                )
+            return status
+
+    @staticmethod
+    def check_cancelled(backtest_id: int):
+        """Raise BacktestCancelled if the backtest's cancellation was requested"""
+        with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
+            cancelled = session.execute(
+                select(Backtests.cancel_requested).where(Backtests.id == backtest_id)
+            ).scalar()
+        if cancelled:
+            raise BacktestCancelled(backtest_id)
+
+    def _collect(self, backtest_id: int, futures, check_every: float = 5.0):
+        """
+        Yield runs as they complete, checking every few seconds whether the
+        backtest has been cancelled, in which case runs not started are dropped
+        """
+        last_check = time.monotonic()
+        for future in as_completed(futures):
+            yield future
+            if time.monotonic() - last_check < check_every:
+                continue
+            last_check = time.monotonic()
+            try:
+                self.check_cancelled(backtest_id)
+            except BacktestCancelled:
+                for pending in futures:
+                    pending.cancel()
+                raise
+
+    @staticmethod
+    def finish_cancelled(backtest_id: int):
+        """Mark a backtest whose worker stopped running it as cancelled"""
+        logging.info("backtest %s cancelled", backtest_id)
+        with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
+            session.execute(
+                update(Backtests)
+                .where(Backtests.id == backtest_id)
+                .values(status=Status.CANCELLED)
+            )
+
     async def backtest_strats(
         self, backtest_id: str, history: History, definition: BacktestDefinition
     ):
@@ -87,8 +252,12 @@ class BackTester:
             ### Check that the entry exists and is in progress
             with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
                 session.execute(
-                    select(Backtests.id).where(Backtests.status == Status.IN_PROGRESS)
+                    select(Backtests.id).where(
+                        Backtests.id == backtest_id,
+                        Backtests.status == Status.IN_PROGRESS,
+                    )
                 ).scalar_one()
+            self.check_cancelled(backtest_id)
             start_time_backtest = datetime.now(timezone.utc) - timedelta(
                 days=definition.days_to_test_over
             )
@@ -97,19 +266,6 @@ class BackTester:
             start_time_historic = start_time_backtest - timedelta(days=60)
             end_time_historic = start_time_backtest
 
-            data = history.get_stock_bars(
-                definition.symbols,
-                time_frame=TimeFrame.Minute,
-                start_time=start_time_backtest,
-                end_time=end_time_backtest,
-            )
-            history.get_stock_bars(
-                definition.symbols,
-                time_frame=TimeFrame.Day,
-                start_time=start_time_historic,
-                end_time=end_time_historic,
-            )
-
             strategies = definition.strategy_definitions or []
             if definition.strategy_aliases is not None:
                 all_strats = get_all_strats()
@@ -119,59 +275,142 @@ class BackTester:
                         raise KeyError(f"Strategy with alias {strat} doesn't exist")
                     strategies.append(StrategyDefinition(**strate.dict()))
 
-            all_conditions = get_all_conditions()
-            strat_classes: list[Strategy] = []
-            for strat in strategies:
-                conditions = []
-                for cond in strat.conditions:
-                    if (condition := all_conditions.get(cond.name)) is None:
-                        raise KeyError(f"condition {cond.name} doesn't exist")
-                    new_condition = deepcopy(condition)
-                    new_condition.update_variables(cond.variables)
-                    new_condition.active = cond.active
-                    new_condition.type = cond.type
-                    conditions.append(new_condition)
-                strat_classes.append(
-                    get_strategy_class(
-                        strat.name, strat.alias, strat.active, conditions
+            windows = (
+                start_time_backtest,
+                end_time_backtest,
+                start_time_historic,
+                end_time_historic,
+            )
+            cached: dict[tuple[str, str], BacktestRuns] = {}
+            if definition.use_cache:
+                keys = run_keys(
+                    strategies, definition.symbols, *windows, definition.vectorized
+                )
+                runs = load_cached_runs(list(keys.values()))
+                cached = {
+                    run_key: runs[key] for run_key, key in keys.items() if key in runs
+                }
+                logging.info(
+                    "reusing %s of %s runs from earlier backtests",
+                    len(cached),
+                    len(keys),
+                )
+            ## only symbols with a run that isn't cached need their data loading
+            symbols = [
+                symbol
+                for symbol in definition.symbols
+                if any((strat.alias, symbol) not in cached for strat in strategies)
+            ]
+
+            in_process = definition.executor == ExecutorType.THREAD
+            if symbols:
+                if in_process:
+                    data = history.get_stock_bars(
+                        symbols,
+                        time_frame=TimeFrame.Minute,
+                        start_time=start_time_backtest,
+                        end_time=end_time_backtest,
+                    )
+                else:
+                    history.ensure_bars(
+                        symbols,
+                        TimeFrame.Minute,
+                        start_time_backtest,
+                        end_time_backtest,
                     )
+                history.get_stock_bars(
+                    symbols,
+                    time_frame=TimeFrame.Day,
+                    start_time=start_time_historic,
+                    end_time=end_time_historic,
                 )
+                if definition.backfill_qoutes:
+                    for symbol in symbols:
+                        history.get_qoutes(
+                            symbol, start_time_backtest, end_time_backtest
+                        )
+                if in_process:
+                    qoutes = QouteIndex.load(
+                        symbols, start_time_backtest, end_time_backtest
+                    )
+            ## loading and backfilling can take a while
+            self.check_cancelled(backtest_id)
+            ## keyed again now that backfills have changed the data versions
+            keys = (
+                run_keys(strategies, symbols, *windows, definition.vectorized)
+                if symbols
+                else {}
+            )
 
-            strat_data: list[tuple[Strategy, MockTrader, list[Bar]]] = []
-            for strat in strat_classes:
-                for symbol in definition.symbols:
-                    bars = [value for value in data.data[symbol]]
-                    bars.sort(key=lambda x: x.timestamp)
-                    strat_data.append(
-                        (
-                            strat.create(
+            all_conditions = get_all_conditions()
+            processes: dict = {}
+            if not in_process:
+                ## each worker loads its own bars, only the run specs are pickled
+                xacuter = ProcessPoolExecutor(
+                    max_workers=definition.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                for strat in strategies:
+                    for symbol in symbols:
+                        if (strat.alias, symbol) in cached:
+                            continue
+                        spec = RunSpec(strat, symbol, *windows, definition.vectorized)
+                        processes[xacuter.submit(run_strat_in_worker, spec)] = symbol
+            else:
+                xacuter = ThreadPoolExecutor(max_workers=definition.workers)
+                for strat in strategies:
+                    strat_class, conditions = strategy_from_definition(
+                        strat, all_conditions
+                    )
+                    for symbol in symbols:
+                        if (strat.alias, symbol) in cached:
+                            continue
+                        symbol_bars = data.get(symbol)
+                        future = xacuter.submit(
+                            run_strat,
+                            strat_class.create(
                                 history,
                                 [symbol],
                                 start_time_historic,
                                 end_time_historic,
                                 conditions=conditions,
+                                qoutes=qoutes,
                             ),
                             MockTrader.create(),
-                            bars,
-                        )
-                    )
-            processes = []
-            with ThreadPoolExecutor(max_workers=4) as xacuter:
-                for strat, trader, bars in strat_data:
-                    processes.append(
-                        xacuter.submit(
-                            self.test_strat,
-                            strategy=strat,
-                            trader=trader,
-                            bars=bars,
+                            symbol_bars[session_mask(symbol_bars.timestamp)],
+                            definition.vectorized,
                         )
-                    )
+                        processes[future] = symbol
+            with xacuter:
+                results: list[tuple[MockTrader, str, str]] = [
+                    (*future.result(), processes[future])
+                    for future in self._collect(backtest_id, processes)
+                ]
+            runs = [
+                {
+                    "strategy": alias,
+                    "symbol": symbol,
+                    "snapshots": len(trader.recorder),
+                    "curve": trader.recorder.to_bytes(),
+                    "cache_key": keys.get((alias, symbol)),
+                    "result": trader.aggregate(),
+                }
+                for trader, alias, symbol in results
+            ] + [
+                {
+                    "strategy": alias,
+                    "symbol": symbol,
+                    "snapshots": run.snapshots,
+                    "curve": run.curve,
+                    "cache_key": run.cache_key,
+                    "result": run.result,
+                }
+                for (alias, symbol), run in cached.items()
+            ]
             overall = defaultdict(MockTrader.get_aggregate_template)
-            for future in as_completed(processes):
-                result: tuple[MockTrader, Strategy] = future.result()
-                trader, strat = result
-                for key, value in trader.aggregate().items():
-                    field = overall[strat.ALIAS][key]
+            for run in runs:
+                for key, value in run["result"].items():
+                    field = overall[run["strategy"]][key]
                     if isinstance(field, dict):
                         field.update(value)
                     else:
@@ -183,56 +422,207 @@ class BackTester:
                     .where(Backtests.id == backtest_id)
                     .values(result=overall, status=Status.COMPLETED)
                 )
-                for chunk in divide_chunks(
-                    [
-                        {**asdict(stat), "backtest_id": backtest_id}
-                        for stat in trader.stats_record
-                    ],
-                    100,
-                ):
-                    session.execute(insert(BacktestStats).values(chunk))
+                if runs:
+                    session.execute(
+                        insert(BacktestRuns),
+                        [{**run, "backtest_id": backtest_id} for run in runs],
+                    )
 
             logging.info("backtest %s completed successfully", backtest_id)
+        except BacktestCancelled:
+            self.finish_cancelled(backtest_id)
         except Exception as exc:  # pylint: disable=broad-exception-caught
             logging.exception(exc)
-            logging.error("failed to complete backtest")
-            with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
-                session.execute(
-                    on_conflict_update(
-                        insert(Backtests).values(
-                            id=backtest_id,
-                            symbols=definition.symbols,
-                            result={},
-                            status=Status.FAILED,
-                            timestamp=datetime.utcnow(),
-                        ),
-                        Backtests,
-                    )
-                )
+            self.fail_backtest(backtest_id, definition.symbols)
 
     @staticmethod
-    def test_strat(
-        strategy: Strategy,
-        trader: MockTrader,
-        bars: list[Bar],
+    def fail_backtest(backtest_id: int, symbols: list[str]):
+        """Mark a backtest as failed"""
+        logging.error("failed to complete backtest")
+        with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
+            session.execute(
+                on_conflict_update(
+                    insert(Backtests).values(
+                        id=backtest_id,
+                        symbols=symbols,
+                        result={},
+                        status=Status.FAILED,
+                        timestamp=datetime.utcnow(),
+                    ),
+                    Backtests,
+                )
+            )
+
+    async def sweep_strategy(
+        self, backtest_id: int, history: History, definition: SweepDefinition
     ):
         """
-        Run the trading strategy over all bars in specified time period using the mocktrader
+        Backtest a strategy with every combination of the sweep's parameters.
+        Bars are loaded once and shared by every combination, each combination
+        is stored as a child of the backtest, which holds their ranking
         """
-        strat_name = type(strategy).__name__
-        num_bars = len(bars)
-        symbol = bars[0].symbol
-        last_percent = 0
-        for i in range(num_bars):
-            percent_completed = int(i / num_bars * 100)
-            if percent_completed > last_percent + 20:
-                last_percent = percent_completed
-                logging.debug(
-                    "Progress of %s on %s: %s", strat_name, symbol, percent_completed
-                )
-            action, qty = strategy.run(trader, bars[i], False)
-            trader.post_trade_update(
-                symbol, action, qty, bars[i].close, bars[i].timestamp
+        try:
+            self.check_cancelled(backtest_id)
+            start_time_backtest = datetime.now(timezone.utc) - timedelta(
+                days=definition.days_to_test_over
             )
+            end_time_backtest = datetime.now(timezone.utc) - timedelta(minutes=15)
+            start_time_historic = start_time_backtest - timedelta(days=60)
+            end_time_historic = start_time_backtest
+
+            base = definition.strategy_definition
+            if base is None:
+                if (strate := get_all_strats().get(definition.strategy_alias)) is None:
+                    raise KeyError(
+                        f"Strategy with alias {definition.strategy_alias} doesn't exist"
+                    )
+                base = StrategyDefinition(**strate.dict())
+            all_conditions = get_all_conditions()
+            grid = parameter_grid(definition.parameters)
+            if not grid:
+                raise ValueError(f"sweep {backtest_id} has no combinations to run")
+            swept = [
+                apply_parameters(base, parameters, all_conditions)
+                for parameters in grid
+            ]
+            logging.info(
+                "sweeping %s parameter combinations of %s over %s symbols",
+                len(swept),
+                base.alias,
+                len(definition.symbols),
+            )
+
+            if definition.backfill_qoutes:
+                for symbol in definition.symbols:
+                    history.get_qoutes(symbol, start_time_backtest, end_time_backtest)
+            runs: dict = {}
+            if definition.executor == ExecutorType.PROCESS:
+                ## backfilled once here so workers only read stored bars
+                history.ensure_bars(
+                    definition.symbols,
+                    TimeFrame.Minute,
+                    start_time_backtest,
+                    end_time_backtest,
+                )
+                history.ensure_bars(
+                    definition.symbols,
+                    TimeFrame.Day,
+                    start_time_historic,
+                    end_time_historic,
+                )
+                self.check_cancelled(backtest_id)
+                xacuter = ProcessPoolExecutor(
+                    max_workers=definition.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                for index, strat in enumerate(swept):
+                    for symbol in definition.symbols:
+                        spec = RunSpec(
+                            strat,
+                            symbol,
+                            start_time_backtest,
+                            end_time_backtest,
+                            start_time_historic,
+                            end_time_historic,
+                            definition.vectorized,
+                            sync_strategy=False,
+                        )
+                        future = xacuter.submit(run_strat_in_worker, spec)
+                        runs[future] = (index, symbol)
+            else:
+                historic_data = history.get_stock_bars(
+                    definition.symbols,
+                    time_frame=TimeFrame.Day,
+                    start_time=start_time_historic,
+                    end_time=end_time_historic,
+                )
+                data = history.get_stock_bars(
+                    definition.symbols,
+                    time_frame=TimeFrame.Minute,
+                    start_time=start_time_backtest,
+                    end_time=end_time_backtest,
+                )
+                qoutes = QouteIndex.load(
+                    definition.symbols, start_time_backtest, end_time_backtest
+                )
+                session_bars = {
+                    symbol: data.get(symbol)[session_mask(data.get(symbol).timestamp)]
+                    for symbol in definition.symbols
+                }
+                self.check_cancelled(backtest_id)
+                xacuter = ThreadPoolExecutor(max_workers=definition.workers)
+                for index, strat in enumerate(swept):
+                    strat_class, conditions = strategy_from_definition(
+                        strat, all_conditions
+                    )
+                    for symbol in definition.symbols:
+                        strategy = build_strategy(
+                            strat_class,
+                            conditions,
+                            history,
+                            historic_data,
+                            qoutes,
+                            sync_strategy=False,
+                        )
+                        future = xacuter.submit(
+                            run_strat,
+                            strategy,
+                            MockTrader.create(),
+                            session_bars[symbol],
+                            definition.vectorized,
+                        )
+                        runs[future] = (index, symbol)
+            traders: list[dict[str, MockTrader]] = [{} for _ in swept]
+            summaries: list[dict | None] = [None for _ in swept]
+            with xacuter:
+                for future in self._collect(backtest_id, list(runs)):
+                    index, symbol = runs.pop(future)
+                    traders[index][symbol] = future.result()[0]
+                    if len(traders[index]) == len(definition.symbols):
+                        summaries[index] = summarise(traders[index])
+                        traders[index] = {}
 
-        return trader, strategy
+            ranked = sorted(
+                range(len(swept)), key=lambda i: summaries[i]["equity"], reverse=True
+            )
+            with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
+                child_ids = session.execute(
+                    insert(Backtests)
+                    .values(
+                        [
+                            {
+                                "symbols": definition.symbols,
+                                "status": Status.COMPLETED,
+                                "timestamp": datetime.now(timezone.utc),
+                                "strategies": [swept[index].model_dump()],
+                                "result": summaries[index],
+                                "parameters": grid[index],
+                                "parent_id": backtest_id,
+                            }
+                            for index in ranked
+                        ]
+                    )
+                    .returning(Backtests.id)
+                ).scalars()
+                ranking = [
+                    {
+                        "rank": rank,
+                        "backtest_id": child_id,
+                        "parameters": grid[index],
+                        **summaries[index],
+                    }
+                    for rank, (index, child_id) in enumerate(
+                        zip(ranked, child_ids), start=1
+                    )
+                ]
+                session.execute(
+                    update(Backtests)
+                    .where(Backtests.id == backtest_id)
+                    .values(result={"ranking": ranking}, status=Status.COMPLETED)
+                )
+            logging.info("sweep %s completed successfully", backtest_id)
+        except BacktestCancelled:
+            self.finish_cancelled(backtest_id)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            logging.exception(exc)
+            self.fail_backtest(backtest_id, definition.symbols)
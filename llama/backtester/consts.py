@@ -2,10 +2,35 @@
 Backtest consts and Models
 """
 
-from pydantic import BaseModel
+from enum import StrEnum
+from typing import Any
+
+import numpy as np
+from pydantic import BaseModel, Field, model_validator
 
 from ..strats import StrategyDefinition
 
+## Upper bound on the threads or processes a single backtest may start
+MAX_WORKERS = 32
+
+
+class ExecutorType(StrEnum):
+    """Where strategy and symbol runs of a backtest are executed"""
+
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class JobKind(StrEnum):
+    """Kind of backtest job waiting in the queue"""
+
+    BACKTEST = "backtest"
+    SWEEP = "sweep"
+
+
+class BacktestCancelled(Exception):
+    """Raised in a running backtest once its cancellation has been requested"""
+
 
 class BacktestDefinition(BaseModel):
     """Definition of a backtest to perform"""
@@ -14,3 +39,63 @@ class BacktestDefinition(BaseModel):
     strategy_definitions: list[StrategyDefinition] | None = None
     strategy_aliases: list[str] | None = None
     days_to_test_over: int = 30
+    ## Fetch qoutes from alpaca before the run, otherwise only stored ones are used
+    backfill_qoutes: bool = False
+    ## Evaluate conditions over whole bar arrays where every condition allows it
+    vectorized: bool = False
+    ## Processes sidestep the GIL for the pure python per bar loop
+    executor: ExecutorType = ExecutorType.THREAD
+    workers: int = Field(default=4, ge=1, le=MAX_WORKERS)
+    ## Queued backtests with a higher priority are claimed first
+    priority: int = 0
+    ## Reuse the runs of completed backtests over the same strategy and data
+    use_cache: bool = True
+
+
+class ParameterRange(BaseModel):
+    """An inclusive range of values for a condition variable"""
+
+    start: float
+    stop: float
+    step: float
+
+    @model_validator(mode="after")
+    def check_direction(self):
+        """Ranges step upwards from start to stop"""
+        if self.step <= 0:
+            raise ValueError("step must be greater than 0")
+        if self.stop < self.start:
+            raise ValueError("stop must be at least start")
+        return self
+
+    def values(self) -> list[float]:
+        """Every value in the range"""
+        count = int(np.floor((self.stop - self.start) / self.step + 1e-9)) + 1
+        return [round(self.start + i * self.step, 10) for i in range(max(count, 0))]
+
+
+class SweepDefinition(BaseModel):
+    """
+    Definition of a parameter sweep over one strategy. parameters maps
+    condition names to the values to try for each of their variables
+    """
+
+    symbols: list[str] = ["AAPL"]
+    strategy_definition: StrategyDefinition | None = None
+    strategy_alias: str | None = None
+    parameters: dict[str, dict[str, list[Any] | ParameterRange]]
+    days_to_test_over: int = 30
+    backfill_qoutes: bool = False
+    vectorized: bool = True
+    executor: ExecutorType = ExecutorType.THREAD
+    workers: int = Field(default=4, ge=1, le=MAX_WORKERS)
+    priority: int = 0
+
+    @model_validator(mode="after")
+    def check_grid(self):
+        """Every variable needs a value to try, or there are no combinations"""
+        for condition, variables in self.parameters.items():
+            for variable, values in variables.items():
+                if isinstance(values, list) and not values:
+                    raise ValueError(f"no values to try for {condition}.{variable}")
+        return self
@@ -0,0 +1,143 @@
+"""
+Cache keys for strategy and symbol runs, so runs over unchanged data are reused
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from sqlalchemy import select
+
+from ..consts import Status
+from ..database.models import BacktestRuns, Backtests
+from ..settings import get_sync_sessionm
+from ..stocks.coverage import Interval, get_coverage
+from ..stocks.history import QOUTE_LEDGER
+from ..stocks.market_calendar import session_windows
+from ..strats import StrategyDefinition
+
+## bump when a change to the backtester changes the results of a run
+MEMO_VERSION = 3
+
+
+def effective_window(
+    start_time: datetime, end_time: datetime, time_frame: TimeFrame
+) -> Interval | None:
+    """
+    First and last bar a time range can hold, so ranges that hold the same
+    bars, like two runs over a weekend, give the same window
+    """
+    windows = session_windows([(start_time, end_time)], time_frame)
+    if not windows:
+        return None
+    first, last = windows[0][0], windows[-1][1]
+    if time_frame.unit != TimeFrameUnit.Day:
+        minute = timedelta(minutes=1)
+        if first.second or first.microsecond:
+            first = first.replace(second=0, microsecond=0) + minute
+        last = last.replace(second=0, microsecond=0)
+    return first, last
+
+
+def normalize_strategy(definition: StrategyDefinition) -> dict:
+    """A strategy definition with its conditions in a fixed order"""
+    normalized = definition.model_dump(mode="json")
+    normalized["conditions"] = sorted(
+        normalized["conditions"], key=lambda condition: condition["name"]
+    )
+    return normalized
+
+
+def _clipped(covered: list[Interval], window: Interval | None) -> list[list[str]]:
+    """Covered intervals cut to a window, as strings to hash"""
+    if window is None:
+        return []
+    return [
+        [max(start, window[0]).isoformat(), min(end, window[1]).isoformat()]
+        for start, end in covered
+        if start <= window[1] and end >= window[0]
+    ]
+
+
+def data_versions(
+    symbols: list[str], backtest: Interval | None, historic: Interval | None
+) -> dict[str, list]:
+    """
+    What of a symbol's minute bars, day bars and qoutes have been fetched
+    inside the windows a run reads, which only changes when they are backfilled
+    """
+    windows = [window for window in (backtest, historic) if window is not None]
+    if not windows:
+        return {symbol: [] for symbol in symbols}
+    start = min(window[0] for window in windows)
+    end = max(window[1] for window in windows)
+    minutes = get_coverage(symbols, TimeFrame.Minute.value, start, end)
+    days = get_coverage(symbols, TimeFrame.Day.value, start, end)
+    qoutes = get_coverage(symbols, QOUTE_LEDGER, start, end)
+    return {
+        symbol: [
+            _clipped(minutes[symbol], (start, end)),
+            _clipped(days[symbol], historic),
+            _clipped(qoutes[symbol], backtest),
+        ]
+        for symbol in symbols
+    }
+
+
+def run_keys(
+    strategies: list[StrategyDefinition],
+    symbols: list[str],
+    start_time_backtest: datetime,
+    end_time_backtest: datetime,
+    start_time_historic: datetime,
+    end_time_historic: datetime,
+    vectorized: bool,
+) -> dict[tuple[str, str], str]:
+    """
+    sha256 of everything a run's result and stored curve depend on,
+    per strategy alias and symbol
+    """
+    backtest = effective_window(
+        start_time_backtest, end_time_backtest, TimeFrame.Minute
+    )
+    historic = effective_window(start_time_historic, end_time_historic, TimeFrame.Day)
+    versions = data_versions(symbols, backtest, historic)
+    keys = {}
+    for strategy in strategies:
+        normalized = normalize_strategy(strategy)
+        for symbol in symbols:
+            payload = {
+                "version": MEMO_VERSION,
+                "strategy": normalized,
+                "symbol": symbol,
+                "backtest": [value.isoformat() for value in backtest or ()],
+                "historic": [value.isoformat() for value in historic or ()],
+                "data": versions[symbol],
+                "vectorized": vectorized,
+            }
+            keys[(strategy.alias, symbol)] = hashlib.sha256(
+                json.dumps(payload, sort_keys=True).encode()
+            ).hexdigest()
+    return keys
+
+
+def load_cached_runs(keys: list[str]) -> dict[str, BacktestRuns]:
+    """The latest run of a completed backtest for each key that has one"""
+    if not keys:
+        return {}
+    with get_sync_sessionm().begin() as session:  # pylint: disable=no-member
+        runs = session.execute(
+            select(BacktestRuns)
+            .join(Backtests, Backtests.id == BacktestRuns.backtest_id)
+            .where(
+                BacktestRuns.cache_key.in_(keys),
+                Backtests.status == Status.COMPLETED,
+            )
+            .order_by(BacktestRuns.id.desc())
+        ).scalars()
+        cached: dict[str, BacktestRuns] = {}
+        for run in runs:
+            cached.setdefault(run.cache_key, run)
+        session.expunge_all()
+    return cached
@@ -2,13 +2,60 @@
 Define the MockTrader object to simulate buying and selling of shares
 """
 
-from copy import deepcopy
 from dataclasses import dataclass, field
 from datetime import datetime
 
 from alpaca.trading import Order, OrderSide, TimeInForce
 
 from ..stocks.models import NullPosition
+from .recorder import EquityRecorder
+
+
+class MockPosition:
+    """
+    Numeric position in a symbol, converted to an alpaca Position
+    only when it leaves the backtester
+    """
+
+    __slots__ = (
+        "symbol",
+        "qty",
+        "avg_entry_price",
+        "cost_basis",
+        "current_price",
+        "market_value",
+        "unrealized_pl",
+        "unrealized_plpc",
+    )
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.qty = 0
+        self.avg_entry_price = 0.0
+        self.cost_basis = 0.0
+        self.current_price = 0.0
+        self.market_value = 0.0
+        self.unrealized_pl = 0.0
+        self.unrealized_plpc = 0.0
+
+    @property
+    def qty_available(self):
+        """Every share held is available to trade in a backtest"""
+        return self.qty
+
+    def to_position(self) -> NullPosition:
+        """The position as alpaca returns it, with every number as a string"""
+        return NullPosition(
+            symbol=self.symbol,
+            qty=str(self.qty),
+            qty_available=str(self.qty),
+            avg_entry_price=str(self.avg_entry_price),
+            cost_basis=str(self.cost_basis),
+            current_price=str(self.current_price),
+            market_value=str(self.market_value),
+            unrealized_pl=str(self.unrealized_pl),
+            unrealized_plpc=str(self.unrealized_plpc),
+        )
 
 
 @dataclass
@@ -17,7 +64,7 @@ class MockStats:
     Stats to collect about the trading performance
     """
 
-    positions: dict[str, NullPosition] = field(default_factory=dict)
+    positions: dict[str, MockPosition] = field(default_factory=dict)
     orders: list[Order] = field(default_factory=list)
     buying_power: float = 1_000
     starting_buying_power: float = 1_000
@@ -32,7 +79,8 @@ class MockTrader:
 
     def __init__(self):
         self.stats = MockStats()
-        self.stats_record: list[MockStats] = []
+        self.recorder = EquityRecorder()
+        self.market_value = 0.0
         self.buying_power = self.stats.buying_power
 
     @classmethod
@@ -46,8 +94,8 @@ class MockTrader:
         """get our position for a symbol"""
         if (position := self.stats.positions.get(symbol)) is not None:
             return position
-        self.stats.positions[symbol] = NullPosition(symbol=symbol)
-        return self.stats.positions[symbol]
+        position = self.stats.positions[symbol] = MockPosition(symbol)
+        return position
 
     def place_order(
         self,
@@ -86,9 +134,14 @@ class MockTrader:
             "buys": self.stats.buys,
             "sells": self.stats.sells,
             "total_positions_held": sum(
-                [int(pos.qty) for pos in self.stats.positions.values()]
+                [pos.qty for pos in self.stats.positions.values()]
             ),
-            "positions": {"positions_held": dict(self.stats.positions)},
+            "positions": {
+                "positions_held": {
+                    symbol: pos.to_position().model_dump(mode="json")
+                    for symbol, pos in self.stats.positions.items()
+                }
+            },
         }
         return response
 
@@ -99,48 +152,55 @@ class MockTrader:
         quantity: int,
         price: float,
         timestamp: datetime,
+        record: bool = True,
     ):
         """
-        Update trading history stats after having executed / not executed
+        Update trading history stats after having executed / not executed,
+        record is off for callers that record the equity curve themselves
         """
         self.stats.timestamp = timestamp
-        new_cost_basis = 0
-        new_qty = 0
 
         position = self.get_position(symbol)
-        position.current_price = str(price)
-        position.market_value = str(price * int(position.qty))
-        cost_basis = int(position.qty) * float(position.avg_entry_price)
-
-        self.stats.equity = self.stats.buying_power + sum(
-            [float(pos.market_value) for pos in self.stats.positions.values()]
-        )
+        market_value = price * position.qty
+        ## equity is kept up to date by only applying the change in this position
+        self.market_value += market_value - position.market_value
+        position.current_price = price
+        position.market_value = market_value
         if (side, quantity) != (None, None):
+            cost_basis = position.qty * position.avg_entry_price
             new_total = quantity * price
             if side == OrderSide.BUY:
                 self.stats.buying_power -= price * quantity
                 self.stats.buys += quantity
                 new_cost_basis = cost_basis + new_total
-                new_qty = int(position.qty) + quantity
+                new_qty = position.qty + quantity
 
             elif side == OrderSide.SELL:
                 self.stats.buying_power += price * quantity
                 self.stats.sells += quantity
                 new_cost_basis = cost_basis - new_total
-                new_qty = int(position.qty) - quantity
-            position.avg_entry_price = str(new_cost_basis / (new_qty or 1))
-            position.cost_basis = str(new_cost_basis)
-            position.qty = str(new_qty)
-            position.qty_available = str(new_qty)
+                new_qty = position.qty - quantity
+            else:
+                new_cost_basis, new_qty = 0, 0
+            position.avg_entry_price = new_cost_basis / (new_qty or 1)
+            position.cost_basis = new_cost_basis
+            position.qty = new_qty
 
             total_pl = (price * new_qty) - new_cost_basis
 
-            position.unrealized_pl = str(0) if new_qty == 0 else str(total_pl)
+            position.unrealized_pl = 0 if new_qty == 0 else total_pl
             position.unrealized_plpc = (
-                str(0) if new_qty == 0 else str(total_pl / (new_cost_basis or 1) * 100)
+                0 if new_qty == 0 else total_pl / (new_cost_basis or 1) * 100
             )
 
-        self.stats.equity = self.stats.buying_power + sum(
-            [float(pos.market_value) for pos in self.stats.positions.values()]
+        self.stats.equity = self.stats.buying_power + self.market_value
+        if not record:
+            return
+        self.recorder.record(
+            timestamp,
+            self.stats.equity,
+            self.stats.buying_power,
+            self.stats.buys,
+            self.stats.sells,
+            {sym: pos.qty for sym, pos in self.stats.positions.items()},
         )
-        self.stats_record.append(deepcopy(self.stats))
@@ -0,0 +1,192 @@
+"""
+Array backed record of a MockTrader's equity curve
+"""
+
+import io
+from collections.abc import Mapping
+from datetime import datetime
+
+import numpy as np
+
+RECORD_COLUMNS = {
+    "timestamp": "datetime64[us]",
+    "equity": np.float64,
+    "buying_power": np.float64,
+    "buys": np.int64,
+    "sells": np.int64,
+}
+VALUE_COLUMNS = list(RECORD_COLUMNS)[1:]
+
+
+class EquityRecorder:
+    """
+    Preallocated columns of timestamp, equity, buying power, buys, sells and
+    the quantity held of each symbol, grown by doubling. A snapshot is only
+    kept when something other than the timestamp has changed
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.columns = {
+            name: np.empty(capacity, dtype=dtype)
+            for name, dtype in RECORD_COLUMNS.items()
+        }
+        self.symbols: dict[str, int] = {}
+        self.quantities = np.zeros((capacity, 0))
+        self._last_values: tuple = ()
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        """Double the capacity of every column"""
+        for name, column in self.columns.items():
+            self.columns[name] = np.resize(column, 2 * len(column))
+        quantities = np.zeros((2 * len(self.quantities), len(self.symbols)))
+        quantities[: self.size] = self.quantities[: self.size]
+        self.quantities = quantities
+
+    def _symbol_column(self, symbol: str):
+        """Column index of a symbol's quantity, added as zeros when first seen"""
+        if (column := self.symbols.get(symbol)) is None:
+            column = self.symbols[symbol] = len(self.symbols)
+            self.quantities = np.hstack(
+                [self.quantities, np.zeros((len(self.quantities), 1))]
+            )
+        return column
+
+    def record(
+        self,
+        timestamp: datetime,
+        equity: float,
+        buying_power: float,
+        buys: int,
+        sells: int,
+        quantities: Mapping[str, float],
+    ):
+        """Snapshot the trader, skipping it if nothing but the timestamp changed"""
+        held = [
+            (self._symbol_column(symbol), qty) for symbol, qty in quantities.items()
+        ]
+        row = np.zeros(len(self.symbols))
+        for column, qty in held:
+            row[column] = qty
+        values = (equity, buying_power, buys, sells)
+        if (
+            self.size
+            and values == self._last_values
+            and np.array_equal(self.quantities[self.size - 1], row)
+        ):
+            return
+        if self.size == len(self.columns["timestamp"]):
+            self._grow()
+        index = self.size
+        self.columns["timestamp"][index] = np.datetime64(
+            timestamp.replace(tzinfo=None), "us"
+        )
+        for name, value in zip(VALUE_COLUMNS, values):
+            self.columns[name][index] = value
+        self.quantities[index] = row
+        self._last_values = values
+        self.size += 1
+
+    def record_series(
+        self,
+        timestamps: np.ndarray,
+        values: Mapping[str, np.ndarray],
+        quantities: Mapping[str, np.ndarray],
+    ):
+        """
+        Snapshot a run of bars at once, values holding a column for each of
+        VALUE_COLUMNS. Like record, snapshots where nothing but the timestamp
+        changed are skipped
+        """
+        count = len(timestamps)
+        if not count:
+            return
+        held = [
+            (self._symbol_column(symbol), qty) for symbol, qty in quantities.items()
+        ]
+        rows = np.zeros((count, len(self.symbols)))
+        for column, qty in held:
+            rows[:, column] = qty
+        stacked = np.column_stack([values[name] for name in VALUE_COLUMNS])
+        keep = np.ones(count, dtype=bool)
+        keep[1:] = np.any(stacked[1:] != stacked[:-1], axis=1) | np.any(
+            rows[1:] != rows[:-1], axis=1
+        )
+        if self.size:
+            keep[0] = tuple(stacked[0]) != self._last_values or not np.array_equal(
+                self.quantities[self.size - 1], rows[0]
+            )
+        kept = np.flatnonzero(keep)
+        while self.size + len(kept) > len(self.columns["timestamp"]):
+            self._grow()
+        end = self.size + len(kept)
+        self.columns["timestamp"][self.size : end] = timestamps[kept]
+        for index, name in enumerate(VALUE_COLUMNS):
+            self.columns[name][self.size : end] = stacked[kept, index]
+        self.quantities[self.size : end] = rows[kept]
+        if len(kept):
+            last = stacked[kept[-1]].tolist()
+            self._last_values = (last[0], last[1], int(last[2]), int(last[3]))
+        self.size = end
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """The recorded columns, trimmed to the snapshots taken"""
+        return {name: column[: self.size] for name, column in self.columns.items()}
+
+    def positions(self, index: int) -> dict[str, float]:
+        """Quantity held of each symbol at a snapshot"""
+        return {
+            symbol: self.quantities[index, column].item()
+            for symbol, column in self.symbols.items()
+        }
+
+    def rows(self):
+        """Snapshots as dicts"""
+        arrays = self.arrays()
+        for index in range(self.size):
+            yield {
+                **{name: column[index].item() for name, column in arrays.items()},
+                "positions": self.positions(index),
+            }
+
+    def to_bytes(self) -> bytes:
+        """
+        The curve as a compressed npz blob. Quantities are only kept for the
+        snapshots where a position changed, as they mostly stay the same
+        """
+        quantities = self.quantities[: self.size]
+        changed = np.ones(self.size, dtype=bool)
+        changed[1:] = np.any(quantities[1:] != quantities[:-1], axis=1)
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            **self.arrays(),
+            symbols=np.array(list(self.symbols), dtype=str),
+            position_rows=np.flatnonzero(changed),
+            position_quantities=quantities[changed],
+        )
+        return buffer.getvalue()
+
+
+def load_curve(blob: bytes) -> list[dict]:
+    """Snapshots of a curve stored with EquityRecorder.to_bytes"""
+    with np.load(io.BytesIO(blob)) as data:
+        arrays = {name: data[name] for name in RECORD_COLUMNS}
+        symbols = data["symbols"].tolist()
+        position_rows = data["position_rows"]
+        position_quantities = data["position_quantities"]
+    ## the position at each snapshot is the last one recorded at or before it
+    size = len(arrays["timestamp"])
+    latest = np.searchsorted(position_rows, np.arange(size), side="right")
+    return [
+        {
+            **{name: column[index].item() for name, column in arrays.items()},
+            "positions": dict(
+                zip(symbols, position_quantities[latest[index] - 1].tolist())
+            ),
+        }
+        for index in range(size)
+    ]
@@ -0,0 +1,187 @@
+"""
+Running single strategy and symbol backtests, in this process or a worker process
+"""
+
+import logging
+from copy import deepcopy
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+
+from alpaca.data.models import Bar
+from alpaca.data.timeframe import TimeFrame
+
+from ..consts import BARSET_TYPE
+from ..settings import get_settings, get_sync_sessionm
+from ..stocks import History, QouteIndex, SymbolBars
+from ..stocks.market_calendar import session_mask
+from ..strats import (
+    Condition,
+    Strategy,
+    StrategyDefinition,
+    get_all_conditions,
+    get_strategy_class,
+)
+from .mocktrader import MockTrader
+from .vectorized import can_vectorize, test_strat_vectorized
+
+
+def strategy_from_definition(
+    definition: StrategyDefinition, all_conditions: dict[str, Condition]
+) -> tuple[type[Strategy], list[Condition]]:
+    """Build a strategy class and its conditions from a strategy definition"""
+    conditions = []
+    for cond in definition.conditions:
+        if (condition := all_conditions.get(cond.name)) is None:
+            raise KeyError(f"condition {cond.name} doesn't exist")
+        new_condition = deepcopy(condition)
+        new_condition.update_variables(cond.variables)
+        new_condition.active = cond.active
+        new_condition.type = cond.type
+        conditions.append(new_condition)
+    strat_class = get_strategy_class(
+        definition.name, definition.alias, definition.active, conditions
+    )
+    return strat_class, conditions
+
+
+def build_strategy(
+    strat_class: type[Strategy],
+    conditions: list[Condition],
+    history: History,
+    historic_data: BARSET_TYPE,
+    qoutes: QouteIndex,
+    sync_strategy: bool = True,
+):
+    """
+    Instantiate a strategy from data that's already loaded. Syncing overwrites
+    the conditions with the strategy's stored ones, like Strategy.create does,
+    which sweeps skip so their variables are kept
+    """
+    if sync_strategy:
+        with get_sync_sessionm().begin() as session:
+            try:
+                strat_class.get(session)
+            except KeyError:
+                logging.warning("strategy doesn't exist in database")
+    return strat_class(history, historic_data, conditions, qoutes)
+
+
+def test_strat(
+    strategy: Strategy,
+    trader: MockTrader,
+    bars: list[Bar],
+):
+    """
+    Run the trading strategy over all bars in specified time period using the mocktrader
+    """
+    strat_name = type(strategy).__name__
+    num_bars = len(bars)
+    symbol = bars[0].symbol
+    last_percent = 0
+    for i in range(num_bars):
+        percent_completed = int(i / num_bars * 100)
+        if percent_completed > last_percent + 20:
+            last_percent = percent_completed
+            logging.debug(
+                "Progress of %s on %s: %s", strat_name, symbol, percent_completed
+            )
+        action, qty = strategy.run(trader, bars[i], False)
+        trader.post_trade_update(symbol, action, qty, bars[i].close, bars[i].timestamp)
+
+    return trader, strategy
+
+
+def run_strat(
+    strategy: Strategy, trader: MockTrader, bars: SymbolBars, vectorized: bool
+) -> tuple[MockTrader, str]:
+    """Backtest a strategy on one symbol's session bars, returning the trader"""
+    if not len(bars):
+        logging.warning("no bars to backtest %s on %s", strategy.ALIAS, bars.symbol)
+        return trader, strategy.ALIAS
+    if vectorized and can_vectorize(strategy):
+        test_strat_vectorized(strategy, trader, bars)
+    else:
+        test_strat(strategy, trader, bars.to_bars())
+    return trader, strategy.ALIAS
+
+
+@dataclass
+class RunSpec:
+    """
+    Everything a worker process needs to run one backtest, small enough
+    to send to it cheaply. Bars and qoutes are loaded by the worker itself
+    """
+
+    strategy: StrategyDefinition
+    symbol: str
+    start_time: datetime
+    end_time: datetime
+    historic_start_time: datetime
+    historic_end_time: datetime
+    vectorized: bool = False
+    sync_strategy: bool = True
+
+
+@lru_cache
+def _worker_history():
+    """History object shared by every run in a worker process"""
+    return History.create(get_settings())
+
+
+@lru_cache(maxsize=16)
+def _load_symbol(
+    symbol: str,
+    start_time: datetime,
+    end_time: datetime,
+    historic_start_time: datetime,
+    historic_end_time: datetime,
+):
+    """
+    Session bars, qoutes and historic bars for a symbol, kept so a worker
+    loads them once for all the runs it gets on that symbol
+    """
+    history = _worker_history()
+    symbol_bars = history.get_stock_bars(
+        [symbol],
+        time_frame=TimeFrame.Minute,
+        start_time=start_time,
+        end_time=end_time,
+    ).get(symbol)
+    historic_data = history.get_stock_bars(
+        [symbol],
+        time_frame=TimeFrame.Day,
+        start_time=historic_start_time,
+        end_time=historic_end_time,
+    )
+    return (
+        symbol_bars[session_mask(symbol_bars.timestamp)],
+        QouteIndex.load([symbol], start_time, end_time),
+        historic_data,
+    )
+
+
+def run_strat_in_worker(spec: RunSpec) -> tuple[MockTrader, str]:
+    """
+    Entry point of a worker process. Loads the symbol's bars and qoutes
+    from postgres, which the parent has already backfilled, and runs the backtest
+    """
+    strat_class, conditions = strategy_from_definition(
+        spec.strategy, get_all_conditions()
+    )
+    bars, qoutes, historic_data = _load_symbol(
+        spec.symbol,
+        spec.start_time,
+        spec.end_time,
+        spec.historic_start_time,
+        spec.historic_end_time,
+    )
+    strategy = build_strategy(
+        strat_class,
+        conditions,
+        _worker_history(),
+        historic_data,
+        qoutes,
+        spec.sync_strategy,
+    )
+    return run_strat(strategy, MockTrader.create(), bars, spec.vectorized)
@@ -0,0 +1,66 @@
+"""
+Parameter sweeps, backtesting a strategy with every combination of condition variables
+"""
+
+import itertools
+from typing import Any
+
+from ..strats import Condition, StrategyDefinition
+from .consts import ParameterRange
+from .mocktrader import MockTrader
+
+
+def parameter_grid(
+    parameters: dict[str, dict[str, list[Any] | ParameterRange]]
+) -> list[dict[str, dict[str, Any]]]:
+    """Every combination of the values given for each condition variable"""
+    keys = [
+        (condition, variable)
+        for condition, variables in parameters.items()
+        for variable in variables
+    ]
+    value_lists = [
+        values.values() if isinstance(values, ParameterRange) else values
+        for variables in parameters.values()
+        for values in variables.values()
+    ]
+    grid = []
+    for values in itertools.product(*value_lists):
+        combination: dict[str, dict[str, Any]] = {}
+        for (condition, variable), value in zip(keys, values):
+            combination.setdefault(condition, {})[variable] = value
+        grid.append(combination)
+    return grid
+
+
+def apply_parameters(
+    definition: StrategyDefinition,
+    parameters: dict[str, dict[str, Any]],
+    all_conditions: dict[str, Condition],
+) -> StrategyDefinition:
+    """A copy of a strategy definition with condition variables overridden"""
+    names = {cond.name for cond in definition.conditions}
+    for name, variables in parameters.items():
+        if name not in names:
+            raise KeyError(f"condition {name} isn't in strategy {definition.alias}")
+        if unknown := set(variables) - set(all_conditions[name].variables):
+            raise KeyError(f"condition {name} has no variables {sorted(unknown)}")
+    swept = definition.model_copy(deep=True)
+    for cond in swept.conditions:
+        if cond.name in parameters:
+            cond.variables = {**cond.variables, **parameters[cond.name]}
+    return swept
+
+
+def summarise(traders: dict[str, MockTrader]) -> dict:
+    """Totals across the symbols a parameter combination was run on"""
+    starting = sum(trader.stats.starting_buying_power for trader in traders.values())
+    equity = sum(trader.stats.equity for trader in traders.values())
+    return {
+        "starting_buying_power": starting,
+        "equity": equity,
+        "profit": equity - starting,
+        "buys": sum(trader.stats.buys for trader in traders.values()),
+        "sells": sum(trader.stats.sells for trader in traders.values()),
+        "symbols": {symbol: trader.stats.equity for symbol, trader in traders.items()},
+    }
@@ -0,0 +1,197 @@
+"""
+Vectorized backtesting, evaluating conditions over whole bar series at once
+"""
+
+import logging
+
+import numpy as np
+from alpaca.trading import OrderSide, TimeInForce
+
+from ..stocks import SymbolBars
+from ..strats import BarContext, ConditionType, Strategy
+from ..strats.indicators import IndicatorSet
+from .mocktrader import MockTrader
+
+
+def can_vectorize(strategy: Strategy):
+    """
+    Whether every active condition of a strategy has a vectorized form or only
+    depends on the position, and buys can be priced without asking alpaca
+    """
+    return strategy.qoutes is not None and all(
+        condition.vectorizable for condition in strategy.conditions if condition.active
+    )
+
+
+def _next_true(mask: np.ndarray) -> np.ndarray:
+    """For each index, the index of the next True at or after it, len(mask) if none"""
+    size = len(mask)
+    positions = np.where(mask, np.arange(size), size)
+    return np.minimum.accumulate(positions[::-1])[::-1]
+
+
+class VectorizedRun:
+    """
+    A strategy run on one symbol's bars. Bar conditions are computed as boolean
+    arrays up front. Stateful conditions only change when the position does,
+    so they are evaluated once per trade, and the next trade is found by
+    looking up the first bar after it where the combined signals fire.
+    """
+
+    def __init__(self, strategy: Strategy, trader: MockTrader, bars: SymbolBars):
+        self.strategy = strategy
+        self.trader = trader
+        self.bars = bars
+        ## the batch form of the indicators the per bar loop would update
+        indicators = IndicatorSet(strategy.market.specs).batch(bars)
+        self.vectors: dict[tuple[OrderSide, ConditionType], np.ndarray] = {}
+        for side, types in strategy.condition_map.items():
+            for type_, conditions in types.items():
+                reduce = np.logical_and if type_ == ConditionType.AND else np.logical_or
+                signals = [
+                    condition.vector(bars, indicators)
+                    for condition in conditions
+                    if condition.active and not condition.stateful
+                ]
+                self.vectors[(side, type_)] = (
+                    reduce.reduce(signals)
+                    if signals
+                    else np.full(len(bars), type_ == ConditionType.AND)
+                )
+        ask_prices = strategy.qoutes.ask_prices(bars.symbol, bars.timestamp)
+        ask_prices = np.where(np.isnan(ask_prices), bars.close, ask_prices)
+        self.affordable = trader.buying_power >= ask_prices + 0.02 * ask_prices
+        self._signals: dict[tuple[bool, ...], tuple[np.ndarray, np.ndarray]] = {}
+
+    def _stateful(self, index: int) -> tuple[bool, ...]:
+        """Stateful AND and OR results per side for the position at a bar"""
+        context = BarContext.load(
+            self.bars.bar(index), self.trader, self.strategy.ask_price
+        )
+        key = []
+        for side in (OrderSide.BUY, OrderSide.SELL):
+            and_conditions, or_conditions = (
+                [
+                    condition
+                    for condition in self.strategy.condition_map[side][type_]
+                    if condition.active and condition.stateful
+                ]
+                for type_ in (ConditionType.AND, ConditionType.OR)
+            )
+            key.append(all(condition(context) for condition in and_conditions))
+            key.append(any(condition(context) for condition in or_conditions))
+        return tuple(key)
+
+    def _side_signal(self, side: OrderSide, stateful_and: bool, stateful_or: bool):
+        """Combine the vectors of one side with its stateful results"""
+        signal = self.vectors[(side, ConditionType.AND)] & stateful_and
+        return signal | self.vectors[(side, ConditionType.OR)] | stateful_or
+
+    def _signals_for(self, key: tuple[bool, ...]):
+        """Buy signals and the next trading bar for a set of stateful results"""
+        if (signals := self._signals.get(key)) is None:
+            buy = self._side_signal(OrderSide.BUY, *key[:2])
+            sell = self._side_signal(OrderSide.SELL, *key[2:])
+            ## an unaffordable buy signal skips the sell check, like Strategy.trade
+            trades = (buy & self.affordable) | (~buy & sell)
+            signals = self._signals[key] = (buy, _next_true(trades))
+        return signals
+
+    def _record_curve(self, trades: list[tuple[int, OrderSide, int]], start: dict):
+        """
+        Mark to market at every bar in one pass over close, recording the same
+        snapshots test_strat does by updating the trader at every bar. As in
+        post_trade_update, a bar's market value uses the quantity held before
+        that bar's trade
+        """
+        close, num_bars = self.bars.close, len(self.bars)
+        qty_change, cash_change = np.zeros(num_bars), np.zeros(num_bars)
+        buys, sells = np.zeros(num_bars), np.zeros(num_bars)
+        for index, side, qty in trades:
+            sign = 1 if side == OrderSide.BUY else -1
+            qty_change[index] += sign * qty
+            cash_change[index] -= sign * qty * close[index]
+            (buys if side == OrderSide.BUY else sells)[index] += qty
+        held = start["qty"] + np.cumsum(qty_change)
+        buying_power = start["buying_power"] + np.cumsum(cash_change)
+        market_value = close * (held - qty_change) + start["other_market_value"]
+        quantities = {
+            symbol: np.full(num_bars, position.qty)
+            for symbol, position in self.trader.stats.positions.items()
+        }
+        quantities[self.bars.symbol] = held
+        self.trader.recorder.record_series(
+            self.bars.timestamp,
+            {
+                "equity": buying_power + market_value,
+                "buying_power": buying_power,
+                "buys": start["buys"] + np.cumsum(buys),
+                "sells": start["sells"] + np.cumsum(sells),
+            },
+            quantities,
+        )
+
+    def run(self):
+        """
+        Trade over every bar, updating the trader at each trade and the last bar,
+        then record the equity curve at every bar
+        """
+        symbol, num_bars = self.bars.symbol, len(self.bars)
+        close, timestamps = self.bars.close, self.bars.timestamp
+        position = self.trader.get_position(symbol, force=True)
+        start = {
+            "qty": position.qty,
+            "buying_power": self.trader.stats.buying_power,
+            "buys": self.trader.stats.buys,
+            "sells": self.trader.stats.sells,
+            "other_market_value": self.trader.market_value - position.market_value,
+        }
+        trades: list[tuple[int, OrderSide, int]] = []
+        index, last_update = 0, -1
+        while self.strategy.ACTIVE and index < num_bars:
+            buy, next_trade = self._signals_for(self._stateful(index))
+            if (index := int(next_trade[index])) >= num_bars:
+                break
+            position = self.trader.get_position(symbol, force=True)
+            qty_available = int(position.qty_available)
+            if buy[index]:
+                side = OrderSide.BUY
+                qty = -qty_available if qty_available < 0 else 1
+            else:
+                side = OrderSide.SELL
+                qty = qty_available if qty_available > 0 else 1
+            self.trader.place_order(
+                symbol, time_in_force=TimeInForce.GTC, side=side, quantity=qty
+            )
+            self.trader.post_trade_update(
+                symbol,
+                side,
+                qty,
+                close[index].item(),
+                timestamps[index].item(),
+                record=False,
+            )
+            trades.append((index, side, qty))
+            last_update, index = index, index + 1
+        if num_bars and last_update != num_bars - 1:
+            self.trader.post_trade_update(
+                symbol,
+                None,
+                None,
+                close[-1].item(),
+                timestamps[-1].item(),
+                record=False,
+            )
+        self._record_curve(trades, start)
+        return self.trader, self.strategy
+
+
+def test_strat_vectorized(strategy: Strategy, trader: MockTrader, bars: SymbolBars):
+    """Vectorized equivalent of test_strat"""
+    logging.debug(
+        "vectorized run of %s on %s over %s bars",
+        type(strategy).__name__,
+        bars.symbol,
+        len(bars),
+    )
+    return VectorizedRun(strategy, trader, bars).run()
@@ -6,9 +6,10 @@ from enum import StrEnum
 
 from alpaca.data.models import BarSet
 
+from .stocks.bars import BarStore
 from .stocks.models import CustomBarSet
 
-BARSET_TYPE = BarSet | CustomBarSet
+BARSET_TYPE = BarSet | CustomBarSet | BarStore
 
 
 class Status(StrEnum):
@@ -16,6 +17,8 @@ class Status(StrEnum):
     Status of a backtest and running of the application
     """
 
+    QUEUED = "queued"
     IN_PROGRESS = "inprogress"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
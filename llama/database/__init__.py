@@ -6,6 +6,7 @@ from .models import (
     Account,
     Assets,
     Backtests,
+    BarCoverage,
     Bars,
     Conditions,
     Orders,
@@ -21,6 +22,7 @@ __all__ = [
     "Account",
     "Assets",
     "Backtests",
+    "BarCoverage",
     "Bars",
     "Conditions",
     "Orders",
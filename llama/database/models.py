@@ -7,7 +7,7 @@ from typing import Optional
 from uuid import UUID
 
 from alpaca.trading import AccountStatus
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, LargeBinary, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 from trekkers import BaseSql
@@ -73,6 +73,19 @@ class Bars(BaseSql):
     volume: Mapped[int]
 
 
+class BarCoverage(BaseSql):
+    """Time ranges of bars already fetched from alpaca, including empty ranges"""
+
+    __tablename__ = "bar_coverage"
+    __table_args__ = {"schema": "llama"}
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    symbol: Mapped[str] = mapped_column(index=True)
+    timeframe: Mapped[str]
+    start_time: Mapped[datetime]
+    end_time: Mapped[datetime]
+
+
 class Trades(BaseSql):
     """Trade information for specific symbols"""
 
@@ -93,7 +106,10 @@ class Qoutes(BaseSql):
     """Qoute information for specific symbols"""
 
     __tablename__ = "qoutes"
-    __table_args__ = {"schema": "llama"}
+    __table_args__ = (
+        Index("ix_llama_qoutes_symbol_timestamp", "symbol", "timestamp"),
+        {"schema": "llama"},
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     symbol: Mapped[str]
@@ -195,13 +211,33 @@ class Backtests(BaseSql):
     """Backtest run information"""
 
     __tablename__ = "backtests"
-    __table_args__ = {"schema": "llama"}
+    __table_args__ = (
+        Index(
+            "ix_llama_backtests_queue",
+            "priority",
+            "id",
+            postgresql_where=text("status = 'queued'"),
+        ),
+        {"schema": "llama"},
+    )
     id: Mapped[int] = mapped_column(autoincrement=True, primary_key=True)
     symbols: Mapped[list[str]] = mapped_column(type_=JSONB)
     result: Mapped[Optional[dict]] = mapped_column(type_=JSONB, nullable=True)
     status: Mapped[str]
     timestamp: Mapped[datetime]
     strategies: Mapped[dict] = mapped_column(nullable=True, type_=JSONB)
+    parent_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("llama.backtests.id"), index=True, nullable=True
+    )
+    parameters: Mapped[Optional[dict]] = mapped_column(type_=JSONB, nullable=True)
+    kind: Mapped[Optional[str]]
+    definition: Mapped[Optional[dict]] = mapped_column(type_=JSONB, nullable=True)
+    priority: Mapped[int] = mapped_column(default=0, server_default="0")
+    cancel_requested: Mapped[bool] = mapped_column(
+        default=False, server_default="false"
+    )
+    claimed_by: Mapped[Optional[str]]
+    claimed_at: Mapped[Optional[datetime]]
 
 
 class BacktestStats(BaseSql):
@@ -221,6 +257,23 @@ class BacktestStats(BaseSql):
     timestamp: Mapped[datetime]
 
 
+class BacktestRuns(BaseSql):
+    """Equity curve of one strategy on one symbol in a backtest"""
+
+    __tablename__ = "backtest_runs"
+    __table_args__ = {"schema": "llama"}
+    id: Mapped[int] = mapped_column(autoincrement=True, primary_key=True)
+    backtest_id: Mapped[int] = mapped_column(
+        ForeignKey("llama.backtests.id"), index=True
+    )
+    strategy: Mapped[str]
+    symbol: Mapped[str]
+    snapshots: Mapped[int]
+    curve: Mapped[bytes] = mapped_column(type_=LargeBinary)
+    cache_key: Mapped[Optional[str]] = mapped_column(index=True)
+    result: Mapped[Optional[dict]] = mapped_column(type_=JSONB, nullable=True)
+
+
 class Assets(BaseSql):
     """Existing and tradable assets on Alpaca"""
 
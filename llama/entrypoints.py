@@ -5,6 +5,8 @@ Application Entrypoint
 import asyncio
 import json
 import logging
+import os
+import socket
 from time import sleep
 
 import uvicorn
@@ -12,7 +14,8 @@ from trekkers import database
 from yumi import Entrypoints
 
 
-from .backtester import BackTester, BacktestDefinition
+from .backtester import BackTester, BacktestDefinition, SweepDefinition
+from .backtester.consts import JobKind
 from .settings import Settings
 from .stocks import History, Trader
 from .strats import get_all_strats, insert_conditions, insert_strats
@@ -53,7 +56,7 @@ def data_stream(settings: Settings, *_, **__):
         all_ = [asset.symbol for asset in trader.get_assets(trading=True)]
 
     strats = [strat.create(history, all_) for strat in get_all_strats().values()]
-    ls_object = LiveStockDataStream.create(settings, trader)
+    ls_object = LiveStockDataStream.create(settings, trader, history)
     ls_object.strategies = strats
     ls_object.subscribe(bars=all_, qoutes=all_)
 
@@ -82,6 +85,36 @@ def backtest(settings: Settings, *_, **__):
         asyncio.run(backtester.backtest_strats(backtest_id, history, definition))
 
 
+def backtest_worker(settings: Settings, *_, **__):
+    """
+    Claim queued backtests and run them one at a time.
+    Run more of these to run more backtests in parallel
+    """
+    history = History.create(settings)
+    backtester = BackTester.create()
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    logging.info("backtest worker %s waiting for backtests", worker)
+    while True:
+        job = backtester.claim_backtest(worker, settings.backtest_lease_timeout)
+        if job is None:
+            sleep(settings.backtest_poll_interval)
+            continue
+        logging.info("worker %s claimed %s %s", worker, job.kind, job.id)
+        with backtester.hold_claim(job.id, worker, settings.backtest_lease_timeout / 3):
+            if job.kind == JobKind.SWEEP:
+                asyncio.run(
+                    backtester.sweep_strategy(
+                        job.id, history, SweepDefinition(**job.definition)
+                    )
+                )
+            else:
+                asyncio.run(
+                    backtester.backtest_strats(
+                        job.id, history, BacktestDefinition(**job.definition)
+                    )
+                )
+
+
 def debug(settings: Settings, *_, **__):
     """For running whatever functions you want to test"""
     history = History.create(settings)
@@ -97,4 +130,5 @@ class Entry(Entrypoints):
     TRADESTREAM = "tradestream", trade_stream
     DATABASE = "db", db
     BACKTEST = "backtest", backtest
+    BACKTESTWORKER = "backtestworker", backtest_worker
     DEBUG = "debug", debug
@@ -6,6 +6,7 @@ import pathlib
 from functools import lru_cache
 from trekkers.config import DbSettings, get_sync_sessionmaker
 from yumi import JwtConfig, LogConfig
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 TOP_LEVEL_PATH = pathlib.Path(__file__).parent.resolve()
@@ -25,6 +26,15 @@ class Settings(BaseSettings):
     )
     log_config: LogConfig = LogConfig()
     dev_mode: bool = False
+    backfill_workers: int = 4
+    backfill_rate_limit: float = 3.0
+    bar_cache_dir: str | None = None
+    derive_bars: bool = True
+    latest_qoute_ttl: float = 2.0
+    backtest_poll_interval: float = 5.0
+    ## seconds without a renewed claim before a backtest is claimed again
+    backtest_lease_timeout: float = 300.0
+    live_data_depth: int = Field(15, ge=1)
 
 
 @lru_cache
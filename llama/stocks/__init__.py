@@ -2,8 +2,10 @@
 Export Stock Classes and functions
 """
 
+from .bars import BarChunk, BarStore, BarWindow, BarWindows, SymbolBars
 from .history import History
 from .models import CustomBarSet
+from .qoutes import AsOfQoute, QouteIndex
 from .tools import plot_stock_data
 from .trader import Trader
 
@@ -12,4 +14,11 @@ __all__ = [
     "Trader",
     "plot_stock_data",
     "CustomBarSet",
+    "BarChunk",
+    "BarStore",
+    "BarWindow",
+    "BarWindows",
+    "SymbolBars",
+    "AsOfQoute",
+    "QouteIndex",
 ]
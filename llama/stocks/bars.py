@@ -0,0 +1,381 @@
+"""
+Columnar bar containers backed by numpy arrays
+"""
+
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass, fields
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from alpaca.data.models import Bar, BarSet
+
+BAR_COLUMNS = (
+    "timestamp",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "trade_count",
+    "vwap",
+)
+BAR_DTYPES = {
+    "timestamp": "datetime64[us]",
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.float64,
+    "trade_count": np.float64,
+    "vwap": np.float64,
+}
+_RAW_BAR_KEYS = {
+    "timestamp": "t",
+    "open": "o",
+    "high": "h",
+    "low": "l",
+    "close": "c",
+    "volume": "v",
+    "trade_count": "n",
+    "vwap": "vw",
+}
+
+
+def to_datetime64(values: Iterable) -> np.ndarray:
+    """
+    Convert naive (UTC) or timezone aware datetimes into a naive UTC datetime64 array
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        return values.astype(BAR_DTYPES["timestamp"])
+    values = list(values)
+    if not values:
+        return np.empty(0, dtype=BAR_DTYPES["timestamp"])
+    index = pd.to_datetime(values, utc=True).tz_localize(None)
+    return index.to_numpy(dtype=BAR_DTYPES["timestamp"])
+
+
+@dataclass
+class SymbolBars:
+    """
+    Bars for a single symbol held as one numpy array per column, sorted by timestamp
+    """
+
+    symbol: str
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    trade_count: np.ndarray
+    vwap: np.ndarray
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, index: slice | np.ndarray):
+        """Slice or mask every column at once"""
+        return SymbolBars(
+            self.symbol, **{col: getattr(self, col)[index] for col in BAR_COLUMNS}
+        )
+
+    @classmethod
+    def empty(cls, symbol: str):
+        """Bars object with no rows"""
+        return cls(
+            symbol, **{col: np.empty(0, dtype=BAR_DTYPES[col]) for col in BAR_COLUMNS}
+        )
+
+    @classmethod
+    def from_columns(cls, symbol: str, columns: Mapping[str, Sequence]):
+        """Build from a mapping of column name to column values"""
+        return cls(
+            symbol,
+            timestamp=to_datetime64(columns["timestamp"]),
+            **{
+                col: np.asarray(columns[col], dtype=BAR_DTYPES[col])
+                for col in BAR_COLUMNS[1:]
+            },
+        )
+
+    @classmethod
+    def from_bars(cls, symbol: str, bars: Sequence[Bar]):
+        """Build from alpaca bar objects"""
+        return cls.from_columns(
+            symbol,
+            {col: [getattr(bar_, col) for bar_ in bars] for col in BAR_COLUMNS},
+        ).sort()
+
+    @classmethod
+    def concat(cls, symbol: str, parts: Sequence["SymbolBars"]):
+        """Join several bar arrays into one sorted, de-duplicated array"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty(symbol)
+        if len(parts) == 1:
+            return parts[0]
+        joined = cls(
+            symbol,
+            **{
+                col: np.concatenate([getattr(part, col) for part in parts])
+                for col in BAR_COLUMNS
+            },
+        )
+        return joined.sort()
+
+    def sort(self):
+        """Sort by timestamp, keeping the last occurrence of a repeated timestamp"""
+        order = np.argsort(self.timestamp, kind="stable")
+        ordered = self[order]
+        keep = np.ones(len(ordered), dtype=bool)
+        keep[:-1] = ordered.timestamp[1:] != ordered.timestamp[:-1]
+        return ordered if keep.all() else ordered[keep]
+
+    def between(self, start: datetime | None = None, end: datetime | None = None):
+        """Bars with start <= timestamp <= end"""
+        low, high = 0, len(self)
+        if start is not None:
+            low = np.searchsorted(self.timestamp, to_datetime64([start])[0], "left")
+        if end is not None:
+            high = np.searchsorted(self.timestamp, to_datetime64([end])[0], "right")
+        return self[low:high]
+
+    def bar(self, index: int):
+        """A single alpaca Bar at the given position"""
+        return Bar(
+            self.symbol,
+            {
+                key: getattr(self, col)[index].item()
+                for col, key in _RAW_BAR_KEYS.items()
+            },
+        )
+
+    def to_bars(self) -> list[Bar]:
+        """Convert the arrays back into alpaca Bar objects"""
+        columns = [getattr(self, col).tolist() for col in BAR_COLUMNS]
+        keys = _RAW_BAR_KEYS.values()
+        return [Bar(self.symbol, dict(zip(keys, row))) for row in zip(*columns)]
+
+    def nbytes(self):
+        """Memory used by the column arrays"""
+        return sum(getattr(self, field_.name).nbytes for field_ in fields(self)[1:])
+
+
+def _columns_from_rows(rows: Sequence[Sequence]):
+    """Split rows of ``(symbol, *BAR_COLUMNS)`` into a symbol array and column arrays"""
+    symbol_col, *value_cols = zip(*rows)
+    columns = {"timestamp": to_datetime64(value_cols[0])}
+    for i, col in enumerate(BAR_COLUMNS[1:], start=1):
+        columns[col] = np.asarray(value_cols[i], dtype=BAR_DTYPES[col])
+    return np.asarray(symbol_col, dtype=object), columns
+
+
+@dataclass
+class BarChunk:
+    """
+    Bars for several symbols in one set of column arrays, ordered by timestamp.
+    What History.iter_stock_bars yields.
+    """
+
+    symbol: np.ndarray
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    trade_count: np.ndarray
+    vwap: np.ndarray
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence]):
+        """Build from rows of ``(symbol, *BAR_COLUMNS)``"""
+        symbols, columns = _columns_from_rows(rows)
+        return cls(symbols, **columns)
+
+    def bars(self) -> Iterator[Bar]:
+        """Alpaca Bar objects, built one at a time"""
+        columns = [getattr(self, col).tolist() for col in BAR_COLUMNS]
+        keys = _RAW_BAR_KEYS.values()
+        for symbol, *row in zip(self.symbol.tolist(), *columns):
+            yield Bar(symbol, dict(zip(keys, row)))
+
+    def to_store(self):
+        """Split the chunk up by symbol"""
+        store = {}
+        for symbol in dict.fromkeys(self.symbol.tolist()):
+            mask = self.symbol == symbol
+            store[symbol] = SymbolBars(
+                symbol, **{col: getattr(self, col)[mask] for col in BAR_COLUMNS}
+            )
+        return BarStore(store)
+
+
+class BarListView(Mapping):
+    """
+    Read only ``symbol -> list[Bar]`` view over a BarStore, built lazily per symbol
+    so existing callers of ``.data[symbol]`` keep working
+    """
+
+    def __init__(self, store: "BarStore"):
+        self._store = store
+        self._converted: dict[str, list[Bar]] = {}
+
+    def __getitem__(self, symbol: str) -> list[Bar]:
+        if symbol not in self._converted:
+            self._converted[symbol] = self._store[symbol].to_bars()
+        return self._converted[symbol]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.symbols)
+
+    def __len__(self):
+        return len(self._store.symbols)
+
+
+class BarStore:
+    """
+    Columnar store of bars, one SymbolBars per symbol
+    """
+
+    def __init__(self, bars: dict[str, SymbolBars] | None = None):
+        self.bars = bars or {}
+        self.data = BarListView(self)
+
+    def __getitem__(self, symbol: str) -> SymbolBars:
+        return self.bars[symbol]
+
+    def __contains__(self, symbol: str):
+        return symbol in self.bars
+
+    def __len__(self):
+        return sum(len(bars) for bars in self.bars.values())
+
+    @property
+    def symbols(self) -> list[str]:
+        """symbols held in the store"""
+        return list(self.bars)
+
+    def get(self, symbol: str):
+        """Bars for a symbol, empty if the symbol is not held"""
+        if (bars := self.bars.get(symbol)) is None:
+            return SymbolBars.empty(symbol)
+        return bars
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence]):
+        """
+        Build from rows of ``(symbol, *BAR_COLUMNS)`` ordered by symbol then timestamp,
+        as returned by a Core select
+        """
+        if not rows:
+            return cls()
+        symbols, columns = _columns_from_rows(rows)
+        starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+        ends = np.r_[starts[1:], len(symbols)]
+        bars = {}
+        for start, end in zip(starts, ends):
+            symbol = symbols[start]
+            bars[symbol] = SymbolBars(
+                symbol, **{col: column[start:end] for col, column in columns.items()}
+            )
+        return cls(bars)
+
+    @classmethod
+    def from_barset(cls, barset: BarSet):
+        """Build from an alpaca BarSet"""
+        return cls(
+            {
+                symbol: SymbolBars.from_bars(symbol, bars)
+                for symbol, bars in barset.data.items()
+            }
+        )
+
+
+def _utc_datetime64(timestamp: datetime) -> np.datetime64:
+    """A single naive (UTC) or timezone aware datetime as naive UTC datetime64"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(timestamp, "us")
+
+
+class BarWindow:
+    """
+    The last capacity bars of one symbol in preallocated columns, written as a
+    ring so appending a bar and reading back from the newest one are O(1)
+    """
+
+    def __init__(self, symbol: str, capacity: int):
+        if capacity < 1:
+            raise ValueError(f"bar window capacity must be at least 1, not {capacity}")
+        self.symbol = symbol
+        self.capacity = capacity
+        self.columns = {
+            col: np.empty(capacity, dtype=BAR_DTYPES[col]) for col in BAR_COLUMNS
+        }
+        self.count = 0
+        self._next = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, bar_: Bar):
+        """Add the symbol's next bar, overwriting the oldest once full"""
+        index = self._next
+        self.columns["timestamp"][index] = _utc_datetime64(bar_.timestamp)
+        for col in BAR_COLUMNS[1:]:
+            self.columns[col][index] = getattr(bar_, col)
+        self._next = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _position(self, index: int) -> int:
+        """Array position of a bar, 0 is the oldest held and -1 the newest"""
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("bar window index out of range")
+        return (self._next - self.count + index) % self.capacity
+
+    def value(self, col: str, index: int = -1) -> float:
+        """One column of one bar, without building the Bar"""
+        return self.columns[col][self._position(index)].item()
+
+    def __getitem__(self, index: int) -> Bar:
+        position = self._position(index)
+        return Bar(
+            self.symbol,
+            {
+                key: self.columns[col][position].item()
+                for col, key in _RAW_BAR_KEYS.items()
+            },
+        )
+
+    def to_symbol_bars(self) -> SymbolBars:
+        """The bars held, oldest first"""
+        order = (self._next - self.count + np.arange(self.count)) % self.capacity
+        return SymbolBars(
+            self.symbol, **{col: column[order] for col, column in self.columns.items()}
+        )
+
+
+class BarWindows:
+    """
+    A BarWindow for each symbol seen, all of the same depth, so memory stays
+    the same however long bars keep coming
+    """
+
+    def __init__(self, depth: int):
+        if depth < 1:
+            raise ValueError(f"bar window depth must be at least 1, not {depth}")
+        self.depth = depth
+        self.data: dict[str, BarWindow] = {}
+
+    def append(self, bar_: Bar):
+        """Add a bar to its symbol's window"""
+        if (window := self.data.get(bar_.symbol)) is None:
+            window = self.data[bar_.symbol] = BarWindow(bar_.symbol, self.depth)
+        window.append(bar_)
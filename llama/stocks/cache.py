@@ -0,0 +1,201 @@
+"""
+Optional on-disk Arrow cache of bars, sitting in front of Postgres
+"""
+
+import logging
+import os
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+from alpaca.data.timeframe import TimeFrame
+
+from ..settings import Settings
+from .bars import BAR_COLUMNS, BAR_DTYPES, BarStore, SymbolBars
+from .coverage import Interval, merge_intervals, naive_utc
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow is an optional dependency
+    pa = None
+
+
+def _month_start(dt: datetime):
+    """Start of the month a datetime is in"""
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(dt: datetime):
+    """Start of the month after a datetime"""
+    return (_month_start(dt) + timedelta(days=32)).replace(day=1)
+
+
+def _months(start_time: datetime, end_time: datetime) -> list[Interval]:
+    """Split an interval into the parts falling in each calendar month"""
+    parts = []
+    month = _month_start(start_time)
+    while month <= end_time:
+        following = _next_month(month)
+        month_end = following - timedelta(microseconds=1)
+        parts.append((max(start_time, month), min(end_time, month_end)))
+        month = following
+    return parts
+
+
+class BarCache:
+    """
+    Arrow IPC files partitioned as ``<dir>/<timeframe>/<symbol>/<YYYY-MM>.arrow``.
+    Each file stores the interval it covers in its schema metadata,
+    and is read back memory mapped.
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+
+    @classmethod
+    def create(cls, settings: Settings):
+        """Create the cache if a directory is configured and pyarrow is installed"""
+        if not settings.bar_cache_dir:
+            return None
+        if pa is None:
+            logging.warning("bar_cache_dir is set but pyarrow is not installed")
+            return None
+        return cls(settings.bar_cache_dir)
+
+    def _path(self, symbol: str, timeframe: str, month: datetime):
+        return self.directory / timeframe / symbol / f"{month:%Y-%m}.arrow"
+
+    def _read_file(self, path: Path):
+        """Memory map a partition, returning its covered interval and bars"""
+        reader = pa.ipc.open_file(pa.memory_map(str(path)))
+        metadata = reader.schema.metadata or {}
+        covered = (
+            datetime.fromisoformat(metadata[b"start"].decode()),
+            datetime.fromisoformat(metadata[b"end"].decode()),
+        )
+        table = reader.read_all()
+        symbol = metadata[b"symbol"].decode()
+        bars = SymbolBars(
+            symbol,
+            **{
+                col: table.column(col).to_numpy().astype(BAR_DTYPES[col], copy=False)
+                for col in BAR_COLUMNS
+            },
+        )
+        return covered, bars
+
+    def _write_file(self, path: Path, covered: Interval, bars: SymbolBars):
+        """Atomically write a partition"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.table({col: getattr(bars, col) for col in BAR_COLUMNS})
+        table = table.replace_schema_metadata(
+            {
+                "symbol": bars.symbol,
+                "start": covered[0].isoformat(),
+                "end": covered[1].isoformat(),
+            }
+        )
+        tmp_path = path.with_suffix(f".{uuid4().hex}.tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    def read(
+        self,
+        symbol: str,
+        timeframe: TimeFrame,
+        start_time: datetime,
+        end_time: datetime,
+    ) -> tuple[list[SymbolBars], list[Interval]]:
+        """Cached bars for an interval, and the parts of it that missed the cache"""
+        hits, misses = [], []
+        for month_start, month_end in _months(start_time, end_time):
+            path = self._path(symbol, timeframe.value, month_start)
+            try:
+                (cov_start, cov_end), bars = self._read_file(path)
+            except (FileNotFoundError, KeyError, pa.ArrowInvalid):
+                misses.append((month_start, month_end))
+                continue
+            if cov_start <= month_start and month_end <= cov_end:
+                hits.append(bars.between(month_start, month_end))
+            else:
+                misses.append((month_start, month_end))
+        return hits, misses
+
+    def write(self, bars: SymbolBars, timeframe: TimeFrame, covered: Interval):
+        """
+        Write bars that cover an interval, extending a partition's existing
+        interval when the two overlap
+        """
+        for month_start, month_end in _months(*covered):
+            path = self._path(bars.symbol, timeframe.value, month_start)
+            month_bars = bars.between(month_start, month_end)
+            month_covered = (month_start, month_end)
+            try:
+                existing_covered, existing = self._read_file(path)
+            except (FileNotFoundError, KeyError, pa.ArrowInvalid):
+                existing_covered = None
+            if existing_covered is not None:
+                merged = merge_intervals([existing_covered, month_covered])
+                if len(merged) == 1:
+                    month_covered = merged[0]
+                    month_bars = SymbolBars.concat(bars.symbol, [existing, month_bars])
+            self._write_file(path, month_covered, month_bars)
+
+    def invalidate(self, intervals: dict[str, list[Interval]], timeframe: TimeFrame):
+        """Drop partitions overlapping intervals whose bars have changed"""
+        for symbol, ranges in intervals.items():
+            for start_time, end_time in ranges:
+                months = _months(naive_utc(start_time), naive_utc(end_time))
+                for month_start, _ in months:
+                    path = self._path(symbol, timeframe.value, month_start)
+                    path.unlink(missing_ok=True)
+
+    def get_bars(
+        self,
+        symbols: list[str],
+        timeframe: TimeFrame,
+        start_time: datetime,
+        end_time: datetime,
+        loader: Callable[[list[str], TimeFrame, datetime, datetime], BarStore],
+        cacheable_until: datetime | None = None,
+    ):
+        """
+        Bars from the cache, loading whatever missed from the loader in one call
+        and writing it back to the cache. Only bars up to cacheable_until,
+        the end of the fetched coverage, are written.
+        """
+        start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+        cacheable_until = naive_utc(cacheable_until or end_time)
+        parts: dict[str, list[SymbolBars]] = {}
+        misses: dict[str, list[Interval]] = {}
+        for symbol in symbols:
+            parts[symbol], symbol_misses = self.read(
+                symbol, timeframe, start_time, end_time
+            )
+            if symbol_misses:
+                misses[symbol] = symbol_misses
+        if misses:
+            logging.debug("bar cache missed for %s symbols", len(misses))
+            miss_start = min(ranges[0][0] for ranges in misses.values())
+            miss_end = max(ranges[-1][1] for ranges in misses.values())
+            loaded = loader(list(misses), timeframe, miss_start, miss_end)
+            for symbol, ranges in misses.items():
+                symbol_bars = loaded.get(symbol)
+                for miss_start, miss_end in ranges:
+                    parts[symbol].append(symbol_bars.between(miss_start, miss_end))
+                    if (write_end := min(miss_end, cacheable_until)) >= miss_start:
+                        self.write(
+                            symbol_bars.between(miss_start, write_end),
+                            timeframe,
+                            (miss_start, write_end),
+                        )
+        return BarStore(
+            {
+                symbol: SymbolBars.concat(symbol, symbol_parts)
+                for symbol, symbol_parts in parts.items()
+                if any(len(part) for part in symbol_parts)
+            }
+        )
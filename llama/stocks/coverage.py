@@ -0,0 +1,137 @@
+"""
+Ledger of which bar (and qoute) ranges have already been fetched from alpaca
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+
+from ..database import BarCoverage
+from ..settings import get_sync_sessionm
+
+Interval = tuple[datetime, datetime]
+
+
+def naive_utc(dt: datetime):
+    """Timezone aware datetimes to naive UTC, which is how the database stores them"""
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def merge_intervals(
+    intervals: list[Interval], tolerance: timedelta = timedelta(0)
+) -> list[Interval]:
+    """Merge overlapping intervals and intervals no more than tolerance apart"""
+    merged: list[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start - merged[-1][1] <= tolerance:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(interval: Interval, covered: list[Interval]) -> list[Interval]:
+    """Parts of interval not inside any of the (sorted, merged) covered intervals"""
+    start, end = interval
+    remaining = []
+    for cov_start, cov_end in covered:
+        if cov_end < start:
+            continue
+        if cov_start > end:
+            break
+        if cov_start > start:
+            remaining.append((start, cov_start))
+        start = max(start, cov_end)
+    if start < end:
+        remaining.append((start, end))
+    return remaining
+
+
+def get_coverage(
+    symbols: list[str], timeframe: str, start_time: datetime, end_time: datetime
+) -> dict[str, list[Interval]]:
+    """Covered intervals per symbol that overlap start and end time"""
+    start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+    coverage: dict[str, list[Interval]] = {symbol: [] for symbol in symbols}
+    with get_sync_sessionm().begin() as session:
+        rows = session.execute(
+            select(BarCoverage.symbol, BarCoverage.start_time, BarCoverage.end_time)
+            .where(
+                BarCoverage.symbol.in_(symbols),
+                BarCoverage.timeframe == timeframe,
+                BarCoverage.start_time <= end_time,
+                BarCoverage.end_time >= start_time,
+            )
+            .order_by(BarCoverage.symbol, BarCoverage.start_time)
+        )
+        for symbol, cov_start, cov_end in rows:
+            coverage[symbol].append((cov_start, cov_end))
+    return {symbol: merge_intervals(ranges) for symbol, ranges in coverage.items()}
+
+
+def get_uncovered(
+    symbols: list[str], timeframe: str, start_time: datetime, end_time: datetime
+) -> dict[str, list[Interval]]:
+    """Intervals per symbol between start and end time that have never been fetched"""
+    start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+    return {
+        symbol: subtract_intervals((start_time, end_time), covered)
+        for symbol, covered in get_coverage(
+            symbols, timeframe, start_time, end_time
+        ).items()
+    }
+
+
+def record_coverage(
+    intervals: dict[str, list[Interval]],
+    timeframe: str,
+    tolerance: timedelta = timedelta(0),
+):
+    """
+    Mark intervals as fetched, merging them with the symbol's existing ledger rows
+    so the ledger stays a handful of rows per symbol and timeframe
+    """
+    intervals = {symbol: ranges for symbol, ranges in intervals.items() if ranges}
+    if not intervals:
+        return
+    with get_sync_sessionm().begin() as session:
+        existing = session.execute(
+            select(
+                BarCoverage.id,
+                BarCoverage.symbol,
+                BarCoverage.start_time,
+                BarCoverage.end_time,
+            )
+            .where(
+                BarCoverage.symbol.in_(list(intervals)),
+                BarCoverage.timeframe == timeframe,
+            )
+            .with_for_update()
+        ).all()
+        ranges = {
+            symbol: [(naive_utc(start), naive_utc(end)) for start, end in new]
+            for symbol, new in intervals.items()
+        }
+        for _, symbol, start, end in existing:
+            ranges[symbol].append((start, end))
+        if existing:
+            session.execute(
+                delete(BarCoverage).where(
+                    BarCoverage.id.in_([row.id for row in existing])
+                )
+            )
+        session.execute(
+            insert(BarCoverage),
+            [
+                {
+                    "symbol": symbol,
+                    "timeframe": timeframe,
+                    "start_time": start,
+                    "end_time": end,
+                }
+                for symbol, symbol_ranges in ranges.items()
+                for start, end in merge_intervals(symbol_ranges, tolerance)
+            ],
+        )
@@ -3,24 +3,57 @@ History object to pull back data from alpaca's apis
 """
 
 import logging
+from collections.abc import Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from datetime import datetime, timedelta
 
 import pandas as pd
 import requests
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.models import BarSet
+from alpaca.data.models import BarSet, Quote
 from alpaca.data.requests import (
     StockBarsRequest,
     StockLatestQuoteRequest,
     StockQuotesRequest,
 )
 from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
-from sqlalchemy import Values, column, func, select
-from trekkers.statements import upsert
+from sqlalchemy import (
+    DateTime,
+    String,
+    Values,
+    bindparam,
+    case,
+    column,
+    delete,
+    exists,
+    func,
+    select,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 
 from ..database import Bars, Qoutes
 from ..settings import Settings, get_sync_sessionm
-from .models import CustomBarSet
+from .bars import BAR_COLUMNS, BarChunk, BarStore, SymbolBars
+from .cache import BarCache
+from .coverage import (
+    Interval,
+    get_coverage,
+    get_uncovered,
+    naive_utc,
+    record_coverage,
+    subtract_intervals,
+)
+from .latest import LatestQouteCache
+from .market_calendar import extended_windows, session_windows
+from .ingest import copy_bars, copy_qoutes
+from .ratelimit import RateLimiter
+from .resample import DERIVABLE_UNITS, Resampler, holds_bar, whole_buckets
 
 FRAME_PARAMS = {
     TimeFrameUnit.Minute: {
@@ -45,6 +78,9 @@ FRAME_PARAMS = {
     },
 }
 
+## Quotes have no timeframe, their fetched ranges are kept in the ledger under this
+QOUTE_LEDGER = "qoutes"
+
 
 class History:
     """Historic Trading data"""
@@ -53,15 +89,33 @@ class History:
         self,
         client: StockHistoricalDataClient,
         news_url: str,
+        backfill_workers: int = 1,
+        rate_limiter: RateLimiter | None = None,
+        bar_cache: BarCache | None = None,
+        resampler: Resampler | None = None,
+        qoute_ttl: float = 0,
     ):
         self.client = client
         self.news_api_url = news_url
+        self.backfill_workers = max(backfill_workers, 1)
+        self.rate_limiter = rate_limiter or RateLimiter(0)
+        self.bar_cache = bar_cache
+        self.resampler = resampler
+        self.qoute_cache = LatestQouteCache(self._fetch_latest_qoutes, qoute_ttl)
 
     @classmethod
     def create(cls, settings: Settings):
         """Create a historical data client"""
         client = StockHistoricalDataClient(settings.api_key, settings.secret_key)
-        return cls(client, settings.news_url)
+        return cls(
+            client,
+            settings.news_url,
+            settings.backfill_workers,
+            RateLimiter(settings.backfill_rate_limit),
+            BarCache.create(settings),
+            Resampler() if settings.derive_bars else None,
+            settings.latest_qoute_ttl,
+        )
 
     def get_news(
         self,
@@ -93,17 +147,16 @@ class History:
         return response.json()
 
     def insert_bars(self, bars: BarSet, time_frame: TimeFrame):
-        """_summary_
+        """
+        Bulk load a BarSet into postgres through COPY,
+        updating any bars that already exist
 
         Args:
-            bars (BarSet): _description_
-            time_frame (TimeFrame): _description_
+            bars (BarSet): bars returned by alpaca
+            time_frame (TimeFrame): timeframe the bars were requested with
         """
         logging.debug("inserting bars...")
-        dict_bars = CustomBarSet.from_barset(bars).to_dict(time_frame.value)
-        if not dict_bars:
-            return
-        upsert(get_sync_sessionm(), dict_bars, Bars)
+        return copy_bars(BarStore.from_barset(bars), time_frame.value)
 
     @staticmethod
     def _round_datetime(dt: datetime, timeframe: TimeFrame):
@@ -199,6 +252,139 @@ class History:
 
         return consecutive_groups
 
+    def identify_missing_bars_many(
+        self,
+        windows: dict[str, list[Interval]],
+        timeframe: TimeFrame,
+    ) -> dict[str, list[Interval]]:
+        """
+        Set based version of identify_missing_bars for many symbols in one round trip.
+        Takes the time windows to check per symbol, which are narrowed to the
+        trading calendar's sessions so only bars that can exist are looked for.
+        Missing timestamps are grouped into consecutive ranges in SQL
+        (gaps and islands) rather than in a python loop.
+        """
+        logging.debug("identifying missing bars for %s symbols...", len(windows))
+        delta = FRAME_PARAMS[timeframe.unit]["delta"]
+        allowed_delta = FRAME_PARAMS[timeframe.unit]["allowed_delta"]
+
+        consecutive_groups: dict[str, list[Interval]] = {
+            symbol: [] for symbol in windows
+        }
+        window_rows = [
+            (symbol, start, end)
+            for symbol, ranges in windows.items()
+            for start, end in session_windows(ranges, timeframe)
+        ]
+        if not window_rows:
+            return consecutive_groups
+        ## three array parameters however many windows, a VALUES list would
+        ## take three per window and run past postgres' parameter limit
+        symbols, starts, ends = (list(values) for values in zip(*window_rows))
+        window_table = (
+            func.unnest(
+                bindparam("symbols", symbols, type_=ARRAY(String)),
+                bindparam("starts", starts, type_=ARRAY(DateTime)),
+                bindparam("ends", ends, type_=ARRAY(DateTime)),
+            )
+            .table_valued("symbol", "start_time", "end_time")
+            .render_derived(name="windows")
+        )
+        series = select(
+            window_table.c.symbol,
+            func.generate_series(
+                window_table.c.start_time, window_table.c.end_time, delta
+            ).label("time"),
+        ).subquery("series")
+        missing = select(series.c.symbol, series.c.time).where(
+            ~exists().where(
+                Bars.symbol == series.c.symbol,
+                Bars.timeframe == timeframe.value,
+                Bars.timestamp == series.c.time,
+            )
+        )
+        missing = missing.subquery("missing")
+        window = {"partition_by": missing.c.symbol, "order_by": missing.c.time}
+        starts_group = select(
+            missing.c.symbol,
+            missing.c.time,
+            case(
+                (missing.c.time - func.lag(missing.c.time).over(**window) > delta, 1),
+                else_=0,
+            ).label("new_group"),
+        ).subquery("starts_group")
+        islands = select(
+            starts_group.c.symbol,
+            starts_group.c.time,
+            func.sum(starts_group.c.new_group)
+            .over(partition_by=starts_group.c.symbol, order_by=starts_group.c.time)
+            .label("island"),
+        ).subquery("islands")
+        first, last = func.min(islands.c.time), func.max(islands.c.time)
+        query = (
+            select(islands.c.symbol, first, last)
+            .group_by(islands.c.symbol, islands.c.island)
+            .having(last - first > allowed_delta)
+            .order_by(islands.c.symbol, first)
+        )
+        with get_sync_sessionm().begin() as session:
+            for symbol, group_start, group_end in session.execute(query):
+                consecutive_groups[symbol].append((group_start, group_end))
+        return consecutive_groups
+
+    def _fetch_bars(
+        self,
+        symbol: str,
+        time_frame: TimeFrame,
+        start_time: datetime,
+        end_time: datetime,
+    ) -> BarSet:
+        """Fetch one range of bars from alpaca, respecting the request rate limit"""
+        logging.info(
+            "getting bars for %s between %s and %s with timeframe of %s",
+            symbol,
+            start_time,
+            end_time,
+            time_frame.value,
+        )
+        request_params = StockBarsRequest(
+            symbol_or_symbols=[symbol],
+            timeframe=time_frame,
+            start=start_time.isoformat(),
+            end=end_time.isoformat(),
+        )
+        self.rate_limiter.wait()
+        return self.client.get_stock_bars(request_params)
+
+    def backfill_bars(
+        self,
+        missing: dict[str, list[Interval]],
+        time_frame: TimeFrame,
+    ):
+        """
+        Fetch every missing range on a pool of `backfill_workers` threads,
+        inserting each response as soon as it arrives so fetching and writing overlap
+        """
+        ranges = [
+            (symbol, start, end)
+            for symbol, times in missing.items()
+            for start, end in times
+        ]
+        if not ranges:
+            return
+        logging.info(
+            "backfilling %s ranges with %s workers", len(ranges), self.backfill_workers
+        )
+        with ThreadPoolExecutor(max_workers=self.backfill_workers) as executor:
+            futures = [
+                executor.submit(self._fetch_bars, symbol, time_frame, start, end)
+                for symbol, start, end in ranges
+            ]
+            for future in as_completed(futures):
+                bars: BarSet = future.result()
+                if bars.data:
+                    self.insert_bars(bars, time_frame)
+
     def get_stock_bars(
         self,
         symbols: list[str] | None = None,
@@ -210,122 +396,307 @@ class History:
         logging.debug("Getting stock bars...")
         symbols = symbols if symbols is not None else ["AAPL"]  ## Spy is S&P500
         start_time = start_time.replace(hour=0, minute=0, second=0)
-        for symbol in symbols:
-            times = self.identify_missing_bars(symbol, time_frame, start_time, end_time)
-            for starttime, endtime in times:
-                logging.info(
-                    "getting bars for %s between %s and %s with timeframe of %s",
-                    symbol,
-                    starttime,
-                    endtime,
-                    time_frame.value,
-                )
-                request_params = StockBarsRequest(
-                    symbol_or_symbols=[symbol],
-                    timeframe=time_frame,
-                    start=starttime.isoformat(),
-                    end=endtime.isoformat(),
-                )
-                bars: BarSet = self.client.get_stock_bars(request_params)
-                # bars = self.fill_bars(bars, start_time, end_time)
-                if bars.data:
-                    self.insert_bars(bars, time_frame)
+        if self.resampler is not None and time_frame.unit in DERIVABLE_UNITS:
+            return self._get_derived_bars(symbols, time_frame, start_time, end_time)
+        self.ensure_bars(symbols, time_frame, start_time, end_time)
+        return self._load_bars(
+            symbols,
+            time_frame,
+            start_time,
+            end_time,
+            self._round_datetime(end_time, time_frame),
+        )
+
+    def _load_bars(
+        self,
+        symbols: list[str],
+        time_frame: TimeFrame,
+        start_time: datetime,
+        end_time: datetime,
+        cacheable_until: datetime,
+    ):
+        """Read stored bars through the bar cache when there is one"""
+        if self.bar_cache is None:
+            return self._read_bars(symbols, time_frame, start_time, end_time)
+        return self.bar_cache.get_bars(
+            symbols,
+            time_frame,
+            start_time,
+            end_time,
+            self._read_bars,
+            cacheable_until=cacheable_until,
+        )
+
+    def _get_derived_bars(
+        self,
+        symbols: list[str],
+        time_frame: TimeFrame,
+        start_time: datetime,
+        end_time: datetime,
+    ):
+        """
+        Build bars from stored minute bars wherever the minute coverage holds
+        whole bars of the timeframe, only going to alpaca for the rest
+        """
+        start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+        derivable: dict[str, list[Interval]] = {}
+        remaining: dict[str, list[Interval]] = {}
+        minute_coverage = get_coverage(
+            symbols, TimeFrame.Minute.value, start_time, end_time
+        )
+        for symbol, covered in minute_coverage.items():
+            requested = (start_time, end_time)
+            clipped = [
+                (max(cov_start, start_time), min(cov_end, end_time))
+                for cov_start, cov_end in covered
+            ]
+            derivable[symbol] = [
+                interval
+                for interval in (whole_buckets(part, time_frame) for part in clipped)
+                if interval is not None
+            ]
+            remaining[symbol] = [
+                part
+                for part in subtract_intervals(requested, derivable[symbol])
+                if holds_bar(part, time_frame)
+            ]
+        parts: dict[str, list[SymbolBars]] = {symbol: [] for symbol in symbols}
+        if derived_symbols := [symbol for symbol in symbols if derivable[symbol]]:
+            logging.debug(
+                "deriving %s bars from minute bars for %s symbols",
+                time_frame.value,
+                len(derived_symbols),
+            )
+            minute_start = min(derivable[symbol][0][0] for symbol in derived_symbols)
+            minute_end = max(derivable[symbol][-1][1] for symbol in derived_symbols)
+            minute_bars = self._load_bars(
+                derived_symbols, TimeFrame.Minute, minute_start, minute_end, minute_end
+            )
+            for symbol in derived_symbols:
+                for interval in derivable[symbol]:
+                    parts[symbol].append(
+                        self.resampler.resample(
+                            minute_bars.get(symbol), time_frame, interval
+                        )
+                    )
+        if fetched_symbols := [symbol for symbol in symbols if remaining[symbol]]:
+            fetch_start = min(remaining[symbol][0][0] for symbol in fetched_symbols)
+            fetch_end = max(remaining[symbol][-1][1] for symbol in fetched_symbols)
+            coverage = get_coverage(
+                fetched_symbols, time_frame.value, fetch_start, fetch_end
+            )
+            self._backfill_uncovered(
+                {
+                    symbol: [
+                        part
+                        for interval in remaining[symbol]
+                        for part in subtract_intervals(interval, coverage[symbol])
+                    ]
+                    for symbol in fetched_symbols
+                },
+                time_frame,
+            )
+            fetched = self._load_bars(
+                fetched_symbols,
+                time_frame,
+                fetch_start,
+                fetch_end,
+                self._round_datetime(end_time, time_frame),
+            )
+            for symbol in fetched_symbols:
+                for interval in remaining[symbol]:
+                    parts[symbol].append(fetched.get(symbol).between(*interval))
+        return BarStore(
+            {
+                symbol: SymbolBars.concat(symbol, symbol_parts)
+                for symbol, symbol_parts in parts.items()
+                if any(len(part) for part in symbol_parts)
+            }
+        )
+
+    def ensure_bars(
+        self,
+        symbols: list[str],
+        time_frame: TimeFrame,
+        start_time: datetime,
+        end_time: datetime,
+    ):
+        """Backfill any bars between start and end time not already fetched"""
+        uncovered = get_uncovered(
+            symbols,
+            time_frame.value,
+            self._round_datetime(start_time, time_frame),
+            self._round_datetime(end_time, time_frame),
+        )
+        self._backfill_uncovered(uncovered, time_frame)
+
+    def _backfill_uncovered(
+        self, uncovered: dict[str, list[Interval]], time_frame: TimeFrame
+    ):
+        """Backfill the gaps in intervals missing from the coverage ledger"""
+        if any(uncovered.values()):
+            missing = self.identify_missing_bars_many(uncovered, time_frame)
+            self.backfill_bars(missing, time_frame)
+            record_coverage(
+                uncovered, time_frame.value, FRAME_PARAMS[time_frame.unit]["delta"]
+            )
+            if self.bar_cache is not None:
+                self.bar_cache.invalidate(uncovered, time_frame)
+        else:
+            logging.debug("bars already covered, skipping gap detection")
+
+    def iter_stock_bars(
+        self,
+        symbols: list[str],
+        time_frame: TimeFrame,
+        start_time: datetime,
+        end_time: datetime,
+        chunk_size: int = 50_000,
+        backfill: bool = True,
+    ) -> Iterator[BarChunk]:
+        """
+        Yield bars in chunks of up to chunk_size rows from a server side cursor,
+        in timestamp order across all symbols, so memory use doesn't grow
+        with the length of the range
+        """
+        if backfill:
+            self.ensure_bars(symbols, time_frame, start_time, end_time)
+        stmt = (
+            select(Bars.symbol, *[getattr(Bars, col) for col in BAR_COLUMNS])
+            .where(
+                Bars.symbol.in_(symbols),
+                Bars.timeframe == time_frame.value,
+                Bars.timestamp >= start_time,
+                Bars.timestamp <= end_time,
+            )
+            .order_by(Bars.timestamp, Bars.symbol)
+            .execution_options(yield_per=chunk_size)
+        )
+        with get_sync_sessionm().begin() as session:
+            for rows in session.execute(stmt).partitions():
+                yield BarChunk.from_rows(rows)
+
+    def _read_bars(
+        self,
+        symbols: list[str],
+        time_frame: TimeFrame,
+        start_time: datetime,
+        end_time: datetime,
+    ):
+        """Read stored bars from postgres into a BarStore"""
         with get_sync_sessionm().begin() as session:
             logging.debug("fetching bars from postgres...")
             sym_table = Values(column("symbol"), name="symbol").data(
                 [(symbol,) for symbol in symbols]
             )
-            bars = (
-                session.execute(
-                    select(Bars)
-                    .join(sym_table, Bars.symbol == sym_table.c.symbol)
-                    .where(
-                        Bars.symbol.in_(symbols),
-                        Bars.timeframe == time_frame.value,
-                        Bars.timestamp >= start_time,
-                        Bars.timestamp <= end_time,
-                    )
+            rows = session.execute(
+                select(Bars.symbol, *[getattr(Bars, col) for col in BAR_COLUMNS])
+                .join(sym_table, Bars.symbol == sym_table.c.symbol)
+                .where(
+                    Bars.symbol.in_(symbols),
+                    Bars.timeframe == time_frame.value,
+                    Bars.timestamp >= start_time,
+                    Bars.timestamp <= end_time,
                 )
-                .scalars()
-                .fetchall()
-            )
-            logging.debug("converting to barset...")
-            return CustomBarSet.from_postgres_bars(
-                bars
-            )  ## slowest bit - multiprocessing doesn't work
+                .order_by(Bars.symbol, Bars.timestamp)
+            ).all()
+            logging.debug("converting to bar store...")
+            return BarStore.from_rows(rows)
 
-    def get_latest_qoute(self, symbol: str | None = None):
-        """get latest stock price"""
+    def _fetch_latest_qoutes(self, symbols: list[str]) -> dict[str, Quote]:
+        """Latest qoutes for many symbols in one request"""
+        logging.debug("getting latest qoutes for %s symbols", len(symbols))
         multisymbol_request_params = StockLatestQuoteRequest(
-            symbol_or_symbols=symbol,
+            symbol_or_symbols=symbols,
         )
-        latest_multisymbol_quotes = self.client.get_stock_latest_quote(
-            multisymbol_request_params
+        self.rate_limiter.wait()
+        return self.client.get_stock_latest_quote(multisymbol_request_params)
+
+    def get_latest_qoutes(self, symbols: list[str]):
+        """get latest stock prices, served from the qoute cache while fresh"""
+        return self.qoute_cache.get_many(symbols)
+
+    def get_latest_qoute(self, symbol: str):
+        """get latest stock price"""
+        return self.get_latest_qoutes([symbol])[symbol]
+
+    def _fetch_qoutes(
+        self, symbol: str, start_time: datetime, end_time: datetime
+    ) -> list[Quote]:
+        """Fetch one chunk of quotes from alpaca, respecting the request rate limit"""
+        logging.info(
+            "getting qoutes between %s and %s for %s...", start_time, end_time, symbol
+        )
+        request = StockQuotesRequest(
+            symbol_or_symbols=symbol, start=start_time, end=end_time
         )
-        return latest_multisymbol_quotes[symbol]
+        self.rate_limiter.wait()
+        return self.client.get_stock_quotes(request).data.get(symbol, [])
+
+    @staticmethod
+    def _replace_qoutes(
+        symbol: str, window: Interval, qoutes: list[Quote], batch_size: int
+    ):
+        """
+        Swap the stored quotes in a window for freshly fetched ones,
+        so refetching a partly written chunk doesn't duplicate rows
+        """
+        with get_sync_sessionm().begin() as session:
+            session.execute(
+                delete(Qoutes).where(
+                    Qoutes.symbol == symbol,
+                    Qoutes.timestamp.between(*window),
+                )
+            )
+        copy_qoutes(qoutes, batch_size)
 
     def get_qoutes(
         self,
         symbol: str,
         start_time: datetime = (datetime.utcnow() - timedelta(days=900)),
         end_time: datetime = (datetime.utcnow() - timedelta(minutes=15)),
+        chunk: timedelta = timedelta(days=1),
+        batch_size: int = 100_000,
     ):
-        """Get the existing qoutes for a symbol"""
+        """
+        Backfill the qoutes for a symbol between start and end time.
+        Ranges missing from the ledger are cut into chunks of at most `chunk`
+        within each session's extended hours, which are fetched on a pool of
+        `backfill_workers` threads. Only a couple of chunks per worker are held
+        in memory at once, and each is COPYed in batches of batch_size rows.
+        """
         logging.info("getting qoutes...")
-        with get_sync_sessionm().begin() as session:
-            stmt = select(Qoutes.timestamp).where(
-                Qoutes.timestamp >= start_time,
-                Qoutes.timestamp <= end_time,
-                Qoutes.symbol == symbol,
-            )
-            first = (
-                session.execute(stmt.order_by(Qoutes.timestamp.asc())).scalars().first()
-            )
-            last = (
-                session.execute(stmt.order_by(Qoutes.timestamp.desc()))
-                .scalars()
-                .first()
-            )
-        if not first and not last:
-            logging.info(
-                "getting all qoutes between %s and %s for %s...",
-                start_time,
-                end_time,
-                symbol,
-            )
-            request = StockQuotesRequest(
-                symbol_or_symbols=symbol, start=start_time, end=end_time
-            )
-            qoutes = self.client.get_stock_quotes(request).data[symbol]
-            upsert(
-                get_sync_sessionm(), [qoute.model_dump() for qoute in qoutes], Qoutes
-            )
-        if first and first >= start_time + timedelta(days=1):
-            logging.info(
-                "getting qoutes at beginning between %s and %s for %s...",
-                start_time,
-                first,
-                symbol,
-            )
-            request = StockQuotesRequest(
-                symbol_or_symbols=symbol, start=start_time, end=first
-            )
-            qoutes = self.client.get_stock_quotes(request).data[symbol]
-            upsert(
-                get_sync_sessionm(), [qoute.model_dump() for qoute in qoutes], Qoutes
-            )
-        if last and last <= end_time - timedelta(days=1):
-            logging.info(
-                "getting qoutes at end between %s and %s for %s...",
-                last,
-                end_time,
-                symbol,
-            )
-
-            request = StockQuotesRequest(
-                symbol_or_symbols=symbol, start=last, end=end_time
-            )
-            qoutes = self.client.get_stock_quotes(request).data[symbol]
-            upsert(
-                get_sync_sessionm(), [qoute.model_dump() for qoute in qoutes], Qoutes
-            )
+        uncovered = get_uncovered([symbol], QOUTE_LEDGER, start_time, end_time)[symbol]
+        windows = [
+            window
+            for start, end in uncovered
+            for window in extended_windows(start, end, chunk)
+        ]
+        if not windows:
+            logging.debug("qoutes already covered for %s", symbol)
+            return
+        logging.info(
+            "backfilling %s chunks of qoutes for %s with %s workers",
+            len(windows),
+            symbol,
+            self.backfill_workers,
+        )
+        to_fetch = iter(windows)
+        in_flight: dict[Future, Interval] = {}
+        with ThreadPoolExecutor(max_workers=self.backfill_workers) as executor:
+            while True:
+                while len(in_flight) < 2 * self.backfill_workers:
+                    if (window := next(to_fetch, None)) is None:
+                        break
+                    future = executor.submit(self._fetch_qoutes, symbol, *window)
+                    in_flight[future] = window
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window = in_flight.pop(future)
+                    self._replace_qoutes(symbol, window, future.result(), batch_size)
+                    ## so a failure later on doesn't refetch chunks already written
+                    record_coverage({symbol: [window]}, QOUTE_LEDGER)
+        ## the gaps between sessions, which had nothing to fetch
+        record_coverage({symbol: uncovered}, QOUTE_LEDGER)
@@ -0,0 +1,171 @@
+"""
+Bulk ingestion into postgres through COPY and a staging table
+"""
+
+import json
+import logging
+import time
+from collections.abc import Iterable, Sequence
+
+import numpy as np
+from psycopg import sql
+from sqlalchemy import Column, MetaData, Table, select
+from sqlalchemy.dialects.postgresql import insert
+from trekkers import BaseSql
+
+from alpaca.data.models import Quote
+from yumi import divide_chunks
+
+from ..database import Bars, Qoutes
+from ..settings import get_sync_sessionm
+from .bars import BarStore
+from .coverage import naive_utc
+
+BAR_COPY_COLUMNS = (
+    "symbol",
+    "timeframe",
+    "timestamp",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "trade_count",
+    "vwap",
+)
+
+QOUTE_COPY_COLUMNS = (
+    "symbol",
+    "timestamp",
+    "ask_exchange",
+    "ask_price",
+    "ask_size",
+    "bid_exchange",
+    "bid_price",
+    "bid_size",
+    "conditions",
+    "tape",
+)
+
+
+def _staging_table(model: type[BaseSql], columns: Sequence[str]):
+    """Temporary table shaped like the model's columns, dropped on commit"""
+    table = model.__table__
+    return Table(
+        f"{table.name}_staging",
+        MetaData(),
+        *[Column(name, table.c[name].type) for name in columns],
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP",
+    )
+
+
+def copy_rows(
+    model: type[BaseSql],
+    columns: Sequence[str],
+    rows: Iterable[Sequence],
+    merge: bool = True,
+):
+    """
+    Stream rows into a staging table with COPY and insert them into the model's
+    table in one statement, updating rows that already exist when merge is set.
+    Returns the number of rows copied.
+    """
+    started = time.perf_counter()
+    staging = _staging_table(model, columns)
+    count = 0
+    with get_sync_sessionm().begin() as session:
+        connection = session.connection()
+        staging.create(connection)
+        cursor = connection.connection.driver_connection.cursor()
+        copy_stmt = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(staging.name),
+            sql.SQL(", ").join(map(sql.Identifier, columns)),
+        )
+        with cursor.copy(copy_stmt) as copy:
+            for row in rows:
+                copy.write_row(row)
+                count += 1
+        stmt = insert(model).from_select(list(columns), select(staging))
+        if merge:
+            keys = [col.name for col in model.__table__.primary_key]
+            stmt = stmt.on_conflict_do_update(
+                index_elements=keys,
+                set_={col: stmt.excluded[col] for col in columns if col not in keys},
+            )
+        session.execute(stmt)
+    elapsed = time.perf_counter() - started
+    logging.info(
+        "copied %s rows into %s in %.2fs (%.0f rows/s)",
+        count,
+        model.__tablename__,
+        elapsed,
+        count / elapsed if elapsed else 0,
+    )
+    return count
+
+
+def _int_column(values: np.ndarray) -> list[int]:
+    """
+    Integers of a float column. Volume and trade_count are NOT NULL in llama.bars,
+    so a value alpaca left out is written as 0 rather than NULL or INT64_MIN
+    """
+    return np.nan_to_num(values, nan=0).astype(np.int64).tolist()
+
+
+def _bar_rows(store: BarStore, timeframe: str):
+    """Rows of BAR_COPY_COLUMNS from a BarStore"""
+    for symbol in store.symbols:
+        bars = store[symbol]
+        columns = (
+            bars.timestamp.tolist(),
+            bars.open.tolist(),
+            bars.high.tolist(),
+            bars.low.tolist(),
+            bars.close.tolist(),
+            _int_column(bars.volume),
+            _int_column(bars.trade_count),
+            bars.vwap.tolist(),
+        )
+        for row in zip(*columns):
+            yield (symbol, timeframe, *row)
+
+
+def copy_bars(store: BarStore, timeframe: str):
+    """Bulk upsert a BarStore into llama.bars"""
+    if not len(store):
+        return 0
+    return copy_rows(Bars, BAR_COPY_COLUMNS, _bar_rows(store, timeframe))
+
+
+def _enum_value(value):
+    """Exchanges and tapes can come back as enums or plain strings"""
+    return getattr(value, "value", value)
+
+
+def _qoute_rows(qoutes: Iterable[Quote]):
+    """Rows of QOUTE_COPY_COLUMNS from alpaca quotes"""
+    for qoute in qoutes:
+        yield (
+            qoute.symbol,
+            naive_utc(qoute.timestamp),
+            _enum_value(qoute.ask_exchange),
+            qoute.ask_price,
+            int(qoute.ask_size),
+            _enum_value(qoute.bid_exchange),
+            qoute.bid_price,
+            int(qoute.bid_size),
+            json.dumps(qoute.conditions or []),
+            _enum_value(qoute.tape),
+        )
+
+
+def copy_qoutes(qoutes: list[Quote], batch_size: int = 100_000):
+    """
+    Append quotes to llama.qoutes, COPYing at most batch_size rows per transaction.
+    Quotes have no natural key so nothing is merged.
+    """
+    count = 0
+    for batch in divide_chunks(qoutes, batch_size):
+        count += copy_rows(Qoutes, QOUTE_COPY_COLUMNS, _qoute_rows(batch), merge=False)
+    return count
@@ -0,0 +1,77 @@
+"""
+Short lived cache of the latest qoute per symbol, coalescing concurrent lookups
+"""
+
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+
+from alpaca.data.models import Quote
+
+
+class LatestQouteCache:
+    """
+    Latest qoutes kept for ttl seconds. Symbols missing from the cache are fetched
+    together in one call, and lookups for symbols already being fetched wait
+    for that call instead of making their own
+    """
+
+    def __init__(self, fetch: Callable[[list[str]], dict[str, Quote]], ttl: float):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._entries: dict[str, tuple[float, Quote]] = {}
+        self._in_flight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def put(self, qoute: Quote):
+        """Store a qoute, e.g. from the live stream, unless a newer one is cached"""
+        with self._lock:
+            self._store(qoute, time.monotonic())
+
+    def _store(self, qoute: Quote, now: float):
+        """Store a qoute, the lock must be held"""
+        cached = self._entries.get(qoute.symbol)
+        if cached is None or cached[1].timestamp <= qoute.timestamp:
+            self._entries[qoute.symbol] = (now + self.ttl, qoute)
+
+    def get_many(self, symbols: list[str]) -> dict[str, Quote]:
+        """Latest qoute for each symbol, symbols alpaca has no qoute for are left out"""
+        now = time.monotonic()
+        qoutes: dict[str, Quote] = {}
+        waiting: dict[str, Future] = {}
+        to_fetch: list[str] = []
+        with self._lock:
+            for symbol in dict.fromkeys(symbols):
+                cached = self._entries.get(symbol)
+                if cached is not None and cached[0] > now:
+                    qoutes[symbol] = cached[1]
+                elif symbol in self._in_flight:
+                    waiting[symbol] = self._in_flight[symbol]
+                else:
+                    to_fetch.append(symbol)
+            if to_fetch:
+                fetching: Future = Future()
+                for symbol in to_fetch:
+                    self._in_flight[symbol] = fetching
+        if to_fetch:
+            try:
+                fetched = self.fetch(to_fetch)
+            except Exception as exc:
+                with self._lock:
+                    for symbol in to_fetch:
+                        self._in_flight.pop(symbol, None)
+                fetching.set_exception(exc)
+                raise
+            with self._lock:
+                fetched_at = time.monotonic()
+                for qoute in fetched.values():
+                    self._store(qoute, fetched_at)
+                for symbol in to_fetch:
+                    self._in_flight.pop(symbol, None)
+            fetching.set_result(fetched)
+            qoutes.update(fetched)
+        for symbol, future in waiting.items():
+            if (qoute := future.result().get(symbol)) is not None:
+                qoutes[symbol] = qoute
+        return qoutes
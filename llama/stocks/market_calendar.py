@@ -0,0 +1,218 @@
+"""
+US equity trading calendar generated locally, covering holidays, early closes and DST
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+
+from .coverage import Interval, naive_utc
+
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+## Extended hours trading runs from 4:00 until 4 hours after the close
+EXTENDED_OPEN = time(4, 0)
+EXTENDED_HOURS_AFTER_CLOSE = timedelta(hours=4)
+
+## One off closures that don't follow a holiday rule
+SPECIAL_CLOSURES = {
+    date(2001, 9, 11),
+    date(2001, 9, 12),
+    date(2001, 9, 13),
+    date(2001, 9, 14),
+    date(2004, 6, 11),
+    date(2007, 1, 2),
+    date(2012, 10, 29),
+    date(2012, 10, 30),
+    date(2018, 12, 5),
+    date(2025, 1, 9),
+}
+
+
+@dataclass(frozen=True)
+class Session:
+    """A single trading session, open and close in naive UTC"""
+
+    day: date
+    open: datetime
+    close: datetime
+
+    @property
+    def early_close(self):
+        """Whether the market closes early on this day"""
+        return self.close - self.open < timedelta(hours=6)
+
+
+def _to_utc(day: date, at: time):
+    """Market local time on a day to naive UTC"""
+    local = datetime.combine(day, at, tzinfo=MARKET_TIMEZONE)
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, nth: int):
+    """nth weekday of a month, a negative nth counts from the end of the month"""
+    if nth > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (nth - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7 + 7 * (-nth - 1))
+
+
+def _easter(year: int):
+    """Gregorian easter sunday"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    weekday = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * weekday) // 451
+    month = (h + weekday - 7 * m + 114) // 31
+    day = (h + weekday - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def _observed(day: date):
+    """Saturday holidays are observed on friday and sunday holidays on monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache
+def holidays(year: int) -> frozenset[date]:
+    """Full day market closures in a year"""
+    days = {
+        _nth_weekday(year, 2, 0, 3),  # Washington's birthday
+        _easter(year) - timedelta(days=2),  # Good friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial day
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),  # Labor day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),
+    }
+    ## A saturday new year is not observed on the friday before
+    if (new_year := date(year, 1, 1)).weekday() != 5:
+        days.add(_observed(new_year))
+    if year >= 1998:
+        days.add(_nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. day
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))  # Juneteenth
+    days.update(day for day in SPECIAL_CLOSURES if day.year == year)
+    return frozenset(days)
+
+
+@lru_cache
+def early_closes(year: int) -> frozenset[date]:
+    """Days the market closes at 13:00 local time"""
+    days = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() < 4:
+            days.add(day)
+    return frozenset(days - holidays(year))
+
+
+@lru_cache
+def _year_sessions(year: int) -> tuple[Session, ...]:
+    """Every trading session in a year"""
+    closed, early = holidays(year), early_closes(year)
+    sessions = []
+    day = date(year, 1, 1)
+    while day.year == year:
+        if day.weekday() < 5 and day not in closed:
+            close = EARLY_CLOSE if day in early else REGULAR_CLOSE
+            sessions.append(
+                Session(day, _to_utc(day, REGULAR_OPEN), _to_utc(day, close))
+            )
+        day += timedelta(days=1)
+    return tuple(sessions)
+
+
+def get_sessions(start_time: datetime, end_time: datetime) -> list[Session]:
+    """Sessions overlapping start and end time"""
+    start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+    return [
+        session
+        for year in range(start_time.year, end_time.year + 1)
+        for session in _year_sessions(year)
+        if session.close > start_time and session.open <= end_time
+    ]
+
+
+def _bar_window(session: Session, timeframe: TimeFrame) -> Interval:
+    """First and last bar timestamps alpaca can return for a session"""
+    if timeframe.unit == TimeFrameUnit.Day:
+        midnight = _to_utc(session.day, time(0, 0))
+        return midnight, midnight
+    if timeframe.unit == TimeFrameUnit.Hour:
+        step = timedelta(hours=timeframe.amount)
+        return session.open.replace(minute=0), session.close - step
+    step = timedelta(minutes=timeframe.amount)
+    return session.open, session.close - step
+
+
+def session_windows(intervals: list[Interval], timeframe: TimeFrame) -> list[Interval]:
+    """
+    Intersect intervals with the times bars can exist for a timeframe.
+    Week and month bars are not tied to single sessions and are left as they are.
+    """
+    if timeframe.unit not in {
+        TimeFrameUnit.Minute,
+        TimeFrameUnit.Hour,
+        TimeFrameUnit.Day,
+    }:
+        return intervals
+    windows = []
+    for start, end in intervals:
+        start, end = naive_utc(start), naive_utc(end)
+        sessions = get_sessions(start - timedelta(days=1), end + timedelta(days=1))
+        for session in sessions:
+            first, last = _bar_window(session, timeframe)
+            first, last = max(first, start), min(last, end)
+            if first <= last:
+                windows.append((first, last))
+    return windows
+
+
+def extended_windows(
+    start_time: datetime, end_time: datetime, chunk: timedelta = timedelta(days=1)
+) -> list[Interval]:
+    """
+    Split start and end time into the extended hours of each session,
+    further cut into pieces no longer than chunk. Pieces don't share an end point
+    """
+    start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+    windows = []
+    day = timedelta(days=1)
+    for session in get_sessions(start_time - day, end_time + day):
+        first = max(_to_utc(session.day, EXTENDED_OPEN), start_time)
+        last = min(session.close + EXTENDED_HOURS_AFTER_CLOSE, end_time)
+        while first < last:
+            windows.append(
+                (first, min(first + chunk, last) - timedelta(microseconds=1))
+            )
+            first += chunk
+    return windows
+
+
+def session_mask(timestamps: np.ndarray) -> np.ndarray:
+    """Mask of which naive UTC datetime64 timestamps fall inside a regular session"""
+    if not len(timestamps):
+        return np.zeros(0, dtype=bool)
+    first, last = timestamps.min().item(), timestamps.max().item()
+    sessions = get_sessions(first, last)
+    if not sessions:
+        return np.zeros(len(timestamps), dtype=bool)
+    opens = np.array([session.open for session in sessions], dtype=timestamps.dtype)
+    closes = np.array([session.close for session in sessions], dtype=timestamps.dtype)
+    index = np.searchsorted(opens, timestamps, side="right") - 1
+    return (index >= 0) & (timestamps < closes[np.maximum(index, 0)])
@@ -74,7 +74,7 @@ class CustomBarSet(BaseDataSet, TimeSeriesMixin):
         )
 
     def append(self, bar_: Bar):
-        """Keeps the last 15 bars in memory"""
+        """Add a bar to its symbol's list"""
         if bar_.symbol not in self.data:
             self.data[bar_.symbol] = []
         symbol_list = self.data[bar_.symbol]
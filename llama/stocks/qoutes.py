@@ -0,0 +1,152 @@
+"""
+Point in time qoute lookups over the stored qoutes, so backtests never hit alpaca
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import select, union_all
+
+from ..database import Qoutes
+from ..settings import get_sync_sessionm
+from .coverage import naive_utc
+
+QOUTE_COLUMNS = ("ask_price", "ask_size", "bid_price", "bid_size")
+
+
+class AsOfQoute(NamedTuple):
+    """The qoute prevailing at a point in time"""
+
+    symbol: str
+    timestamp: datetime
+    ask_price: float
+    ask_size: float
+    bid_price: float
+    bid_size: float
+
+
+@dataclass
+class SymbolQoutes:
+    """Qoutes for one symbol as columns sorted by timestamp"""
+
+    symbol: str
+    timestamp: np.ndarray
+    ask_price: np.ndarray
+    ask_size: np.ndarray
+    bid_price: np.ndarray
+    bid_size: np.ndarray
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    @classmethod
+    def from_parts(cls, symbol: str, parts: list[dict[str, np.ndarray]]):
+        """Join column chunks read from postgres"""
+        return cls(
+            symbol,
+            **{
+                col: np.concatenate([part[col] for part in parts])
+                for col in ("timestamp", *QOUTE_COLUMNS)
+            },
+        )
+
+    def index_at(self, timestamps: np.ndarray) -> np.ndarray:
+        """Position of the qoute prevailing at each timestamp, -1 before the first"""
+        return np.searchsorted(self.timestamp, timestamps, side="right") - 1
+
+
+class QouteIndex:
+    """As of lookups of stored qoutes, binary searched per symbol"""
+
+    def __init__(self, qoutes: dict[str, SymbolQoutes]):
+        self.qoutes = qoutes
+
+    def __contains__(self, symbol: str):
+        return symbol in self.qoutes
+
+    @classmethod
+    def load(
+        cls,
+        symbols: list[str],
+        start_time: datetime,
+        end_time: datetime,
+        chunk_size: int = 500_000,
+    ):
+        """
+        Read the qoutes between start and end time, plus the last qoute before
+        start time so the first bars have a prevailing qoute too
+        """
+        start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+        columns = [Qoutes.symbol, Qoutes.timestamp] + [
+            getattr(Qoutes, col) for col in QOUTE_COLUMNS
+        ]
+        in_range = select(*columns).where(
+            Qoutes.symbol.in_(symbols),
+            Qoutes.timestamp >= start_time,
+            Qoutes.timestamp <= end_time,
+        )
+        prevailing = (
+            select(*columns)
+            .distinct(Qoutes.symbol)
+            .where(Qoutes.symbol.in_(symbols), Qoutes.timestamp < start_time)
+            .order_by(Qoutes.symbol, Qoutes.timestamp.desc())
+        )
+        query = union_all(in_range, prevailing.subquery().select()).subquery()
+        stmt = (
+            select(query)
+            .order_by(query.c.symbol, query.c.timestamp)
+            .execution_options(yield_per=chunk_size)
+        )
+        parts: dict[str, list[dict[str, np.ndarray]]] = {}
+        with get_sync_sessionm().begin() as session:
+            for rows in session.execute(stmt).partitions():
+                symbol_col, *value_cols = zip(*rows)
+                symbol_arr = np.array(symbol_col, dtype=object)
+                values = {
+                    "timestamp": np.array(value_cols[0], dtype="datetime64[us]"),
+                    **{
+                        col: np.array(value_cols[i + 1], dtype=np.float64)
+                        for i, col in enumerate(QOUTE_COLUMNS)
+                    },
+                }
+                bounds = np.flatnonzero(symbol_arr[1:] != symbol_arr[:-1]) + 1
+                for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(symbol_arr)]):
+                    parts.setdefault(symbol_arr[lo], []).append(
+                        {col: arr[lo:hi] for col, arr in values.items()}
+                    )
+        qoutes = {
+            symbol: SymbolQoutes.from_parts(symbol, symbol_parts)
+            for symbol, symbol_parts in parts.items()
+        }
+        logging.info(
+            "loaded %s qoutes for %s symbols into the qoute index",
+            sum(len(symbol_qoutes) for symbol_qoutes in qoutes.values()),
+            len(qoutes),
+        )
+        return cls(qoutes)
+
+    def asof(self, symbol: str, timestamp: datetime) -> AsOfQoute | None:
+        """The qoute prevailing at timestamp, None when there isn't one stored"""
+        if (symbol_qoutes := self.qoutes.get(symbol)) is None:
+            return None
+        index = int(symbol_qoutes.index_at(np.datetime64(naive_utc(timestamp), "us")))
+        if index < 0:
+            return None
+        return AsOfQoute(
+            symbol,
+            symbol_qoutes.timestamp[index].item(),
+            *(float(getattr(symbol_qoutes, col)[index]) for col in QOUTE_COLUMNS),
+        )
+
+    def ask_prices(self, symbol: str, timestamps: np.ndarray) -> np.ndarray:
+        """Prevailing ask price at each naive UTC timestamp, NaN where there is none"""
+        prices = np.full(len(timestamps), np.nan)
+        if (symbol_qoutes := self.qoutes.get(symbol)) is None:
+            return prices
+        index = symbol_qoutes.index_at(timestamps)
+        found = index >= 0
+        prices[found] = symbol_qoutes.ask_price[index[found]]
+        return prices
@@ -0,0 +1,29 @@
+"""
+Request rate limiting shared between worker threads
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread safe limiter that spaces calls so at most ``rate`` happen per second.
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        """Block until the caller is allowed to make its next request"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if (delay := slot - now) > 0:
+            time.sleep(delay)
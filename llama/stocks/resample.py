@@ -0,0 +1,126 @@
+"""
+Build hour, day and week bars locally from stored minute bars
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+
+from .bars import BAR_DTYPES, SymbolBars, to_datetime64
+from .coverage import Interval
+from .market_calendar import MARKET_TIMEZONE
+
+DERIVABLE_UNITS = {TimeFrameUnit.Hour, TimeFrameUnit.Day, TimeFrameUnit.Week}
+
+
+def bucket_starts(timestamps: np.ndarray, timeframe: TimeFrame) -> np.ndarray:
+    """
+    Start of the bar each (naive UTC) timestamp falls in. Hours are aligned in UTC,
+    days and weeks start at midnight market time like alpaca's bars do.
+    """
+    if timeframe.unit not in DERIVABLE_UNITS:
+        raise ValueError(f"can't derive {timeframe.value} bars from minute bars")
+    if timeframe.unit == TimeFrameUnit.Hour:
+        hours = timestamps.astype("datetime64[h]").astype(np.int64)
+        hours -= hours % timeframe.amount
+        return hours.astype("datetime64[h]").astype(BAR_DTYPES["timestamp"])
+    local = pd.DatetimeIndex(timestamps).tz_localize("UTC").tz_convert(MARKET_TIMEZONE)
+    midnight = local.normalize()
+    if timeframe.unit == TimeFrameUnit.Week:
+        midnight = (midnight - pd.to_timedelta(midnight.weekday, unit="D")).normalize()
+    return (
+        midnight.tz_convert("UTC")
+        .tz_localize(None)
+        .to_numpy(dtype=BAR_DTYPES["timestamp"])
+    )
+
+
+def _bucket_bounds(dt: datetime, timeframe: TimeFrame) -> Interval:
+    """Start of the bucket a datetime is in and the start of the bucket after it"""
+    start = bucket_starts(to_datetime64([dt]), timeframe)[0].item()
+    step = {
+        TimeFrameUnit.Hour: timedelta(hours=timeframe.amount),
+        TimeFrameUnit.Day: timedelta(days=1.5),
+        TimeFrameUnit.Week: timedelta(days=7.5),
+    }[timeframe.unit]
+    following = bucket_starts(to_datetime64([start + step]), timeframe)[0].item()
+    return start, following
+
+
+def whole_buckets(interval: Interval, timeframe: TimeFrame) -> Interval | None:
+    """Shrink an interval to the buckets that lie entirely inside it"""
+    start, end = interval
+    first_start, first_next = _bucket_bounds(start, timeframe)
+    last_start, last_next = _bucket_bounds(end, timeframe)
+    start = start if first_start == start else first_next
+    end = last_next if end >= last_next - timedelta(microseconds=1) else last_start
+    end -= timedelta(microseconds=1)
+    return (start, end) if start < end else None
+
+
+def holds_bar(interval: Interval, timeframe: TimeFrame):
+    """Whether a bar of the timeframe, stamped with its start, can be in an interval"""
+    start, end = interval
+    first_start, first_next = _bucket_bounds(start, timeframe)
+    return first_start == start or first_next <= end
+
+
+def resample(bars: SymbolBars, timeframe: TimeFrame) -> SymbolBars:
+    """
+    Aggregate sorted minute bars into bars of a larger timeframe.
+    VWAP is weighted by volume and trade counts are summed.
+    """
+    if not len(bars):
+        return SymbolBars.empty(bars.symbol)
+    keys = bucket_starts(bars.timestamp, timeframe)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    volume = np.add.reduceat(bars.volume, starts)
+    traded_value = np.add.reduceat(bars.vwap * bars.volume, starts)
+    vwap = np.divide(
+        traded_value,
+        volume,
+        out=np.add.reduceat(bars.vwap, starts) / (ends - starts),
+        where=volume > 0,
+    )
+    return SymbolBars(
+        bars.symbol,
+        timestamp=keys[starts],
+        open=bars.open[starts],
+        high=np.maximum.reduceat(bars.high, starts),
+        low=np.minimum.reduceat(bars.low, starts),
+        close=bars.close[ends - 1],
+        volume=volume,
+        trade_count=np.add.reduceat(bars.trade_count, starts),
+        vwap=vwap,
+    )
+
+
+class Resampler:
+    """Resamples minute bars, keeping the most recent results in memory"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._cache: OrderedDict[tuple, SymbolBars] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resample(self, bars: SymbolBars, timeframe: TimeFrame, interval: Interval):
+        """
+        Resample the minute bars covering interval. Results are cached by symbol,
+        timeframe and interval, which only hold bars once they're fully fetched.
+        """
+        key = (bars.symbol, timeframe.value, *interval)
+        with self._lock:
+            if (cached := self._cache.get(key)) is not None:
+                self._cache.move_to_end(key)
+                return cached
+        result = resample(bars.between(*interval), timeframe)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
@@ -2,8 +2,24 @@
 Import all strategy classes and functions
 """
 
-from .base import Condition, ConditionType, Strategy, get_base_conditions
+from .base import BarContext, Condition, ConditionType, Strategy, get_base_conditions
 from .conditions import get_all_conditions
 from .consts import ConditionDefinition, StrategyDefinition
 from .setup import insert_conditions, insert_strats
 from .strats import get_all_strats, get_predefined_strat_classes, get_strategy_class
+
+__all__ = [
+    "BarContext",
+    "Condition",
+    "ConditionType",
+    "Strategy",
+    "get_base_conditions",
+    "get_all_conditions",
+    "ConditionDefinition",
+    "StrategyDefinition",
+    "insert_conditions",
+    "insert_strats",
+    "get_all_strats",
+    "get_predefined_strat_classes",
+    "get_strategy_class",
+]
@@ -3,7 +3,14 @@ Export base strategy classes and functions
 """
 
 from .conditions import get_base_conditions
-from .consts import Condition, ConditionType
-from .strat import LIVE_DATA, Strategy
+from .consts import BarContext, Condition, ConditionType, MarketState
+from .strat import Strategy
 
-__all__ = ["get_base_conditions", "Condition", "ConditionType", "LIVE_DATA", "Strategy"]
+__all__ = [
+    "get_base_conditions",
+    "BarContext",
+    "Condition",
+    "ConditionType",
+    "MarketState",
+    "Strategy",
+]
@@ -4,78 +4,68 @@ Base Conditions added to all strategies
 
 import logging
 
-from alpaca.data.models import Bar
 from alpaca.trading import OrderSide
 
-from ...stocks.trader import Trader
-from .consts import Condition, ConditionType
+from .consts import BarContext, Condition, ConditionType
 
 
-def quantity_sell(most_recent_bar: Bar, trader: Trader, min_quantity: int):
+def quantity_sell(context: BarContext, min_quantity: int):
     """
     sell condition based on quantity
     """
-    position = trader.get_position(most_recent_bar.symbol, force=True)
-    qty_avail = int(position.qty_available)
-    condition = qty_avail > min_quantity
+    condition = context.qty_available > min_quantity
     return condition
 
 
-def is_profitable_sell(most_recent_bar: Bar, trader: Trader, unrealized_pl: float):
+def is_profitable_sell(context: BarContext, unrealized_pl: float):
     """
     purchase condition based on buy prices.. PURELY a sell condition
     """
 
-    position = trader.get_position(most_recent_bar.symbol, force=True)
-    condition = float(position.unrealized_pl) > unrealized_pl
+    condition = context.unrealized_pl > unrealized_pl
     logging.info(
         "is profitable sell condition on %s where unrealised profit/loss is %s condition response is %s",  # pylint: disable=line-too-long
-        most_recent_bar.symbol,
-        position.unrealized_pl,
+        context.symbol,
+        context.position.unrealized_pl,
         condition,
     )
     return condition
 
 
-def stop_loss_sell(most_recent_bar: Bar, trader: Trader, unrealized_plpc: float):
+def stop_loss_sell(context: BarContext, unrealized_plpc: float):
     """
     purchase condition based on buy prices.. PURELY a sell condition
     """
 
-    position = trader.get_position(most_recent_bar.symbol, force=True)
-    condition = float(position.unrealized_plpc) <= unrealized_plpc
+    condition = context.unrealized_plpc <= unrealized_plpc
     logging.info(
         "stop loss sell condition on %s where unrealised profit/loss percent is %s condition response is %s",  # pylint: disable=line-too-long
-        most_recent_bar.symbol,
-        position.unrealized_plpc,
+        context.symbol,
+        context.position.unrealized_plpc,
         condition,
     )
     return condition
 
 
-def quantity_buy(most_recent_bar: Bar, trader: Trader, max_quantity: int):
+def quantity_buy(context: BarContext, max_quantity: int):
     """buy condition based on quantity"""
-    position = trader.get_position(most_recent_bar.symbol, force=True)
-    qty_avail = int(position.qty_available)
-    condition = qty_avail < max_quantity
+    condition = context.qty_available < max_quantity
     return condition
 
 
 def take_profit_buy(
-    most_recent_bar: Bar,
-    trader: Trader,
+    context: BarContext,
     unrealized_plpc: float,
 ):
     """
     purchase condition based on buy prices.. PURELY a sell condition
     """
 
-    position = trader.get_position(most_recent_bar.symbol, force=True)
-    condition = float(position.unrealized_plpc) >= unrealized_plpc
+    condition = context.unrealized_plpc >= unrealized_plpc
     logging.info(
         "take profit condition on %s where unrealised profit/loss percent is %s condition response is %s",  # pylint: disable=line-too-long
-        most_recent_bar.symbol,
-        position.unrealized_plpc,
+        context.symbol,
+        context.position.unrealized_plpc,
         condition,
     )
     return condition
@@ -93,6 +83,7 @@ def get_base_conditions():
             active=True,
             side=OrderSide.BUY,
             type=ConditionType.AND,
+            stateful=True,
         ),
         Condition(
             name="take_profit",
@@ -101,6 +92,7 @@ def get_base_conditions():
             active=True,
             side=OrderSide.BUY,
             type=ConditionType.OR,
+            stateful=True,
         ),
         Condition(
             name="min_quantity_allowed",
@@ -109,6 +101,7 @@ def get_base_conditions():
             active=True,
             side=OrderSide.SELL,
             type=ConditionType.AND,
+            stateful=True,
         ),
         Condition(
             name="is_profitable",
@@ -117,6 +110,7 @@ def get_base_conditions():
             active=True,
             side=OrderSide.SELL,
             type=ConditionType.AND,
+            stateful=True,
         ),
         Condition(
             name="stop_loss",
@@ -125,5 +119,6 @@ def get_base_conditions():
             active=True,
             side=OrderSide.SELL,
             type=ConditionType.OR,
+            stateful=True,
         ),
     ]
@@ -2,12 +2,15 @@
 Base Strategy models and Enums
 """
 
+from dataclasses import dataclass, field
 from enum import StrEnum
+from functools import cached_property
 from typing import Any, Callable
 
+import numpy as np
 from alpaca.data.models import Bar
-from alpaca.trading import OrderSide
-from pydantic import BaseModel
+from alpaca.trading import OrderSide, Position
+from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
@@ -15,9 +18,8 @@ from sqlalchemy.orm import Session
 from trekkers.statements import on_conflict_update
 
 from ...database import Conditions, StratConditionMap
-from ...stocks import CustomBarSet, Trader
-
-LIVE_DATA = CustomBarSet()
+from ...stocks import BarWindow, BarWindows, SymbolBars, Trader
+from ..indicators import Indicator, IndicatorSet
 
 
 class ConditionType(StrEnum):
@@ -27,21 +29,152 @@ class ConditionType(StrEnum):
     OR = "or"
 
 
+class MarketState:
+    """
+    The recent bars and indicators of each symbol one strategy has run on.
+    Every strategy instance has its own, so backtest runs in threads or
+    processes never read each other's bars. With a depth of 0 no bars are kept
+    """
+
+    def __init__(self, indicators: list[Indicator], depth: int):
+        self.bars = BarWindows(depth) if depth else None
+        self.specs = indicators
+        self.indicators: dict[str, IndicatorSet] = {}
+
+    def window(self, symbol: str) -> BarWindow | None:
+        """Bars seen of a symbol, None before the first or when none are kept"""
+        if self.bars is None:
+            return None
+        return self.bars.data.get(symbol)
+
+    def update_indicators(self, bar: Bar) -> dict[str, Any]:
+        """Update the symbol's indicators with its next bar"""
+        if not self.specs:
+            return {}
+        if (indicators := self.indicators.get(bar.symbol)) is None:
+            indicators = self.indicators[bar.symbol] = IndicatorSet(self.specs)
+        return indicators.update(bar)
+
+    def append(self, bar: Bar):
+        """Keep a bar once the strategy has run on it"""
+        if self.bars is not None:
+            self.bars.append(bar)
+
+
+@dataclass
+class BarContext:
+    """
+    What conditions read about a bar, loaded once per bar instead of once per
+    condition. The ask price is only looked up when a buy needs pricing.
+    bars are the symbol's bars before this one and indicators the values of
+    the indicators conditions declared, both from the strategy's market state
+    """
+
+    bar: Bar
+    trader: Trader
+    position: Position
+    buying_power: float
+    pricer: Callable[[Bar], float]
+    bars: BarWindow | None = None
+    indicators: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def load(
+        cls,
+        bar: Bar,
+        trader: Trader,
+        pricer: Callable[[Bar], float],
+        market: MarketState | None = None,
+    ):
+        """
+        Fetch the trader's position and buying power for a bar,
+        updating the market state's indicators with it
+        """
+        context = cls(
+            bar,
+            trader,
+            trader.get_position(bar.symbol, force=True),
+            float(trader.buying_power),
+            pricer,
+        )
+        if market is not None:
+            context.bars = market.window(bar.symbol)
+            context.indicators = market.update_indicators(bar)
+        return context
+
+    @property
+    def symbol(self) -> str:
+        """Symbol of the bar"""
+        return self.bar.symbol
+
+    @property
+    def qty_available(self) -> int:
+        """Quantity of the position available to trade"""
+        return int(self.position.qty_available)
+
+    @property
+    def unrealized_pl(self) -> float:
+        """Unrealized profit or loss of the position"""
+        return float(self.position.unrealized_pl)
+
+    @property
+    def unrealized_plpc(self) -> float:
+        """Unrealized profit or loss of the position as a percentage"""
+        return float(self.position.unrealized_plpc)
+
+    @cached_property
+    def ask_price(self) -> float:
+        """Price a buy at this bar would pay"""
+        return self.pricer(self.bar)
+
+
 class Condition(BaseModel):
     """
-    Definition of a condition
+    Definition of a condition.
+    vector_func computes the condition over a whole series of bars at once,
+    stateful conditions only depend on the trader's position.
+    indicators are the ones the condition reads from the bar context by name,
+    a vector_func of a condition with indicators also takes their arrays by name.
+    needs_bars is set by conditions that read the symbol's earlier bars from
+    the bar context, which are only kept while a condition needs them
     """
 
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     name: str
     func: Callable
     variables: dict
     active: bool = False
     side: OrderSide
     type: ConditionType
+    vector_func: Callable | None = None
+    stateful: bool = False
+    indicators: list[Indicator] = Field(default=[], exclude=True)
+    needs_bars: bool = Field(default=False, exclude=True)
 
-    def __call__(self, most_recent_bar: Bar, trader: Trader) -> bool:
+    def __call__(self, context: BarContext) -> bool:
         """What to do when you call a condition"""
-        return self.func(most_recent_bar, trader, **self.variables)
+        return self.func(context, **self.variables)
+
+    @property
+    def vectorizable(self):
+        """Whether the vectorized backtester can evaluate this condition"""
+        return self.vector_func is not None or self.stateful
+
+    def vector(
+        self, bars: SymbolBars, indicators: dict[str, np.ndarray] | None = None
+    ) -> np.ndarray:
+        """
+        The condition for every bar in a series, as a boolean array.
+        indicators holds the batch form of the indicators over the series
+        """
+        if self.vector_func is None:
+            raise ValueError(f"condition {self.name} has no vectorized form")
+        if self.indicators:
+            signal = self.vector_func(bars, indicators or {}, **self.variables)
+        else:
+            signal = self.vector_func(bars, **self.variables)
+        return np.asarray(signal, dtype=bool)
 
     def get_variables(self):
         """Return condition variables"""
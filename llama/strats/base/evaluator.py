@@ -0,0 +1,128 @@
+"""
+Short circuiting evaluation of a strategy's conditions, cheapest and most decisive first
+"""
+
+import time
+from dataclasses import dataclass
+
+from alpaca.trading import OrderSide
+
+from .consts import BarContext, Condition, ConditionType
+
+
+@dataclass
+class ConditionStats:
+    """Measured cost and hit rate of a condition"""
+
+    calls: int = 0
+    hits: int = 0
+    timed: int = 0
+    nanoseconds: int = 0
+
+    @property
+    def cost(self) -> float:
+        """Mean time of the calls that were timed"""
+        return self.nanoseconds / self.timed if self.timed else 1.0
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of calls that were True, starting from a half before any calls"""
+        return (self.hits + 1) / (self.calls + 2)
+
+
+Compiled = tuple[Condition, ConditionStats]
+
+
+class ConditionEvaluator:
+    """
+    A strategy's active conditions grouped by side and type. The AND group
+    stops at its first False and the OR group at its first True, so each group
+    is ordered by cost over the chance of deciding it, and reordered every
+    reorder_every evaluations as the measurements change. Only one in time_every
+    evaluations is timed to keep the measuring cheap. refresh rebuilds the
+    groups when a condition's active, side or type has changed
+    """
+
+    def __init__(
+        self,
+        conditions: list[Condition],
+        reorder_every: int = 256,
+        time_every: int = 16,
+    ):
+        self.conditions = conditions
+        self.reorder_every = reorder_every
+        self.time_every = time_every
+        self.stats: dict[str, ConditionStats] = {}
+        self._evaluations = 0
+        self._timing = False
+        self._fingerprint: tuple = ()
+        self._groups: dict[OrderSide, tuple[list[Compiled], list[Compiled]]] = {}
+        self.compile()
+
+    def _config(self) -> tuple:
+        """The parts of the conditions that decide the groups"""
+        return tuple(
+            (condition.name, condition.active, condition.side, condition.type)
+            for condition in self.conditions
+        )
+
+    def _stats(self, condition: Condition) -> ConditionStats:
+        """Stats of a condition, created on first use"""
+        if (stats := self.stats.get(condition.name)) is None:
+            stats = self.stats[condition.name] = ConditionStats()
+        return stats
+
+    def refresh(self):
+        """Rebuild the groups if the conditions' configuration has changed"""
+        if self._config() != self._fingerprint:
+            self.compile()
+
+    def compile(self):
+        """Group the active conditions, dropping inactive ones"""
+        self._fingerprint = self._config()
+        self._groups = {side: ([], []) for side in (OrderSide.BUY, OrderSide.SELL)}
+        for condition in self.conditions:
+            if condition.active:
+                and_group, or_group = self._groups[condition.side]
+                group = and_group if condition.type == ConditionType.AND else or_group
+                group.append((condition, self._stats(condition)))
+        self.reorder()
+
+    def reorder(self):
+        """Order each group by expected cost of reaching its result"""
+        for and_group, or_group in self._groups.values():
+            ## an AND group is decided by a False, an OR group by a True
+            and_group.sort(key=lambda item: item[1].cost / (1 - item[1].hit_rate))
+            or_group.sort(key=lambda item: item[1].cost / item[1].hit_rate)
+
+    def _call(
+        self, condition: Condition, stats: ConditionStats, context: BarContext
+    ) -> bool:
+        """Call a condition, counting its hits and timing it if due"""
+        if self._timing:
+            start = time.perf_counter_ns()
+            result = condition(context)
+            stats.nanoseconds += time.perf_counter_ns() - start
+            stats.timed += 1
+        else:
+            result = condition(context)
+        stats.calls += 1
+        stats.hits += bool(result)
+        return result
+
+    def __call__(self, context: BarContext, side: OrderSide) -> bool:
+        """Whether all AND conditions or any OR condition of a side hold"""
+        self._evaluations += 1
+        self._timing = self._evaluations % self.time_every == 0
+        if self._evaluations % self.reorder_every == 0:
+            self.reorder()
+        and_group, or_group = self._groups[side]
+        for condition, stats in and_group:
+            if not self._call(condition, stats, context):
+                break
+        else:
+            return True
+        for condition, stats in or_group:
+            if self._call(condition, stats, context):
+                return True
+        return False
@@ -29,10 +29,11 @@ from trekkers.statements import on_conflict_update
 
 from ...consts import BARSET_TYPE
 from ...database import StratConditionMap, Strategies
-from ...settings import get_sync_sessionm
-from ...stocks import History, Trader
+from ...settings import get_settings, get_sync_sessionm
+from ...stocks import History, QouteIndex, Trader
 from .conditions import get_base_conditions
-from .consts import LIVE_DATA, Condition, ConditionType
+from .consts import BarContext, Condition, ConditionType, MarketState
+from .evaluator import ConditionEvaluator
 
 
 class Strategy:
@@ -46,15 +47,31 @@ class Strategy:
     ACTIVE = False
 
     def __init__(
-        self, history: History, data: BARSET_TYPE, conditions: list[Condition]
+        self,
+        history: History,
+        data: BARSET_TYPE,
+        conditions: list[Condition],
+        qoutes: QouteIndex | None = None,
     ):
         """Initialising function of self"""
         self.history = history
         self.historic_data = data
+        self.qoutes = qoutes
         self.conditions = conditions
         self.condition_map: dict[str, dict[str, list[Condition]]] = (
             self.to_condition_map(conditions)
         )
+        self.evaluator = ConditionEvaluator(conditions)
+        ## earlier bars are only kept for conditions that read them
+        needs_bars = any(condition.needs_bars for condition in conditions)
+        self.market = MarketState(
+            [
+                indicator
+                for condition in conditions
+                for indicator in condition.indicators
+            ],
+            get_settings().live_data_depth if needs_bars else 0,
+        )
 
     @staticmethod
     def to_condition_map(conditions: list[Condition]):
@@ -78,8 +95,12 @@ class Strategy:
         end_time: datetime = datetime.utcnow() - timedelta(minutes=15),
         timeframe: TimeFrame = TimeFrame.Day,
         conditions: list[Condition] | None = None,
+        qoutes: QouteIndex | None = None,
     ):
-        """Create an instance of self using the inputs provided"""
+        """
+        Create an instance of self using the inputs provided.
+        Passing a qoute index makes buys price off stored qoutes instead of alpaca
+        """
         conditions = conditions or cls.DEFAULT_CONDITIONS
         with get_sync_sessionm().begin() as session:
             try:
@@ -92,6 +113,7 @@ class Strategy:
                 symbols, time_frame=timeframe, start_time=start_time, end_time=end_time
             ),
             conditions,
+            qoutes,
         )
 
     @classmethod
@@ -141,53 +163,41 @@ class Strategy:
         if live_update_strategy:
             with get_sync_sessionm().begin() as session:
                 self.get(session)
+            self.evaluator.refresh()
 
         action, qty = self.trade(trader, most_recent_bar)
-        LIVE_DATA.append(most_recent_bar)
+        self.market.append(most_recent_bar)
         return action, qty
 
-    def _condition_check(
-        self,
-        most_recent_bar: Bar,
-        trader: Trader,
-        side: OrderSide,
-    ):
+    def _condition_check(self, context: BarContext, side: OrderSide):
         """
         Run the condition check against all strategy conditions
         """
-        return any(
-            [
-                all(
-                    [
-                        condition(most_recent_bar, trader)
-                        for condition in self.condition_map[side][ConditionType.AND]
-                        if condition.active
-                    ]
-                ),
-                *[
-                    condition(most_recent_bar, trader)
-                    for condition in self.condition_map[side][ConditionType.OR]
-                    if condition.active
-                ],
-            ]
-        )
+        return self.evaluator(context, side)
+
+    def ask_price(self, most_recent_bar: Bar) -> float:
+        """
+        Price to buy at. Live this is the latest qoute from alpaca, in backtests
+        it is the qoute prevailing at the bar, or the bar's close if none is stored
+        """
+        if self.qoutes is None:
+            return self.history.get_latest_qoute(most_recent_bar.symbol).ask_price
+        qoute = self.qoutes.asof(most_recent_bar.symbol, most_recent_bar.timestamp)
+        return most_recent_bar.close if qoute is None else qoute.ask_price
 
     def trade(self, trader: Trader, most_recent_bar: Bar):
         """Making trade decisions based on the conditions"""
-        position = trader.get_position(most_recent_bar.symbol, force=True)
-        qty_avaliable = int(position.qty_available)
-
-        if self._condition_check(most_recent_bar, trader, OrderSide.BUY):
-            latest_qoute = self.history.get_latest_qoute(most_recent_bar.symbol)
-            if (
-                trader.buying_power
-                < latest_qoute.ask_price + 0.02 * latest_qoute.ask_price
-            ):
+        context = BarContext.load(most_recent_bar, trader, self.ask_price, self.market)
+        qty_avaliable = context.qty_available
+
+        if self._condition_check(context, OrderSide.BUY):
+            ask_price = context.ask_price
+            if context.buying_power < ask_price + 0.02 * ask_price:
                 logging.info(
                     "Balance %s is not enough money to buy %s at %s",
-                    trader.buying_power,
+                    context.buying_power,
                     most_recent_bar.symbol,
-                    latest_qoute.ask_price,
+                    ask_price,
                 )
                 return None, None
 
@@ -201,7 +211,7 @@ class Strategy:
                 most_recent_bar.symbol, time_in_force=TimeInForce.GTC, quantity=buy
             )
             return OrderSide.BUY, buy
-        elif self._condition_check(most_recent_bar, trader, OrderSide.SELL):
+        elif self._condition_check(context, OrderSide.SELL):
             logging.info(
                 "selling a share of %s with strat %s",
                 most_recent_bar.symbol,
@@ -0,0 +1,364 @@
+"""
+Streaming indicators, updated in O(1) per bar live and computed over whole
+bar series at once in backtests
+"""
+
+import abc
+import math
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from alpaca.data.models import Bar
+
+from ..stocks import SymbolBars
+
+
+class RingBuffer:
+    """Fixed number of floats, push is O(1) and returns the value it evicts"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values = [0.0] * capacity
+        self.count = 0
+        self._next = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def full(self):
+        """Whether the buffer holds capacity values"""
+        return self.count == self.capacity
+
+    def push(self, value: float) -> float | None:
+        """Add a value, evicting the oldest one if the buffer is full"""
+        evicted = self.values[self._next] if self.full else None
+        self.values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return evicted
+
+    def __getitem__(self, index: int) -> float:
+        """Values counted back from the newest, -1 is the newest"""
+        if not -self.count <= index < 0:
+            raise IndexError("ring buffer index out of range")
+        return self.values[(self._next + index) % self.capacity]
+
+
+class Indicator(abc.ABC):
+    """
+    An indicator of bars. update takes the next bar and returns the indicator
+    at it, batch returns the indicator at every bar of a series and matches
+    calling update on each bar in turn. Values are NaN until enough bars are seen
+    """
+
+    def __init__(self, **params: Any):
+        self.params = params
+        self.name = "_".join(
+            [type(self).__name__.lower(), *(str(value) for value in params.values())]
+        )
+
+    def fresh(self):
+        """A new indicator with the same parameters and no state"""
+        return type(self)(**self.params)
+
+    @abc.abstractmethod
+    def update(self, bar: Bar) -> Any:
+        """The indicator including the next bar"""
+
+    @abc.abstractmethod
+    def batch(self, bars: SymbolBars) -> np.ndarray:
+        """The indicator at every bar of a series"""
+
+
+class SMA(Indicator):
+    """Simple moving average of a bar field"""
+
+    def __init__(self, period: int, field: str = "close"):
+        super().__init__(period=period, field=field)
+        self.period, self.field = period, field
+        self.window = RingBuffer(period)
+        self.total = 0.0
+
+    def update(self, bar: Bar) -> float:
+        value = getattr(bar, self.field)
+        self.total += value - (self.window.push(value) or 0.0)
+        return self.total / self.period if self.window.full else math.nan
+
+    def batch(self, bars: SymbolBars) -> np.ndarray:
+        values = pd.Series(getattr(bars, self.field), dtype=float)
+        return values.rolling(self.period).mean().to_numpy()
+
+
+class EMA(Indicator):
+    """Exponential moving average of a bar field, starting at the first value"""
+
+    def __init__(self, period: int, field: str = "close"):
+        super().__init__(period=period, field=field)
+        self.field = field
+        self.alpha = 2 / (period + 1)
+        self.value: float | None = None
+
+    def update(self, bar: Bar) -> float:
+        value = getattr(bar, self.field)
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+    def batch(self, bars: SymbolBars) -> np.ndarray:
+        values = pd.Series(getattr(bars, self.field), dtype=float)
+        return values.ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+
+
+class Lag(Indicator):
+    """A bar field as it was periods bars before the newest"""
+
+    def __init__(self, periods: int = 1, field: str = "close"):
+        super().__init__(periods=periods, field=field)
+        self.periods, self.field = periods, field
+        self.window = RingBuffer(periods + 1)
+
+    def update(self, bar: Bar) -> float:
+        self.window.push(getattr(bar, self.field))
+        return self.window[-self.window.capacity] if self.window.full else math.nan
+
+    def batch(self, bars: SymbolBars) -> np.ndarray:
+        values = pd.Series(getattr(bars, self.field), dtype=float)
+        return values.shift(self.periods).to_numpy()
+
+
+class RollingVWAP(Indicator):
+    """Volume weighted average price over the last period bars"""
+
+    def __init__(self, period: int):
+        super().__init__(period=period)
+        self.period = period
+        self.price_volume = RingBuffer(period)
+        self.volume = RingBuffer(period)
+        self.total_price_volume = 0.0
+        self.total_volume = 0.0
+
+    def update(self, bar: Bar) -> float:
+        price_volume = bar.vwap * bar.volume
+        self.total_price_volume += price_volume - (
+            self.price_volume.push(price_volume) or 0.0
+        )
+        self.total_volume += bar.volume - (self.volume.push(bar.volume) or 0.0)
+        if not self.volume.full or self.total_volume <= 0:
+            return math.nan
+        return self.total_price_volume / self.total_volume
+
+    def batch(self, bars: SymbolBars) -> np.ndarray:
+        volume = pd.Series(bars.volume, dtype=float)
+        price_volume = pd.Series(bars.vwap * bars.volume, dtype=float)
+        total_volume = volume.rolling(self.period).sum().to_numpy()
+        total_price_volume = price_volume.rolling(self.period).sum().to_numpy()
+        vwap = np.full(len(bars), math.nan)
+        np.divide(total_price_volume, total_volume, out=vwap, where=total_volume > 0)
+        return vwap
+
+
+def _rsi(average_gain: float, average_loss: float) -> float:
+    """RSI from average gains and losses, 100 with no losses and 50 with no moves"""
+    if average_loss > 0:
+        return 100 - 100 / (1 + average_gain / average_loss)
+    return 100.0 if average_gain > 0 else 50.0
+
+
+class RSI(Indicator):
+    """Relative strength index of closes, smoothed like Wilder's"""
+
+    def __init__(self, period: int = 14):
+        super().__init__(period=period)
+        self.period = period
+        self.alpha = 1 / period
+        self.previous: float | None = None
+        self.average_gain = 0.0
+        self.average_loss = 0.0
+        self.changes = 0
+
+    def update(self, bar: Bar) -> float:
+        previous, self.previous = self.previous, bar.close
+        if previous is None:
+            return math.nan
+        change = bar.close - previous
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self.changes == 0:
+            self.average_gain, self.average_loss = gain, loss
+        else:
+            self.average_gain += self.alpha * (gain - self.average_gain)
+            self.average_loss += self.alpha * (loss - self.average_loss)
+        self.changes += 1
+        if self.changes < self.period:
+            return math.nan
+        return _rsi(self.average_gain, self.average_loss)
+
+    def batch(self, bars: SymbolBars) -> np.ndarray:
+        rsi = np.full(len(bars), math.nan)
+        if len(bars) < 2:
+            return rsi
+        change = pd.Series(np.diff(bars.close.astype(float)))
+        average_gain = change.clip(lower=0).ewm(alpha=self.alpha, adjust=False).mean()
+        average_loss = (
+            (-change).clip(lower=0).ewm(alpha=self.alpha, adjust=False).mean()
+        )
+        average_gain, average_loss = average_gain.to_numpy(), average_loss.to_numpy()
+        moves = np.where(average_gain > 0, 100.0, 50.0)
+        np.divide(average_gain, average_loss, out=moves, where=average_loss > 0)
+        rsi[1:] = np.where(average_loss > 0, 100 - 100 / (1 + moves), moves)
+        rsi[: self.period] = math.nan
+        return rsi
+
+
+class ATR(Indicator):
+    """Average true range, smoothed like Wilder's"""
+
+    def __init__(self, period: int = 14):
+        super().__init__(period=period)
+        self.period = period
+        self.alpha = 1 / period
+        self.previous_close: float | None = None
+        self.value = 0.0
+        self.count = 0
+
+    def update(self, bar: Bar) -> float:
+        true_range = bar.high - bar.low
+        if self.previous_close is not None:
+            true_range = max(
+                true_range,
+                abs(bar.high - self.previous_close),
+                abs(bar.low - self.previous_close),
+            )
+        self.previous_close = bar.close
+        if self.count == 0:
+            self.value = true_range
+        else:
+            self.value += self.alpha * (true_range - self.value)
+        self.count += 1
+        return self.value if self.count >= self.period else math.nan
+
+    def batch(self, bars: SymbolBars) -> np.ndarray:
+        high, low = bars.high.astype(float), bars.low.astype(float)
+        true_range = high - low
+        if len(bars) > 1:
+            previous_close = bars.close[:-1].astype(float)
+            true_range[1:] = np.maximum.reduce(
+                [
+                    true_range[1:],
+                    np.abs(high[1:] - previous_close),
+                    np.abs(low[1:] - previous_close),
+                ]
+            )
+        atr = pd.Series(true_range).ewm(alpha=self.alpha, adjust=False).mean()
+        atr = atr.to_numpy(copy=True)
+        atr[: self.period - 1] = math.nan
+        return atr
+
+
+## spreads this small next to the mean are rounding error, and count as none
+SPREAD_NOISE = 1e-9
+
+
+class _RollingMoments(Indicator):
+    """
+    Running sum and sum of squares of a bar field over the last period bars.
+    Values are summed less the first value seen, which keeps the sums small
+    so the variance doesn't cancel away
+    """
+
+    def __init__(self, period: int, field: str = "close", **params: Any):
+        super().__init__(period=period, field=field, **params)
+        self.period, self.field = period, field
+        self.window = RingBuffer(period)
+        self.shift: float | None = None
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def _push(self, bar: Bar) -> tuple[float, float, float]:
+        """Add a bar, returning its value and the window's mean and std"""
+        value = getattr(bar, self.field)
+        if self.shift is None:
+            self.shift = value
+        shifted = value - self.shift
+        evicted = self.window.push(shifted) or 0.0
+        self.total += shifted - evicted
+        self.total_squares += shifted * shifted - evicted * evicted
+        if not self.window.full:
+            return value, math.nan, math.nan
+        shifted_mean = self.total / self.period
+        variance = max(self.total_squares / self.period - shifted_mean**2, 0.0)
+        mean, std = shifted_mean + self.shift, math.sqrt(variance)
+        return value, mean, 0.0 if std <= SPREAD_NOISE * abs(mean) else std
+
+    def _moments(self, bars: SymbolBars):
+        """Values of a series with their rolling mean and std, shifted like _push"""
+        values = getattr(bars, self.field).astype(float)
+        shift = values[0] if len(values) else 0.0
+        rolling = pd.Series(values - shift).rolling(self.period)
+        mean = rolling.mean().to_numpy() + shift
+        std = rolling.std(ddof=0).to_numpy()
+        return values, mean, np.where(std <= SPREAD_NOISE * np.abs(mean), 0.0, std)
+
+
+class Bollinger(_RollingMoments):
+    """
+    Bollinger bands of a bar field, the middle band and width standard
+    deviations above and below it. batch returns them as three columns
+    """
+
+    def __init__(self, period: int = 20, width: float = 2.0, field: str = "close"):
+        super().__init__(period, field, width=width)
+        self.width = width
+
+    def update(self, bar: Bar) -> tuple[float, float, float]:
+        _, mean, std = self._push(bar)
+        return mean, mean + self.width * std, mean - self.width * std
+
+    def batch(self, bars: SymbolBars) -> np.ndarray:
+        _, mean, std = self._moments(bars)
+        return np.column_stack([mean, mean + self.width * std, mean - self.width * std])
+
+
+class ZScore(_RollingMoments):
+    """Standard deviations a bar field is from its rolling mean, 0 with no spread"""
+
+    def update(self, bar: Bar) -> float:
+        value, mean, std = self._push(bar)
+        if math.isnan(std):
+            return math.nan
+        return (value - mean) / std if std > 0 else 0.0
+
+    def batch(self, bars: SymbolBars) -> np.ndarray:
+        values, mean, std = self._moments(bars)
+        zscore = np.where(np.isnan(std), math.nan, 0.0)
+        np.divide(values - mean, std, out=zscore, where=std > 0)
+        return zscore
+
+
+class IndicatorSet:
+    """
+    Indicators of one symbol, each updated once per bar however many
+    conditions read it. Indicators are keyed by name, so equal ones are shared
+    """
+
+    def __init__(self, indicators: list[Indicator]):
+        self.indicators = {
+            indicator.name: indicator.fresh() for indicator in indicators
+        }
+        self.values: dict[str, Any] = {}
+
+    def update(self, bar: Bar) -> dict[str, Any]:
+        """Update every indicator with the next bar"""
+        self.values = {
+            name: indicator.update(bar) for name, indicator in self.indicators.items()
+        }
+        return self.values
+
+    def batch(self, bars: SymbolBars) -> dict[str, np.ndarray]:
+        """Every indicator over a whole series"""
+        return {
+            name: indicator.batch(bars) for name, indicator in self.indicators.items()
+        }
@@ -2,28 +2,30 @@
 VWAP specific conditions
 """
 
+import numpy as np
 from alpaca.data.models import Bar
 from alpaca.trading import OrderSide
 
-from ...stocks import Trader
-from ..base import LIVE_DATA, Condition, ConditionType
+from ...stocks import SymbolBars
+from ..base import BarContext, Condition, ConditionType
+from ..indicators import Lag
 
+## NaN until a symbol's second bar, which makes the slope 0
+PREVIOUS_VWAP = Lag(1, "vwap")
 
-def crossover_buy(most_recent_bar: Bar, _: Trader):
+
+def crossover_buy(context: BarContext):
     """When the most recent bar price goes above the vwap"""
-    return most_recent_bar.vwap < most_recent_bar.close
+    return context.bar.vwap < context.bar.close
 
 
-def crossover_sell(most_recent_bar: Bar, _: Trader):
+def crossover_sell(context: BarContext):
     """When the most recent bar price goes below the vwap"""
-    return most_recent_bar.vwap > most_recent_bar.close
+    return context.bar.vwap > context.bar.close
 
 
-def _slope(most_recent_bar: Bar):
+def _slope(most_recent_bar: Bar, previous_vwap: float):
     """calculate the new bar slope"""
-    previous_vwap = 0
-    if (data := LIVE_DATA.data.get(most_recent_bar.symbol)) is not None:
-        previous_vwap = data[-1].vwap
     current_vwap = most_recent_bar.vwap
     vwap_slope = 0
     if previous_vwap > 0:
@@ -31,33 +33,82 @@ def _slope(most_recent_bar: Bar):
     return vwap_slope
 
 
-def slope_buy(most_recent_bar: Bar, _: Trader, vwap_slope_threshold: float):
+def slope_buy(context: BarContext, vwap_slope_threshold: float):
     """VWAP Slope condition"""
-    vwap_slope = _slope(most_recent_bar)
+    vwap_slope = _slope(context.bar, context.indicators[PREVIOUS_VWAP.name])
     return vwap_slope > vwap_slope_threshold  # slope
 
 
-def reversion_buy(most_recent_bar: Bar, _: Trader, deviation_threshold: float):
+def reversion_buy(context: BarContext, deviation_threshold: float):
     """Reversion"""
     deviation_threshold = 0.001
-    return most_recent_bar.close < most_recent_bar.vwap * (1 - deviation_threshold)
+    return context.bar.close < context.bar.vwap * (1 - deviation_threshold)
 
 
-def reversion_sell(most_recent_bar: Bar, _: Trader, deviation_threshold: float):
+def reversion_sell(context: BarContext, deviation_threshold: float):
     """Reversion"""
-    return most_recent_bar.close > most_recent_bar.vwap * (1 + deviation_threshold)
+    return context.bar.close > context.bar.vwap * (1 + deviation_threshold)
 
 
-def tolerance_buy(most_recent_bar: Bar, _: Trader):
+def tolerance_buy(context: BarContext):
     """Buy within a tolerance"""
-    return most_recent_bar.close < (most_recent_bar.vwap + most_recent_bar.vwap * 0.2)
+    return context.bar.close < (context.bar.vwap + context.bar.vwap * 0.2)
 
 
-def tolerance_sell(most_recent_bar: Bar, _: Trader):
+def tolerance_sell(context: BarContext):
     """Sell within a tolerance"""
-    return most_recent_bar.close < (
-        most_recent_bar.vwap - (most_recent_bar.vwap * 0.2 / 2)
+    return context.bar.close < (context.bar.vwap - (context.bar.vwap * 0.2 / 2))
+
+
+def crossover_buy_vector(bars: SymbolBars):
+    """Vectorized crossover_buy"""
+    return bars.vwap < bars.close
+
+
+def crossover_sell_vector(bars: SymbolBars):
+    """Vectorized crossover_sell"""
+    return bars.vwap > bars.close
+
+
+def _slope_vector(bars: SymbolBars, previous_vwap: np.ndarray):
+    """Vectorized _slope"""
+    vwap_slope = np.zeros(len(bars))
+    np.divide(
+        bars.vwap - previous_vwap,
+        previous_vwap,
+        out=vwap_slope,
+        where=previous_vwap > 0,
     )
+    return vwap_slope
+
+
+def slope_buy_vector(
+    bars: SymbolBars, indicators: dict[str, np.ndarray], vwap_slope_threshold: float
+):
+    """Vectorized slope_buy"""
+    vwap_slope = _slope_vector(bars, indicators[PREVIOUS_VWAP.name])
+    return vwap_slope > vwap_slope_threshold
+
+
+def reversion_buy_vector(bars: SymbolBars, deviation_threshold: float):
+    """Vectorized reversion_buy"""
+    deviation_threshold = 0.001
+    return bars.close < bars.vwap * (1 - deviation_threshold)
+
+
+def reversion_sell_vector(bars: SymbolBars, deviation_threshold: float):
+    """Vectorized reversion_sell"""
+    return bars.close > bars.vwap * (1 + deviation_threshold)
+
+
+def tolerance_buy_vector(bars: SymbolBars):
+    """Vectorized tolerance_buy"""
+    return bars.close < (bars.vwap + bars.vwap * 0.2)
+
+
+def tolerance_sell_vector(bars: SymbolBars):
+    """Vectorized tolerance_sell"""
+    return bars.close < (bars.vwap - (bars.vwap * 0.2 / 2))
 
 
 def get_vwap_conditions():
@@ -66,7 +117,9 @@ def get_vwap_conditions():
         Condition(
             name="positive_vwap_slope",
             func=slope_buy,
+            vector_func=slope_buy_vector,
             variables={"vwap_slope_threshold": 0.005},
+            indicators=[PREVIOUS_VWAP],
             active=True,
             side=OrderSide.BUY,
             type=ConditionType.AND,
@@ -74,6 +127,7 @@ def get_vwap_conditions():
         Condition(
             name="positive_vwap_crossover",
             func=crossover_buy,
+            vector_func=crossover_buy_vector,
             variables={},
             active=True,
             side=OrderSide.BUY,
@@ -82,6 +136,7 @@ def get_vwap_conditions():
         Condition(
             name="negative_vwap_crossover",
             func=crossover_sell,
+            vector_func=crossover_sell_vector,
             variables={},
             active=True,
             side=OrderSide.SELL,
@@ -14,6 +14,7 @@ from trekkers.statements import upsert
 
 from ..database import Bars, Orders, Qoutes, Trades, TradeUpdates
 from ..settings import Settings, get_sync_sessionm
+from ..stocks.history import History
 from ..stocks.trader import Trader
 from ..strats import Strategy
 
@@ -23,16 +24,24 @@ class LiveStockDataStream:
     Get sent live updates for changes to stock bars,qoutes and trades
     """
 
-    def __init__(self, wss_client: StockDataStream, trader: Trader):
+    def __init__(
+        self,
+        wss_client: StockDataStream,
+        trader: Trader,
+        history: History | None = None,
+    ):
         self.wss_client = wss_client
         self.trader = trader
+        self.history = history
         self.strategies: list[Strategy] = []
 
     @classmethod
-    def create(cls, settings: Settings, trader: Trader):
+    def create(cls, settings: Settings, trader: Trader, history: History | None = None):
         """Create an instance of this object"""
 
-        return cls(StockDataStream(settings.api_key, settings.secret_key), trader)
+        return cls(
+            StockDataStream(settings.api_key, settings.secret_key), trader, history
+        )
 
     async def handle_bars(self, data: Bar):
         """Perform trades based on data"""
@@ -45,7 +54,9 @@ class LiveStockDataStream:
             session.execute(insert(Bars).values(data_dict))
 
     async def handle_qoutes(self, data: Quote):
-        """Handle incoming qoutes"""
+        """Handle incoming qoutes, keeping the latest qoute cache warm"""
+        if self.history is not None:
+            self.history.qoute_cache.put(data)
         with get_sync_sessionm().begin() as session:
             session.execute(insert(Qoutes).values(data.model_dump()))
 
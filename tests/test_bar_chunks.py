@@ -0,0 +1,60 @@
+"""
+Chunks of streamed bar rows split back into symbols and bars
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from llama.stocks import BarChunk, BarStore
+
+
+def row(symbol: str, minute: int, price: float):
+    """A row of (symbol, *BAR_COLUMNS) as read from llama.bars"""
+    timestamp = datetime(2024, 1, 2, 14, 30) + timedelta(minutes=minute)
+    return (symbol, timestamp, price, price + 1, price - 1, price, 10, 2, price)
+
+
+ROWS = [
+    row("AAPL", 0, 100.0),
+    row("MSFT", 0, 300.0),
+    row("AAPL", 1, 101.0),
+    row("MSFT", 1, 301.0),
+    row("AAPL", 2, 102.0),
+]
+
+
+def test_chunk_to_store():
+    """A chunk ordered by timestamp splits into each symbol's bars, in order"""
+    store = BarChunk.from_rows(ROWS).to_store()
+    assert store.symbols == ["AAPL", "MSFT"]
+    assert store["AAPL"].close.tolist() == [100.0, 101.0, 102.0]
+    assert store["MSFT"].close.tolist() == [300.0, 301.0]
+    assert store["MSFT"].timestamp.tolist() == [ROWS[1][1], ROWS[3][1]]
+    assert store["AAPL"].volume.dtype == np.float64
+
+
+def test_chunk_bars():
+    """Bars come out one at a time in the chunk's order"""
+    chunk = BarChunk.from_rows(ROWS)
+    bars = list(chunk.bars())
+    assert len(chunk) == len(bars) == 5
+    assert [bar_.symbol for bar_ in bars] == ["AAPL", "MSFT", "AAPL", "MSFT", "AAPL"]
+    assert bars[1].close == 300.0
+    assert bars[1].high == 301.0
+    assert bars[1].trade_count == 2
+    assert bars[1].timestamp.replace(tzinfo=None) == ROWS[1][1]
+
+
+def test_store_from_rows():
+    """Rows ordered by symbol then timestamp split at each new symbol"""
+    rows = sorted(ROWS, key=lambda row_: (row_[0], row_[1]))
+    store = BarStore.from_rows(rows)
+    assert store.symbols == ["AAPL", "MSFT"]
+    assert store["AAPL"].close.tolist() == [100.0, 101.0, 102.0]
+    assert store["MSFT"].close.tolist() == [300.0, 301.0]
+
+
+def test_store_from_no_rows():
+    """No rows is an empty store"""
+    assert len(BarStore.from_rows([])) == 0
@@ -0,0 +1,104 @@
+"""
+Interval math of the coverage ledger
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from llama.stocks import coverage
+from llama.stocks.coverage import merge_intervals, naive_utc, subtract_intervals
+
+
+def at(hour: int, minute: int = 0) -> datetime:
+    """A naive UTC datetime on one day"""
+    return datetime(2024, 1, 2, hour, minute)
+
+
+def test_merge_overlapping_and_unsorted():
+    """Overlapping intervals merge whatever order they come in"""
+    assert merge_intervals([(at(12), at(14)), (at(10), at(13))]) == [(at(10), at(14))]
+
+
+def test_merge_contained():
+    """An interval inside another disappears into it"""
+    assert merge_intervals([(at(10), at(16)), (at(11), at(12))]) == [(at(10), at(16))]
+
+
+def test_merge_adjacent():
+    """Intervals that touch merge even without a tolerance"""
+    assert merge_intervals([(at(10), at(11)), (at(11), at(12))]) == [(at(10), at(12))]
+
+
+def test_merge_gaps_within_tolerance():
+    """Gaps up to the tolerance merge, longer ones don't"""
+    intervals = [(at(10), at(11)), (at(11, 1), at(12)), (at(12, 5), at(13))]
+    assert merge_intervals(intervals, timedelta(minutes=1)) == [
+        (at(10), at(12)),
+        (at(12, 5), at(13)),
+    ]
+    assert merge_intervals(intervals) == intervals
+
+
+def test_merge_empty():
+    """Nothing to merge"""
+    assert merge_intervals([]) == []
+
+
+@pytest.mark.parametrize(
+    "covered, remaining",
+    [
+        ([], [(at(10), at(16))]),
+        ([(at(9), at(17))], []),
+        ([(at(10), at(16))], []),
+        ([(at(12), at(13))], [(at(10), at(12)), (at(13), at(16))]),
+        ([(at(8), at(9)), (at(17), at(18))], [(at(10), at(16))]),
+        ([(at(9), at(10))], [(at(10), at(16))]),
+        ([(at(16), at(17))], [(at(10), at(16))]),
+        ([(at(9), at(11)), (at(15), at(17))], [(at(11), at(15))]),
+        (
+            [(at(11), at(12)), (at(13), at(14))],
+            [(at(10), at(11)), (at(12), at(13)), (at(14), at(16))],
+        ),
+    ],
+    ids=[
+        "nothing covered",
+        "covered beyond both ends",
+        "covered exactly",
+        "covered in the middle",
+        "covered outside",
+        "adjacent before",
+        "adjacent after",
+        "covered at both ends",
+        "several gaps",
+    ],
+)
+def test_subtract(covered, remaining):
+    """The parts of 10:00 to 16:00 not covered"""
+    assert subtract_intervals((at(10), at(16)), covered) == remaining
+
+
+def test_naive_utc():
+    """Aware datetimes convert to naive UTC, naive ones are already UTC"""
+    eastern = timezone(timedelta(hours=-5))
+    assert naive_utc(datetime(2024, 1, 2, 9, 30, tzinfo=eastern)) == at(14, 30)
+    assert naive_utc(at(14, 30)) == at(14, 30)
+
+
+def test_get_uncovered(monkeypatch):
+    """Each symbol's gaps in the requested range, compared in naive UTC"""
+    monkeypatch.setattr(
+        coverage,
+        "get_coverage",
+        lambda symbols, *_: {"AAPL": [(at(12), at(13))], "MSFT": []},
+    )
+    uncovered = coverage.get_uncovered(
+        ["AAPL", "MSFT"],
+        "1Min",
+        at(10).replace(tzinfo=timezone.utc),
+        at(16).replace(tzinfo=timezone.utc),
+    )
+    assert uncovered == {
+        "AAPL": [(at(10), at(12)), (at(13), at(16))],
+        "MSFT": [(at(10), at(16))],
+    }
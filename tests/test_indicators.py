@@ -0,0 +1,175 @@
+"""
+Streaming indicators agree with their batch forms, on their own and inside backtests
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from alpaca.trading import OrderSide
+
+from llama.backtester.mocktrader import MockTrader
+from llama.backtester.runner import test_strat as run_per_bar
+from llama.backtester.vectorized import can_vectorize
+from llama.backtester.vectorized import test_strat_vectorized as run_vectorized
+from llama.stocks import QouteIndex, SymbolBars
+from llama.strats import BarContext, Condition, ConditionType, get_strategy_class
+from llama.strats.indicators import (
+    ATR,
+    EMA,
+    RSI,
+    SMA,
+    Bollinger,
+    IndicatorSet,
+    Lag,
+    RollingVWAP,
+    ZScore,
+)
+from llama.strats.vwap.conditions import get_vwap_conditions
+
+INDICATORS = [
+    SMA(10),
+    EMA(10),
+    Lag(1, "vwap"),
+    RollingVWAP(10),
+    RSI(14),
+    ATR(14),
+    Bollinger(20),
+    ZScore(20),
+]
+
+
+def make_bars(size: int = 3000, seed: int = 1) -> SymbolBars:
+    """A random walk of minute bars, with a flat stretch and some empty volume"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.3, size))
+    close[100:130] = close[100]
+    volume = rng.integers(0, 50, size).astype(float)
+    return SymbolBars.from_columns(
+        "AAPL",
+        {
+            "timestamp": [
+                datetime(2024, 1, 2, 14, 30) + timedelta(minutes=i) for i in range(size)
+            ],
+            "open": close,
+            "high": close + rng.uniform(0, 1, size),
+            "low": close - rng.uniform(0, 1, size),
+            "close": close,
+            "volume": volume,
+            "trade_count": volume,
+            "vwap": close + rng.normal(0, 0.2, size),
+        },
+    )
+
+
+@pytest.mark.parametrize("indicator", INDICATORS, ids=lambda ind: ind.name)
+def test_update_matches_batch(indicator):
+    """Updating bar by bar gives the batch form of the whole series"""
+    bars = make_bars()
+    streamed = indicator.fresh()
+    updated = np.array([streamed.update(bar_) for bar_ in bars.to_bars()])
+    np.testing.assert_allclose(
+        updated, indicator.batch(bars), rtol=1e-9, atol=1e-9, equal_nan=True
+    )
+
+
+def _oversold(context: BarContext, level: float):
+    """Buy when RSI is low and the close is under the lower bollinger band"""
+    _, _, lower = context.indicators["bollinger_20_close_2.0"]
+    return context.indicators["rsi_14"] < level and context.bar.close < lower
+
+
+def _oversold_vector(bars: SymbolBars, indicators: dict, level: float):
+    """Vectorized _oversold"""
+    lower = indicators["bollinger_20_close_2.0"][:, 2]
+    return (indicators["rsi_14"] < level) & (bars.close < lower)
+
+
+def _overbought(context: BarContext, level: float):
+    """Sell when the close is over level standard deviations above its mean"""
+    return context.indicators["zscore_20_close"] > level
+
+
+def _overbought_vector(bars: SymbolBars, indicators: dict, level: float):
+    """Vectorized _overbought"""
+    return indicators["zscore_20_close"] > level
+
+
+def make_strategy():
+    """A strategy whose conditions read indicators, VWAP slope included"""
+    conditions = [
+        *get_vwap_conditions(),
+        Condition(
+            name="oversold",
+            func=_oversold,
+            vector_func=_oversold_vector,
+            variables={"level": 40},
+            active=True,
+            side=OrderSide.BUY,
+            type=ConditionType.OR,
+            indicators=[RSI(14), Bollinger(20)],
+        ),
+        Condition(
+            name="overbought",
+            func=_overbought,
+            vector_func=_overbought_vector,
+            variables={"level": 1.5},
+            active=True,
+            side=OrderSide.SELL,
+            type=ConditionType.OR,
+            indicators=[ZScore(20)],
+        ),
+    ]
+    for condition in conditions:
+        if condition.name == "positive_vwap_slope":
+            condition.variables["vwap_slope_threshold"] = 0.0005
+    strat_class = get_strategy_class("indicators", "indicators", True, conditions)
+    return strat_class(None, None, conditions, QouteIndex({}))
+
+
+def test_backtest_streaming_matches_batch():
+    """
+    The per bar backtest, which updates the indicators bar by bar, trades the
+    same as the vectorized one, which reads their batch forms
+    """
+    bars = make_bars()
+    streamed, _ = run_per_bar(make_strategy(), MockTrader(), bars.to_bars())
+    strategy = make_strategy()
+    assert can_vectorize(strategy)
+    batched, _ = run_vectorized(strategy, MockTrader(), bars)
+
+    assert streamed.stats.buys > 0 and streamed.stats.sells > 0
+    assert (streamed.stats.buys, streamed.stats.sells) == (
+        batched.stats.buys,
+        batched.stats.sells,
+    )
+    assert streamed.stats.equity == pytest.approx(batched.stats.equity)
+    streamed_curve = streamed.recorder.arrays()
+    batched_curve = batched.recorder.arrays()
+    for name in ("timestamp", "buys", "sells"):
+        np.testing.assert_array_equal(streamed_curve[name], batched_curve[name])
+    np.testing.assert_allclose(streamed_curve["equity"], batched_curve["equity"])
+
+
+def test_strategy_indicators_match_batch():
+    """The values conditions read in the per bar loop are the batch form's"""
+    bars = make_bars()
+    strategy = make_strategy()
+    seen = []
+    for bar_ in bars.to_bars():
+        seen.append(strategy.market.update_indicators(bar_))
+    batched = IndicatorSet(strategy.market.specs).batch(bars)
+    assert set(batched) == {
+        "lag_1_vwap",
+        "rsi_14",
+        "bollinger_20_close_2.0",
+        "zscore_20_close",
+    }
+    for name, values in batched.items():
+        np.testing.assert_allclose(
+            np.array([row[name] for row in seen]),
+            values,
+            rtol=1e-9,
+            atol=1e-9,
+            equal_nan=True,
+        )
@@ -0,0 +1,44 @@
+"""
+Bars copied into postgres fit llama.bars, NOT NULL integer columns included
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from llama.stocks import BarStore, SymbolBars
+from llama.stocks import ingest
+
+
+def test_copy_bars_writes_missing_counts_as_zero(monkeypatch):
+    """A bar alpaca sent without a trade_count or volume is copied with 0"""
+    copied = []
+
+    def copy_rows(model, columns, rows, merge=True):
+        copied.extend(rows)
+        return len(copied)
+
+    monkeypatch.setattr(ingest, "copy_rows", copy_rows)
+    bars = SymbolBars.from_columns(
+        "AAPL",
+        {
+            "timestamp": [
+                datetime(2024, 1, 2, 14, 30) + timedelta(minutes=i) for i in range(3)
+            ],
+            "open": [1.0, 2.0, 3.0],
+            "high": [1.5, 2.5, 3.5],
+            "low": [0.5, 1.5, 2.5],
+            "close": [1.0, 2.0, 3.0],
+            "volume": [10.0, np.nan, 30.0],
+            "trade_count": [4.0, 5.0, np.nan],
+            "vwap": [1.0, 2.0, 3.0],
+        },
+    )
+
+    assert ingest.copy_bars(BarStore({"AAPL": bars}), "1Min") == 3
+    volume = ingest.BAR_COPY_COLUMNS.index("volume")
+    trade_count = ingest.BAR_COPY_COLUMNS.index("trade_count")
+    assert [row[volume] for row in copied] == [10, 0, 30]
+    assert [row[trade_count] for row in copied] == [4, 5, 0]
+    for row in copied:
+        assert type(row[volume]) is int and type(row[trade_count]) is int
@@ -0,0 +1,150 @@
+"""
+The latest qoute cache's TTL and coalescing of concurrent lookups
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from alpaca.data.models import Quote
+
+from llama.stocks import latest
+from llama.stocks.latest import LatestQouteCache
+
+START = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+
+
+def qoute(symbol: str, seconds: int = 0, ask_price: float = 100.0) -> Quote:
+    """An alpaca qoute from the raw fields alpaca sends"""
+    return Quote(
+        symbol,
+        {
+            "t": START + timedelta(seconds=seconds),
+            "ax": "V",
+            "ap": ask_price,
+            "as": 1,
+            "bx": "V",
+            "bp": ask_price - 0.01,
+            "bs": 1,
+            "c": ["R"],
+            "z": "C",
+        },
+    )
+
+
+class Clock:
+    """Stands in for time.monotonic"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch):
+    """A clock the test moves forward"""
+    clock = Clock()
+    monkeypatch.setattr(latest.time, "monotonic", clock)
+    return clock
+
+
+class Fetcher:
+    """Records each call and answers with a qoute per symbol"""
+
+    def __init__(self, ask_price: float = 100.0):
+        self.calls: list[list[str]] = []
+        self.ask_price = ask_price
+
+    def __call__(self, symbols: list[str]) -> dict[str, Quote]:
+        self.calls.append(symbols)
+        return {
+            symbol: qoute(symbol, ask_price=self.ask_price)
+            for symbol in symbols
+            if symbol != "NONE"
+        }
+
+
+@pytest.mark.usefixtures("clock")
+def test_missing_symbols_fetched_together():
+    """Symbols not cached are fetched in one call, duplicates once"""
+    fetch = Fetcher()
+    cache = LatestQouteCache(fetch, ttl=5)
+    qoutes = cache.get_many(["AAPL", "MSFT", "AAPL", "NONE"])
+    assert fetch.calls == [["AAPL", "MSFT", "NONE"]]
+    assert set(qoutes) == {"AAPL", "MSFT"}
+
+
+def test_cached_until_the_ttl(clock):
+    """Qoutes are reused for ttl seconds and fetched again after"""
+    fetch = Fetcher()
+    cache = LatestQouteCache(fetch, ttl=5)
+    cache.get_many(["AAPL"])
+    clock.now = 4.9
+    cache.get_many(["AAPL"])
+    assert len(fetch.calls) == 1
+    clock.now = 5.0
+    cache.get_many(["AAPL", "MSFT"])
+    assert fetch.calls == [["AAPL"], ["AAPL", "MSFT"]]
+
+
+def test_no_ttl_always_fetches(clock):
+    """A ttl of 0 turns the cache off"""
+    fetch = Fetcher()
+    cache = LatestQouteCache(fetch, ttl=0)
+    cache.get_many(["AAPL"])
+    cache.get_many(["AAPL"])
+    assert len(fetch.calls) == 2
+
+
+@pytest.mark.usefixtures("clock")
+def test_put_keeps_the_newest():
+    """A streamed qoute older than the cached one doesn't replace it"""
+    fetch = Fetcher()
+    cache = LatestQouteCache(fetch, ttl=5)
+    cache.put(qoute("AAPL", seconds=10, ask_price=101.0))
+    cache.put(qoute("AAPL", seconds=5, ask_price=99.0))
+    assert cache.get_many(["AAPL"])["AAPL"].ask_price == 101.0
+    assert not fetch.calls
+
+
+@pytest.mark.usefixtures("clock")
+def test_concurrent_lookups_share_a_fetch():
+    """A lookup for a symbol already being fetched waits for that fetch"""
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch(symbols):
+        calls.append(symbols)
+        started.set()
+        release.wait(5)
+        return {symbol: qoute(symbol) for symbol in symbols}
+
+    cache = LatestQouteCache(fetch, ttl=5)
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(cache.get_many, ["AAPL"])
+        assert started.wait(5)
+        second = pool.submit(cache.get_many, ["AAPL"])
+        release.set()
+        assert first.result(5)["AAPL"] is second.result(5)["AAPL"]
+    assert calls == [["AAPL"]]
+
+
+@pytest.mark.usefixtures("clock")
+def test_failed_fetch_can_be_retried():
+    """A fetch that raised isn't left in flight"""
+    attempts = []
+
+    def fetch(symbols):
+        attempts.append(symbols)
+        if len(attempts) == 1:
+            raise ConnectionError("alpaca is down")
+        return {symbol: qoute(symbol) for symbol in symbols}
+
+    cache = LatestQouteCache(fetch, ttl=5)
+    with pytest.raises(ConnectionError):
+        cache.get_many(["AAPL"])
+    assert "AAPL" in cache.get_many(["AAPL"])
+    assert len(attempts) == 2
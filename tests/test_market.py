@@ -0,0 +1,73 @@
+"""
+Strategies only keep earlier bars when one of their conditions reads them
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from alpaca.trading import OrderSide
+
+from llama.backtester.mocktrader import MockTrader
+from llama.backtester.runner import test_strat as run_per_bar
+from llama.settings import get_settings
+from llama.stocks import QouteIndex, SymbolBars
+from llama.strats import BarContext, Condition, ConditionType, get_strategy_class
+from llama.strats.vwap.conditions import get_vwap_conditions
+
+
+def make_bars(size: int):
+    """Minute bars climbing a cent a minute"""
+    close = 100 + np.arange(size) * 0.01
+    return SymbolBars.from_columns(
+        "AAPL",
+        {
+            "timestamp": [
+                datetime(2024, 1, 2, 14, 30) + timedelta(minutes=i) for i in range(size)
+            ],
+            "open": close,
+            "high": close,
+            "low": close,
+            "close": close,
+            "volume": np.ones(size),
+            "trade_count": np.ones(size),
+            "vwap": close,
+        },
+    )
+
+
+def make_strategy(conditions: list[Condition]):
+    """A strategy running only the given conditions"""
+    strat_class = get_strategy_class("market", "market", True, conditions)
+    return strat_class(None, None, conditions, QouteIndex({}))
+
+
+def test_bars_not_kept_without_a_condition_reading_them():
+    """The per bar loop doesn't fill bar windows nothing reads"""
+    strategy = make_strategy(get_vwap_conditions())
+    run_per_bar(strategy, MockTrader(), make_bars(200).to_bars())
+    assert strategy.market.bars is None
+    assert strategy.market.window("AAPL") is None
+
+
+def test_bars_kept_for_a_condition_reading_them():
+    """A condition with needs_bars sees the bars before the current one"""
+    seen = []
+
+    def count_bars(context: BarContext):
+        """Record how many earlier bars the context holds"""
+        seen.append(0 if context.bars is None else len(context.bars))
+        return False
+
+    condition = Condition(
+        name="count_bars",
+        func=count_bars,
+        variables={},
+        active=True,
+        side=OrderSide.BUY,
+        type=ConditionType.AND,
+        needs_bars=True,
+    )
+    strategy = make_strategy([condition])
+    run_per_bar(strategy, MockTrader(), make_bars(200).to_bars())
+    depth = get_settings().live_data_depth
+    assert seen == [min(index, depth) for index in range(200)]
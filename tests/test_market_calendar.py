@@ -0,0 +1,177 @@
+"""
+The local trading calendar's holidays, early closes and DST handling
+"""
+
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+
+from llama.stocks.market_calendar import (
+    early_closes,
+    extended_windows,
+    get_sessions,
+    holidays,
+    session_mask,
+    session_windows,
+)
+
+
+def test_holidays_2024():
+    """Every NYSE full day closure of 2024"""
+    assert holidays(2024) == {
+        date(2024, 1, 1),
+        date(2024, 1, 15),
+        date(2024, 2, 19),
+        date(2024, 3, 29),
+        date(2024, 5, 27),
+        date(2024, 6, 19),
+        date(2024, 7, 4),
+        date(2024, 9, 2),
+        date(2024, 11, 28),
+        date(2024, 12, 25),
+    }
+
+
+def test_weekend_holidays_are_observed():
+    """Saturday holidays close the friday before, sunday ones the monday after"""
+    assert date(2021, 7, 5) in holidays(2021)
+    assert date(2021, 12, 24) in holidays(2021)
+    assert date(2022, 6, 20) in holidays(2022)
+    assert date(2022, 12, 26) in holidays(2022)
+
+
+def test_saturday_new_year_is_not_observed():
+    """New year's day on a saturday doesn't close the last friday of the year"""
+    assert date(2021, 12, 31) not in holidays(2021)
+    assert not any(day.month == 1 and day.day < 3 for day in holidays(2022))
+
+
+def test_juneteenth_from_2022():
+    """Juneteenth is a market holiday from 2022"""
+    assert date(2021, 6, 18) not in holidays(2021)
+    assert date(2021, 6, 21) not in holidays(2021)
+    assert date(2023, 6, 19) in holidays(2023)
+
+
+@pytest.mark.parametrize(
+    "year, days",
+    [
+        (2024, {date(2024, 7, 3), date(2024, 11, 29), date(2024, 12, 24)}),
+        (2023, {date(2023, 7, 3), date(2023, 11, 24)}),
+        (2021, {date(2021, 11, 26)}),
+    ],
+)
+def test_early_closes(year, days):
+    """The day after thanksgiving, and july 3rd and christmas eve on weekdays"""
+    assert early_closes(year) == days
+
+
+def test_half_day_session():
+    """Half days close at 13:00 New York time"""
+    (session,) = get_sessions(datetime(2024, 11, 29), datetime(2024, 11, 29, 23))
+    assert session.early_close
+    assert session.open == datetime(2024, 11, 29, 14, 30)
+    assert session.close == datetime(2024, 11, 29, 18, 0)
+
+
+@pytest.mark.parametrize(
+    "day, open_hour",
+    [
+        (date(2024, 3, 8), 14),
+        (date(2024, 3, 11), 13),
+        (date(2024, 11, 1), 13),
+        (date(2024, 11, 4), 14),
+    ],
+    ids=["before spring dst", "after spring dst", "before fall dst", "after fall dst"],
+)
+def test_open_follows_dst(day, open_hour):
+    """The 9:30 open is 14:30 UTC in winter and 13:30 UTC in summer, as is the close"""
+    start = datetime.combine(day, datetime.min.time())
+    (session,) = get_sessions(start, start.replace(hour=23))
+    assert session.open == start.replace(hour=open_hour, minute=30)
+    assert session.close == start.replace(hour=open_hour + 7)
+    assert not session.early_close
+
+
+def test_no_sessions_over_a_long_weekend():
+    """Good friday 2024 and the weekend after it have no sessions"""
+    assert get_sessions(datetime(2024, 3, 29), datetime(2024, 3, 31, 23)) == []
+    sessions = get_sessions(datetime(2024, 3, 28), datetime(2024, 4, 1, 23))
+    assert [session.day for session in sessions] == [
+        date(2024, 3, 28),
+        date(2024, 4, 1),
+    ]
+
+
+def test_session_windows_minutes():
+    """Minute bars only exist from the open until a minute before the close"""
+    windows = session_windows(
+        [(datetime(2024, 11, 27), datetime(2024, 12, 2, 23))], TimeFrame.Minute
+    )
+    assert windows == [
+        (datetime(2024, 11, 27, 14, 30), datetime(2024, 11, 27, 20, 59)),
+        (datetime(2024, 11, 29, 14, 30), datetime(2024, 11, 29, 17, 59)),
+        (datetime(2024, 12, 2, 14, 30), datetime(2024, 12, 2, 20, 59)),
+    ]
+
+
+def test_session_windows_clips_to_the_interval():
+    """Part of a session is clipped to the interval asked for"""
+    windows = session_windows(
+        [(datetime(2024, 1, 2, 15), datetime(2024, 1, 2, 16))], TimeFrame.Minute
+    )
+    assert windows == [(datetime(2024, 1, 2, 15), datetime(2024, 1, 2, 16))]
+
+
+def test_session_windows_leaves_weeks_alone():
+    """Week bars aren't tied to a session"""
+    intervals = [(datetime(2024, 1, 6), datetime(2024, 1, 7))]
+    assert session_windows(intervals, TimeFrame(1, TimeFrameUnit.Week)) == intervals
+
+
+def test_session_mask():
+    """Bars in a session are kept, pre market, the close and weekends aren't"""
+    timestamps = np.array(
+        [
+            datetime(2024, 11, 29, 14, 29),
+            datetime(2024, 11, 29, 14, 30),
+            datetime(2024, 11, 29, 17, 59),
+            datetime(2024, 11, 29, 18, 0),
+            datetime(2024, 11, 30, 15, 0),
+            datetime(2024, 12, 2, 20, 59),
+        ],
+        dtype="datetime64[us]",
+    )
+    assert session_mask(timestamps).tolist() == [
+        False,
+        True,
+        True,
+        False,
+        False,
+        True,
+    ]
+    assert session_mask(np.empty(0, dtype="datetime64[us]")).tolist() == []
+
+
+def test_extended_windows():
+    """Extended hours run from 4:00 New York time until 4 hours after the close"""
+    windows = extended_windows(datetime(2024, 1, 2), datetime(2024, 1, 3, 12))
+    assert windows == [
+        (datetime(2024, 1, 2, 9), datetime(2024, 1, 3, 1) - timedelta(microseconds=1)),
+        (datetime(2024, 1, 3, 9), datetime(2024, 1, 3, 12) - timedelta(microseconds=1)),
+    ]
+
+
+def test_extended_windows_chunks_dont_share_end_points():
+    """A half day's extended hours cut into hours, each ending before the next"""
+    windows = extended_windows(
+        datetime(2024, 11, 29), datetime(2024, 11, 29, 23), timedelta(hours=1)
+    )
+    assert len(windows) == 13
+    assert windows[0][0] == datetime(2024, 11, 29, 9)
+    assert windows[-1][1] == datetime(2024, 11, 29, 22) - timedelta(microseconds=1)
+    for (_, end), (start, _) in zip(windows, windows[1:]):
+        assert end < start
+        assert start - end == timedelta(microseconds=1)
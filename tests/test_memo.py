@@ -0,0 +1,123 @@
+"""
+Cache keys of backtest runs only change with what a run's result depends on
+"""
+
+from datetime import datetime
+
+import pytest
+from alpaca.data.timeframe import TimeFrame
+
+from llama.backtester import memo
+from llama.strats import ConditionType, StrategyDefinition
+from llama.strats.consts import ConditionDefinition
+
+## a week of minute bars and the 60 days before it
+WINDOWS = (
+    datetime(2024, 1, 8),
+    datetime(2024, 1, 13, 12),
+    datetime(2023, 11, 9),
+    datetime(2024, 1, 8),
+)
+
+
+def strategy(threshold: float = 0.001, reverse: bool = False) -> StrategyDefinition:
+    """A two condition strategy"""
+    conditions = [
+        ConditionDefinition(
+            name="crossover",
+            type=ConditionType.AND,
+            active=True,
+            variables={},
+        ),
+        ConditionDefinition(
+            name="positive_vwap_slope",
+            type=ConditionType.OR,
+            active=True,
+            variables={"vwap_slope_threshold": threshold},
+        ),
+    ]
+    return StrategyDefinition(
+        alias="vwap",
+        name="vwap",
+        active=True,
+        conditions=conditions[::-1] if reverse else conditions,
+    )
+
+
+@pytest.fixture(name="coverage")
+def fixture_coverage(monkeypatch):
+    """Ledger rows per ledger name and symbol, read by the keys instead of postgres"""
+    ledgers: dict[str, dict[str, list]] = {}
+
+    def get_coverage(symbols, timeframe, start_time, end_time):
+        ledger = ledgers.get(timeframe, {})
+        return {symbol: list(ledger.get(symbol, [])) for symbol in symbols}
+
+    monkeypatch.setattr(memo, "get_coverage", get_coverage)
+    ledgers[TimeFrame.Minute.value] = {
+        "AAPL": [(datetime(2023, 11, 1), datetime(2024, 1, 14))]
+    }
+    return ledgers
+
+
+def key(*strategies, windows=WINDOWS, vectorized=False, symbol="AAPL"):
+    """The key of one strategy's run over a symbol"""
+    keys = memo.run_keys(list(strategies), [symbol], *windows, vectorized)
+    return keys[(strategies[0].alias, symbol)]
+
+
+@pytest.mark.usefixtures("coverage")
+def test_same_run_same_key():
+    """Keys are stable, whatever order the conditions are listed in"""
+    assert key(strategy()) == key(strategy())
+    assert key(strategy()) == key(strategy(reverse=True))
+
+
+@pytest.mark.usefixtures("coverage")
+def test_what_changes_the_key():
+    """Variables, the symbol and vectorizing all change the key"""
+    base = key(strategy())
+    assert key(strategy(threshold=0.002)) != base
+    assert key(strategy(), symbol="MSFT") != base
+    assert key(strategy(), vectorized=True) != base
+
+
+@pytest.mark.usefixtures("coverage")
+def test_windows_holding_the_same_bars_share_a_key():
+    """Ending on saturday or sunday, or starting before the open, reads the same bars"""
+    sunday = (WINDOWS[0], datetime(2024, 1, 14, 12), *WINDOWS[2:])
+    assert key(strategy(), windows=sunday) == key(strategy())
+    before_open = (datetime(2024, 1, 8, 14, 29, 59, 5), *WINDOWS[1:])
+    assert key(strategy(), windows=before_open) == key(strategy())
+
+
+def test_backfills_inside_the_window_change_the_key(coverage):
+    """Qoutes fetched inside the backtest change the key, outside it they don't"""
+    base = key(strategy())
+    coverage[memo.QOUTE_LEDGER] = {
+        "AAPL": [(datetime(2023, 6, 1), datetime(2023, 6, 2))]
+    }
+    assert key(strategy()) == base
+    coverage[memo.QOUTE_LEDGER] = {
+        "AAPL": [(datetime(2024, 1, 9), datetime(2024, 1, 10))]
+    }
+    assert key(strategy()) != base
+
+
+def test_effective_window_rounds_to_whole_minutes():
+    """A window starting mid minute starts at the next whole minute"""
+    assert memo.effective_window(
+        datetime(2024, 1, 8, 15, 0, 30),
+        datetime(2024, 1, 8, 16, 0, 30),
+        TimeFrame.Minute,
+    ) == (datetime(2024, 1, 8, 15, 1), datetime(2024, 1, 8, 16))
+
+
+def test_effective_window_without_sessions():
+    """A weekend holds no bars"""
+    assert (
+        memo.effective_window(
+            datetime(2024, 1, 6), datetime(2024, 1, 7, 23), TimeFrame.Minute
+        )
+        is None
+    )
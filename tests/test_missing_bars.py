@@ -0,0 +1,76 @@
+"""
+The single query finding missing bars across many symbols
+"""
+
+from datetime import datetime, timedelta
+
+from alpaca.data.timeframe import TimeFrame
+from sqlalchemy.dialects import postgresql
+
+from llama.stocks import History
+from llama.stocks import history as history_module
+
+
+class FakeSession:
+    """Records the statements run and returns canned rows"""
+
+    def __init__(self, rows: list[tuple]):
+        self.rows = rows
+        self.statements: list = []
+
+    def begin(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        return iter(self.rows)
+
+
+def find_missing(monkeypatch, windows, rows=()):
+    """Missing bars of the windows, with the session answering with rows"""
+    session = FakeSession(list(rows))
+    monkeypatch.setattr(history_module, "get_sync_sessionm", lambda: session)
+    missing = History(None, "").identify_missing_bars_many(windows, TimeFrame.Minute)
+    return missing, session.statements
+
+
+def test_missing_ranges_per_symbol(monkeypatch):
+    """Each symbol gets the ranges the query found, symbols without any get none"""
+    gap = (datetime(2024, 1, 2, 15), datetime(2024, 1, 2, 15, 30))
+    window = [(datetime(2024, 1, 2), datetime(2024, 1, 3))]
+    missing, statements = find_missing(
+        monkeypatch, {"AAPL": window, "MSFT": window}, [("AAPL", *gap)]
+    )
+    assert missing == {"AAPL": [gap], "MSFT": []}
+    assert len(statements) == 1
+
+
+def test_no_sessions_no_query(monkeypatch):
+    """Windows over a weekend can't be missing bars, so nothing is queried"""
+    weekend = [(datetime(2024, 1, 6), datetime(2024, 1, 7, 23))]
+    missing, statements = find_missing(monkeypatch, {"AAPL": weekend})
+    assert missing == {"AAPL": []}
+    assert not statements
+
+
+def test_parameters_dont_grow_with_windows(monkeypatch):
+    """Windows are sent as three arrays, however many there are"""
+    days = [datetime(2024, 1, 2) + timedelta(days=day) for day in range(365)]
+    windows = {
+        f"SYM{index}": [(day, day + timedelta(hours=23)) for day in days]
+        for index in range(100)
+    }
+    _, statements = find_missing(monkeypatch, windows)
+    _, few_statements = find_missing(monkeypatch, {"AAPL": windows["SYM0"][:1]})
+    compiled = statements[0].compile(dialect=postgresql.dialect())
+    few = few_statements[0].compile(dialect=postgresql.dialect())
+    assert len(compiled.params) == len(few.params)
+    ## more windows than a VALUES list of three parameters each could send
+    assert len(compiled.params["symbols"]) > 65535 // 3
+    assert len(compiled.params["symbols"]) == len(compiled.params["starts"])
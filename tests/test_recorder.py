@@ -0,0 +1,129 @@
+"""
+The array backed equity curve and its compressed round trip
+"""
+
+import io
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from llama.backtester.recorder import EquityRecorder, load_curve
+
+START = datetime(2024, 1, 2, 14, 30)
+
+
+def minute(index: int) -> datetime:
+    """Timestamp of the index'th snapshot"""
+    return START + timedelta(minutes=index)
+
+
+def record_run(recorder: EquityRecorder):
+    """Buy AAPL, hold it, buy MSFT, then sell AAPL"""
+    recorder.record(minute(0), 1000.0, 1000.0, 0, 0, {})
+    recorder.record(minute(1), 1000.0, 900.0, 1, 0, {"AAPL": 1})
+    recorder.record(minute(2), 1000.0, 900.0, 1, 0, {"AAPL": 1})
+    recorder.record(minute(3), 1002.0, 900.0, 1, 0, {"AAPL": 1})
+    recorder.record(minute(4), 1002.0, 700.0, 2, 0, {"AAPL": 1, "MSFT": 1})
+    recorder.record(minute(5), 1003.0, 802.0, 2, 1, {"AAPL": 0, "MSFT": 1})
+
+
+def test_unchanged_snapshots_are_skipped():
+    """A snapshot where only the timestamp changed isn't kept"""
+    recorder = EquityRecorder()
+    record_run(recorder)
+    arrays = recorder.arrays()
+    assert len(recorder) == 5
+    assert arrays["timestamp"].tolist() == [minute(i) for i in (0, 1, 3, 4, 5)]
+    assert arrays["equity"].tolist() == [1000.0, 1000.0, 1002.0, 1002.0, 1003.0]
+    assert arrays["buys"].tolist() == [0, 1, 1, 2, 2]
+
+
+def test_symbols_first_seen_later_held_nothing_before():
+    """A symbol's quantity is 0 in the snapshots before it was first held"""
+    recorder = EquityRecorder()
+    record_run(recorder)
+    assert recorder.positions(0) == {"AAPL": 0.0, "MSFT": 0.0}
+    assert recorder.positions(2) == {"AAPL": 1.0, "MSFT": 0.0}
+    assert recorder.positions(4) == {"AAPL": 0.0, "MSFT": 1.0}
+
+
+def test_grows_past_its_capacity():
+    """Columns double when full and keep every earlier snapshot"""
+    recorder = EquityRecorder(capacity=2)
+    for index in range(9):
+        recorder.record(minute(index), 1000.0 + index, 500.0, index, 0, {"A": index})
+    assert len(recorder) == 9
+    assert recorder.arrays()["equity"].tolist() == [1000.0 + i for i in range(9)]
+    assert [recorder.positions(i)["A"] for i in range(9)] == list(range(9))
+
+
+def test_round_trip():
+    """A curve loaded from its npz blob has the recorder's snapshots"""
+    recorder = EquityRecorder()
+    record_run(recorder)
+    loaded = load_curve(recorder.to_bytes())
+    assert loaded == list(recorder.rows())
+    assert loaded[-1] == {
+        "timestamp": minute(5),
+        "equity": 1003.0,
+        "buying_power": 802.0,
+        "buys": 2,
+        "sells": 1,
+        "positions": {"AAPL": 0.0, "MSFT": 1.0},
+    }
+
+
+def test_round_trip_only_stores_changed_positions():
+    """Quantities are stored for the snapshots where a position changed"""
+    recorder = EquityRecorder()
+    record_run(recorder)
+    with np.load(io.BytesIO(recorder.to_bytes())) as data:
+        assert data["position_rows"].tolist() == [0, 1, 3, 4]
+
+
+def test_round_trip_empty():
+    """A recorder with no snapshots loads as no snapshots"""
+    assert load_curve(EquityRecorder().to_bytes()) == []
+
+
+def test_series_matches_snapshots():
+    """Recording a run of bars at once keeps what recording them one by one does"""
+    timestamps = np.array([minute(i) for i in range(6)], dtype="datetime64[us]")
+    values = {
+        "equity": np.array([1000.0, 1000.0, 1000.0, 1002.0, 1002.0, 1003.0]),
+        "buying_power": np.array([1000.0, 900.0, 900.0, 900.0, 700.0, 802.0]),
+        "buys": np.array([0, 1, 1, 1, 2, 2]),
+        "sells": np.array([0, 0, 0, 0, 0, 1]),
+    }
+    quantities = {
+        "AAPL": np.array([0, 1, 1, 1, 1, 0]),
+        "MSFT": np.array([0, 0, 0, 0, 1, 1]),
+    }
+    expected = EquityRecorder()
+    record_run(expected)
+
+    recorder = EquityRecorder(capacity=2)
+    recorder.record(minute(0), 1000.0, 1000.0, 0, 0, {"AAPL": 0, "MSFT": 0})
+    recorder.record_series(
+        timestamps[1:],
+        {name: column[1:] for name, column in values.items()},
+        {symbol: qty[1:] for symbol, qty in quantities.items()},
+    )
+    assert list(recorder.rows()) == list(expected.rows())
+
+
+def test_series_skips_a_repeat_of_the_last_snapshot():
+    """A series starting where the last snapshot left off doesn't repeat it"""
+    recorder = EquityRecorder()
+    recorder.record(minute(0), 1000.0, 1000.0, 0, 0, {"AAPL": 0})
+    recorder.record_series(
+        np.array([minute(1), minute(2)], dtype="datetime64[us]"),
+        {
+            "equity": np.array([1000.0, 1001.0]),
+            "buying_power": np.array([1000.0, 1000.0]),
+            "buys": np.array([0, 0]),
+            "sells": np.array([0, 0]),
+        },
+        {"AAPL": np.array([0, 0])},
+    )
+    assert recorder.arrays()["timestamp"].tolist() == [minute(0), minute(2)]
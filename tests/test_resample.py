@@ -0,0 +1,166 @@
+"""
+Hour, day and week bars derived from minute bars
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+
+from llama.stocks import SymbolBars
+from llama.stocks.resample import (
+    Resampler,
+    bucket_starts,
+    holds_bar,
+    resample,
+    whole_buckets,
+)
+
+HOUR = TimeFrame(1, TimeFrameUnit.Hour)
+DAY = TimeFrame(1, TimeFrameUnit.Day)
+WEEK = TimeFrame(1, TimeFrameUnit.Week)
+
+
+def stamps(*values: datetime) -> np.ndarray:
+    """Naive UTC datetime64 timestamps"""
+    return np.array(values, dtype="datetime64[us]")
+
+
+def minute_bars(start: datetime, size: int, volume: list[float] | None = None):
+    """Minute bars with a close rising by one each minute"""
+    close = 100.0 + np.arange(size)
+    return SymbolBars.from_columns(
+        "AAPL",
+        {
+            "timestamp": [start + timedelta(minutes=i) for i in range(size)],
+            "open": close - 0.5,
+            "high": close + 1,
+            "low": close - 1,
+            "close": close,
+            "volume": np.ones(size) if volume is None else volume,
+            "trade_count": np.full(size, 2.0),
+            "vwap": close,
+        },
+    )
+
+
+def test_hour_buckets_align_in_utc():
+    """Hours start on the hour, two hour bars on even hours"""
+    timestamps = stamps(datetime(2024, 1, 2, 14, 30), datetime(2024, 1, 2, 15, 59))
+    assert bucket_starts(timestamps, HOUR).tolist() == [
+        datetime(2024, 1, 2, 14),
+        datetime(2024, 1, 2, 15),
+    ]
+    assert bucket_starts(timestamps, TimeFrame(2, TimeFrameUnit.Hour)).tolist() == [
+        datetime(2024, 1, 2, 14),
+        datetime(2024, 1, 2, 14),
+    ]
+
+
+@pytest.mark.parametrize(
+    "timestamp, midnight",
+    [
+        (datetime(2024, 1, 2, 23, 30), datetime(2024, 1, 2, 5)),
+        (datetime(2024, 1, 3, 4, 59), datetime(2024, 1, 2, 5)),
+        (datetime(2024, 1, 3, 5, 0), datetime(2024, 1, 3, 5)),
+        (datetime(2024, 7, 2, 3, 59), datetime(2024, 7, 1, 4)),
+        (datetime(2024, 7, 2, 4, 0), datetime(2024, 7, 2, 4)),
+    ],
+    ids=["winter evening", "winter night", "winter midnight", "summer", "summer day"],
+)
+def test_day_buckets_start_at_market_midnight(timestamp, midnight):
+    """Days start at midnight New York time, whichever side of DST"""
+    assert bucket_starts(stamps(timestamp), DAY).tolist() == [midnight]
+
+
+def test_week_buckets_start_on_monday():
+    """Weeks start at midnight New York time on monday, across the DST change"""
+    timestamps = stamps(datetime(2024, 3, 8, 15), datetime(2024, 3, 13, 15))
+    assert bucket_starts(timestamps, WEEK).tolist() == [
+        datetime(2024, 3, 4, 5),
+        datetime(2024, 3, 11, 4),
+    ]
+
+
+def test_minute_buckets_are_not_derivable():
+    """Only hour, day and week bars can be derived"""
+    with pytest.raises(ValueError):
+        bucket_starts(stamps(datetime(2024, 1, 2)), TimeFrame.Minute)
+
+
+def test_resample_hours():
+    """Open, high, low, close, volume and trade counts of each hour"""
+    hourly = resample(minute_bars(datetime(2024, 1, 2, 14, 30), 90), HOUR)
+    assert hourly.timestamp.tolist() == [
+        datetime(2024, 1, 2, 14),
+        datetime(2024, 1, 2, 15),
+    ]
+    assert hourly.open.tolist() == [99.5, 129.5]
+    assert hourly.high.tolist() == [130.0, 190.0]
+    assert hourly.low.tolist() == [99.0, 129.0]
+    assert hourly.close.tolist() == [129.0, 189.0]
+    assert hourly.volume.tolist() == [30.0, 60.0]
+    assert hourly.trade_count.tolist() == [60.0, 120.0]
+
+
+def test_resample_vwap_weighs_by_volume():
+    """VWAP is weighted by volume, or a plain mean when nothing traded"""
+    bars = minute_bars(datetime(2024, 1, 2, 14, 58), 4, volume=[3.0, 1.0, 0.0, 0.0])
+    hourly = resample(bars, HOUR)
+    assert hourly.vwap.tolist() == [(100.0 * 3 + 101.0) / 4, 102.5]
+
+
+def test_resample_nothing():
+    """No minute bars resample into none"""
+    assert len(resample(SymbolBars.empty("AAPL"), DAY)) == 0
+
+
+def test_whole_buckets():
+    """An interval shrinks to the hours wholly inside it"""
+    interval = (datetime(2024, 1, 2, 13, 15), datetime(2024, 1, 2, 16, 45))
+    assert whole_buckets(interval, HOUR) == (
+        datetime(2024, 1, 2, 14),
+        datetime(2024, 1, 2, 16) - timedelta(microseconds=1),
+    )
+
+
+def test_whole_buckets_keeps_aligned_ends():
+    """An interval already on bucket boundaries is left as it is"""
+    interval = (
+        datetime(2024, 1, 2, 14),
+        datetime(2024, 1, 2, 16) - timedelta(microseconds=1),
+    )
+    assert whole_buckets(interval, HOUR) == interval
+
+
+def test_whole_buckets_none_inside():
+    """An interval inside a single hour holds no whole hour"""
+    interval = (datetime(2024, 1, 2, 14, 10), datetime(2024, 1, 2, 14, 50))
+    assert whole_buckets(interval, HOUR) is None
+
+
+def test_holds_bar():
+    """A bar stamped with its start is inside an interval from its start"""
+    assert holds_bar((datetime(2024, 1, 2, 14), datetime(2024, 1, 2, 14, 5)), HOUR)
+    assert holds_bar((datetime(2024, 1, 2, 14, 5), datetime(2024, 1, 2, 15)), HOUR)
+    assert not holds_bar(
+        (datetime(2024, 1, 2, 14, 5), datetime(2024, 1, 2, 14, 55)), HOUR
+    )
+
+
+def test_resampler_caches_and_evicts():
+    """Repeated intervals come from the cache, the least recently used go first"""
+    resampler = Resampler(max_entries=2)
+    bars = minute_bars(datetime(2024, 1, 2, 14, 30), 180)
+    first = (datetime(2024, 1, 2, 15), datetime(2024, 1, 2, 16))
+    second = (datetime(2024, 1, 2, 16), datetime(2024, 1, 2, 17))
+    third = (datetime(2024, 1, 2, 15), datetime(2024, 1, 2, 17))
+
+    cached = resampler.resample(bars, HOUR, first)
+    assert resampler.resample(bars, HOUR, first) is cached
+    evicted = resampler.resample(bars, HOUR, second)
+    resampler.resample(bars, HOUR, first)
+    resampler.resample(bars, HOUR, third)
+    assert resampler.resample(bars, HOUR, first) is cached
+    assert resampler.resample(bars, HOUR, second) is not evicted
@@ -0,0 +1,121 @@
+"""
+Expanding sweep parameters into the grid of combinations to backtest
+"""
+
+import pytest
+from pydantic import ValidationError
+
+from llama.backtester import SweepDefinition
+from llama.backtester.consts import ParameterRange
+from llama.backtester.sweep import apply_parameters, parameter_grid
+from llama.strats import StrategyDefinition
+from llama.strats.vwap import Vwap
+from llama.strats.vwap.conditions import get_vwap_conditions
+
+
+def test_grid_is_every_combination():
+    """One combination per pairing of values, grouped by condition"""
+    grid = parameter_grid(
+        {
+            "positive_vwap_slope": {"vwap_slope_threshold": [0.0, 0.001]},
+            "max_quantity_allowed": {"max_quantity": [1, 5, 10]},
+        }
+    )
+    assert len(grid) == 6
+    assert grid[0] == {
+        "positive_vwap_slope": {"vwap_slope_threshold": 0.0},
+        "max_quantity_allowed": {"max_quantity": 1},
+    }
+    pairs = {
+        (
+            combo["positive_vwap_slope"]["vwap_slope_threshold"],
+            combo["max_quantity_allowed"]["max_quantity"],
+        )
+        for combo in grid
+    }
+    assert pairs == {(slope, qty) for slope in (0.0, 0.001) for qty in (1, 5, 10)}
+
+
+def test_grid_of_an_empty_list_is_empty():
+    """A variable with no values to try leaves no combinations"""
+    assert parameter_grid({"positive_vwap_slope": {"vwap_slope_threshold": []}}) == []
+
+
+def test_grid_expands_ranges():
+    """Ranges and lists can be mixed"""
+    grid = parameter_grid(
+        {
+            "positive_vwap_slope": {
+                "vwap_slope_threshold": ParameterRange(start=0, stop=0.002, step=0.001)
+            },
+            "max_quantity_allowed": {"max_quantity": [5]},
+        }
+    )
+    assert [combo["positive_vwap_slope"]["vwap_slope_threshold"] for combo in grid] == [
+        0.0,
+        0.001,
+        0.002,
+    ]
+
+
+@pytest.mark.parametrize(
+    "start, stop, step, values",
+    [
+        (0.1, 0.3, 0.1, [0.1, 0.2, 0.3]),
+        (0.0, 1.0, 0.25, [0.0, 0.25, 0.5, 0.75, 1.0]),
+        (0.0, 0.95, 0.1, [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]),
+        (1.0, 1.0, 0.5, [1.0]),
+        (2, 10, 4, [2.0, 6.0, 10.0]),
+    ],
+    ids=["float step", "exact step", "stop between steps", "one value", "integers"],
+)
+def test_range_values(start, stop, step, values):
+    """Float steps reach stop without drifting past or short of it"""
+    assert ParameterRange(start=start, stop=stop, step=step).values() == values
+
+
+@pytest.mark.parametrize(
+    "start, stop, step",
+    [(0, 1, 0), (0, 1, -0.1), (1, 0, 0.1)],
+    ids=["zero step", "negative step", "stop before start"],
+)
+def test_range_must_step_upwards(start, stop, step):
+    """Ranges that would never reach stop are rejected"""
+    with pytest.raises(ValidationError):
+        ParameterRange(start=start, stop=stop, step=step)
+
+
+def test_sweep_rejects_empty_values():
+    """A sweep with a variable that has nothing to try is rejected"""
+    with pytest.raises(ValidationError):
+        SweepDefinition(
+            strategy_alias="vwap",
+            parameters={"positive_vwap_slope": {"vwap_slope_threshold": []}},
+        )
+
+
+def test_apply_parameters():
+    """The swept copy has the new variables, the definition is left alone"""
+    definition = StrategyDefinition(**Vwap.dict())
+    conditions = {condition.name: condition for condition in get_vwap_conditions()}
+    swept = apply_parameters(
+        definition,
+        {"positive_vwap_slope": {"vwap_slope_threshold": 0.5}},
+        conditions,
+    )
+    variables = {cond.name: cond.variables for cond in swept.conditions}
+    original = {cond.name: cond.variables for cond in definition.conditions}
+    assert variables["positive_vwap_slope"]["vwap_slope_threshold"] == 0.5
+    assert original["positive_vwap_slope"]["vwap_slope_threshold"] != 0.5
+
+
+def test_apply_unknown_parameters():
+    """Conditions or variables the strategy doesn't have are an error"""
+    definition = StrategyDefinition(**Vwap.dict())
+    conditions = {condition.name: condition for condition in get_vwap_conditions()}
+    with pytest.raises(KeyError):
+        apply_parameters(definition, {"no_such_condition": {"x": 1}}, conditions)
+    with pytest.raises(KeyError):
+        apply_parameters(
+            definition, {"positive_vwap_slope": {"no_such_variable": 1}}, conditions
+        )